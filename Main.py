@@ -1,7 +1,42 @@
 import pygame
 import math
+import random
+import argparse
+import time
+import multiprocessing
+import weakref
+import struct
+import mmap
+import threading
+import queue
+import os
+import tempfile
+import tracemalloc
+import gzip
+import json
+import glob
+import hashlib
+import cProfile
+import pstats
+import marshal
+import sys
+import shlex
+import subprocess
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
 from screeninfo import get_monitors
 
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy no hay partículas
+    np = None
+
+try:
+    from pygame._sdl2.video import Window, Renderer, Texture
+except ImportError:  # pygame sin el módulo _sdl2
+    Window = Renderer = Texture = None
+
 class GameConstants:
     # Estados
     STATE_FALLING = "Cayendo"
@@ -26,9 +61,131 @@ class GameConstants:
     
     # Display
     FPS = 60
+    FRAME_STATS_WINDOW = 120  # Frames usados para los promedios de tiempo por frame
     MENU_OVERLAY_ALPHA = 20
     MENU_OVERLAY_COLOR = (200, 200, 200)
+    VICTORY_OVERLAY_ALPHA = 180
+    VICTORY_OVERLAY_COLOR = (0, 0, 0)
     TILE_DIVISOR = 30
+
+    # Gobernador de calidad
+    QUALITY_WINDOW = 60            # Frames que se promedian antes de decidir un cambio
+    QUALITY_DOWN = 1.0             # Baja un nivel con el promedio sobre el presupuesto * este factor
+    QUALITY_UP = 0.7               # Sube un nivel con el promedio bajo el presupuesto * este factor
+    QUALITY_UP_WINDOWS = 3         # Ventanas seguidas con margen antes de subir
+    QUALITY_PARTICLE_SCALE = 0.25  # Fracción de partículas que se emiten en calidad reducida
+    QUALITY_RENDER_SCALE = 0.5     # Resolución interna en el último nivel
+
+    # Capas de dibujo, de atrás hacia adelante
+    LAYER_BACKGROUND = 0
+    LAYER_DIGGING = 1    # Jugadores cavando, quedan detrás de las plataformas
+    LAYER_PLATFORMS = 2
+    LAYER_ENEMIES = 3
+    LAYER_PLAYERS = 4
+    LAYER_EFFECTS = 5
+    LAYER_DEBUG = 6
+    LAYER_HUD = 7
+    LAYER_OVERLAY = 8    # Velo de las pantallas que tapan la partida (victoria)
+    LAYER_UI = 9         # Textos y botones sobre ese velo
+
+    # Capa de depuración (F3), dibujada encima de todo
+    DEBUG_COLORS = {
+        'sensor': (0, 0, 255),
+        'collider': (255, 140, 0),
+        'contact': (255, 0, 0),
+        'velocity': (255, 255, 0),
+        'cell': (90, 90, 90),
+        'pair': (255, 0, 255)
+    }
+    DEBUG_VELOCITY_SCALE = 1  # Largo de la flecha de velocidad por unidad de velocidad
+
+    # Partículas
+    PARTICLE_CAPACITY = 10000     # Tope duro; las nuevas reciclan las más viejas
+    PARTICLE_LIFETIME = 0.5       # Segundos
+    PARTICLE_FRAMES = 6           # Cuadros de explotion.png (2 columnas x 3 filas)
+    PARTICLE_SIZE_DIVISOR = 2     # Tamaño de partícula = tile_size / divisor
+    PARTICLE_GRAVITY_FACTOR = 20  # Gravedad = tamaño del jugador * factor (px/s²)
+    PARTICLE_SPEED_FACTOR = 6     # Velocidad = tamaño del jugador * factor (px/s)
+    PARTICLE_HIT_COUNT = 4        # Partículas por punto de daño en un choque
+    PARTICLE_HIT_MAX = 60
+    PARTICLE_DIG_COUNT = 12
+    PARTICLE_COLORKEY = (255, 0, 255)
+
+    # Enemigos
+    ENEMY_CAPACITY = 2048
+    ENEMY_AGGRO_TILES = 8        # Distancia a la que un caminante persigue al jugador
+    ENEMY_HIT_COOLDOWN = 1.0     # Segundos entre golpes de un mismo enemigo
+    ENEMY_STOMP_BOUNCE = 0.5     # Fracción del salto normal al pisar un enemigo
+    ENEMY_SPAWN_INTERVAL = 6.0   # Segundos entre esqueletos de una lápida
+    ENEMY_ACTIVE_MARGIN = 0.5    # Fracción de pantalla alrededor de la vista en la que se simulan
+
+    # Proyectiles cargados
+    PROJECTILE_CAPACITY = 4096
+    PROJECTILE_MIN_CHARGE = 0.15      # Segundos de carga por debajo de los que soltar no dispara
+    PROJECTILE_MAX_CHARGE = 1.0       # Segundos hasta la carga completa
+    PROJECTILE_COOLDOWN = 0.3         # Segundos tras un disparo antes de poder volver a cargar
+    PROJECTILE_SPEED = (8.0, 16.0)    # Sin carga y con carga completa, en baldosas por segundo
+    PROJECTILE_DAMAGE = (5.0, 30.0)
+    PROJECTILE_SIZE = (0.25, 0.5)     # Lado, en baldosas
+    PROJECTILE_LEVELS = 4             # Tamaños distintos; la carga se redondea al más cercano
+    PROJECTILE_LIFETIME = 3.0         # Segundos
+    PROJECTILE_COLOR = (255, 200, 40)
+
+    # Cámara y mundo
+    CAMERA_DEAD_ZONE = 0.3       # Fracción de la vista en la que el objetivo no mueve la cámara
+    CAMERA_SMOOTHING = 6.0       # Rapidez con la que la cámara alcanza al objetivo (1/s)
+    PLATFORM_GRID_CELL = 4       # Celda del índice espacial de plataformas, en baldosas
+    MAX_WORLD_SCREENS = 64       # Pantallas por eje como máximo
+
+    # Niveles por chunks
+    LEVEL_CHUNK_TILES = 16       # Lado de un chunk, en baldosas
+    LEVEL_STREAM_MARGIN = 1      # Chunks cargados alrededor de la zona activa
+    LEVEL_RESIDENT_CHUNKS = 64   # Máximo de chunks en memoria
+    MAX_LEVEL_CHUNKS = 4096      # Chunks por eje como máximo al generar
+
+    # Terreno destructible
+    TERRAIN_SUBTILES = 4         # Celdas de la máscara por baldosa
+    TERRAIN_BLOCK_CELLS = 16     # Lado de un bloque (colisionadores y superficie), en celdas
+    TERRAIN_DIG_RADIUS = 0.6     # Radio del hueco que abre cavar, en baldosas
+
+    # Plataformas móviles
+    MOVING_PLATFORM_SPEED = (1.0, 4.0)    # Rango de velocidad, en baldosas por segundo
+    MOVING_PLATFORM_RANGE = 6             # Distancia máxima entre puntos de la ruta, en baldosas
+    MOVING_PLATFORM_TOGGLE = (3.0, 1.5)   # Segundos presente y ausente de las intermitentes
+    MOVING_PLATFORM_TOGGLE_SHARE = 0.3    # Fracción que aparece y desaparece
+
+    # Telemetría
+    TELEMETRY_QUEUE_SIZE = 65536     # Eventos en cola antes de empezar a descartar
+    TELEMETRY_BATCH = 4096           # Eventos por escritura
+    TELEMETRY_FILE_EVENTS = 500000   # Eventos por archivo antes de rotar
+    TELEMETRY_FLUSH_INTERVAL = 0.5   # Segundos entre vaciados de la cola
+
+    # Caché de audio decodificado
+    AUDIO_CACHE_DIR = '.cache/audio'  # PCM ya convertido al formato del mezclador
+
+    # Recarga de recursos en modo desarrollo
+    ASSET_POLL_INTERVAL = 0.25       # Segundos entre comprobaciones de mtime/tamaño
+
+    # Captura de perfiles
+    PROFILE_FRAMES = 120             # Frames que captura F9
+    PROFILE_DIR = 'profiles'
+    PROFILE_SAMPLE_INTERVAL = 0.002  # Segundos entre muestras del perfilador por muestreo
+    PROFILE_MIN_SHARE = 1e-5         # Segundos por debajo de los que se descarta una pila derivada
+    PROFILE_MAX_DEPTH = 64           # Marcos como máximo por pila derivada de cProfile
+
+    # Exportación de frames a memoria compartida
+    FRAME_FEED_NAME = 'ucb-frames'   # Nombre del bloque de memoria compartida
+    FRAME_FEED_FPS = 30              # Frames por segundo exportados como máximo
+    FRAME_FEED_SLOTS = 3             # Frames en el anillo
+
+    # Grabación de partidas
+    RECORD_FPS = 30                  # Frames por segundo grabados como máximo
+    RECORD_WORKERS = 2               # Procesos que comprimen PNG
+    RECORD_BUFFERS = 8               # Frames esperando a codificarse antes de descartar
+
+    # Entorno de entrenamiento
+    ENV_MAX_STEPS = 3600             # Pasos por episodio antes de truncarlo (un minuto a 60 FPS)
+    ENV_SPAWN_JITTER = 0.5           # Desplazamiento aleatorio de la aparición, en baldosas
     
     # UI Constants
     UI_MARGIN = 20  # Margen desde los bordes
@@ -37,10 +194,30 @@ class GameConstants:
     UI_MARGIN_BOTTOM = 50  # Nueva constante para margen inferior
     PLAYER_MAX_HEALTH = 300
     PLAYER_RESPAWN_DAMAGE = 100  # Renombrado de PLAYER_DAMAGE_FALL
+    UI_HEALTH_GAP = 10  # Separación mínima entre barras de vida
+
+    # Party modes
+    MIN_PLAYERS = 2
+    MAX_PLAYERS = 16
+    PLAYER_DAMAGE_THRESHOLD = 7  # Velocidad mínima de impacto entre jugadores
+    PLAYER_DAMAGE_FACTOR = 0.8
+    GAMEPAD_DEADZONE = 0.5  # Inclinación mínima del stick para contar como dirección
+    PLAYER_SPRITES = [(0, 0), (1, 1), (0, 1), (1, 0)]  # (row, col) en Jugador.png
+
+    # Bots
+    BOT_DEADLINE_MS = 80        # Tiempo máximo para que un bot entregue su plan
+    BOT_REPLY_MARGIN_MS = 5     # El worker deja de buscar antes para que el plan llegue a tiempo
+    BOT_LOOKAHEAD_STEPS = 12    # Frames simulados por cada secuencia candidata
+    BOT_SIM_OPPONENTS = 2       # Rivales más cercanos incluidos en la simulación
+    BOT_SIM_MARGIN = 4          # Baldosas alrededor de los simulados en las que se mueven plataformas
+    BOT_DAMAGE_DEALT_WEIGHT = 2.0
+    BOT_DAMAGE_TAKEN_WEIGHT = 3.0
+    BOT_CLOSING_WEIGHT = 0.5
 
     # Spawn positions (as percentage of screen)
-    SPAWN_OFFSET_X = 0.15  # 15% offset from center for both players
+    SPAWN_OFFSET_X = 0.15  # 15% offset from center between neighbouring players
     SPAWN_HEIGHT = 0.4     # 40% from top of screen
+    SPAWN_MAX_SPREAD = 0.4  # Max offset from center for the outermost players
     
     # Victory screen constants
     VICTORY_TITLE_SIZE = 64
@@ -54,15 +231,22 @@ class GameConstants:
     BUTTON_TEXT_SIZE = 32
 
     @staticmethod
-    def calculate_spawn_positions(screen_width, screen_height):
-        """Calculate spawn positions for both players"""
+    def calculate_spawn_positions(screen_width, screen_height, num_players=2):
+        """Calculate spawn positions for every player, spread evenly around the center"""
         center_x = screen_width / 2
         spawn_y = screen_height * GameConstants.SPAWN_HEIGHT
-        offset_x = screen_width * GameConstants.SPAWN_OFFSET_X
-        
+        if num_players < 2:
+            return {1: (center_x, spawn_y)}
+
+        spread = min(GameConstants.SPAWN_OFFSET_X * (num_players - 1),
+                     GameConstants.SPAWN_MAX_SPREAD)
+        offset_x = screen_width * spread
+        step = 2 * offset_x / (num_players - 1)
+
+        # Con dos jugadores: center - offset (izquierda) y center + offset (derecha)
         return {
-            1: (center_x - offset_x, spawn_y),  # Left player
-            2: (center_x + offset_x, spawn_y)   # Right player
+            player_id: (center_x - offset_x + (player_id - 1) * step, spawn_y)
+            for player_id in range(1, num_players + 1)
         }
 
 class AudioConfig:
@@ -79,7 +263,9 @@ class AudioConfig:
                 'path': 'assets/Audio/SFX_Jump.wav',
                 'volume': 0.5,    # Volumen relativo al sfx_volume
                 'delay': 300,     # Delay en milisegundos
-                'channel': 0      # Canal de audio
+                'channel': 0,     # Canal de audio
+                'variations': 'assets/Audio/temp/SFX_Jump_*.wav',  # Se decodifican al usarse
+                'no_repeat': 8    # Últimas variaciones que no se repiten
             },
             'dig': {
                 'path': 'assets/Audio/SFX_Dig.wav',
@@ -89,10 +275,88 @@ class AudioConfig:
             }
         }
         
+        # Música de fondo; se decodifica entera, así que pasa por la caché de PCM
+        self.music_config = {
+            'path': 'assets/Audio/Death Is Just Another Path.mp3',
+            'volume': 1.0     # Volumen relativo al music_volume
+        }
+        
         # Valores por defecto
         self.default_delay = 200
         self.default_volume = 0.5
         self.default_channel = 0
+        self.variation_budget = 1024 * 1024  # Bytes de PCM decodificado para todas las variaciones
+
+class AudioCache:
+    """Decoded PCM in the mixer's negotiated format, one file per source contents and mixer format
+
+    A hit maps the file and hands it to Sound(buffer=...), skipping decoding and
+    resampling. Editing the source or changing the mixer format changes the key;
+    the stale entry of that source is deleted when the new one is written.
+    """
+    def __init__(self, directory=GameConstants.AUDIO_CACHE_DIR):
+        self.directory = directory
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _entry(self, path):
+        """(prefix shared by every entry of path, entry file for its current contents)"""
+        with open(path, 'rb') as archivo:
+            digest = hashlib.blake2b(archivo.read(), digest_size=16).hexdigest()
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        source = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=8).hexdigest()
+        name = f"{source}-{digest}-{frequency}_{sample_format}_{channels}.pcm"
+        return source + '-', os.path.join(self.directory, name)
+
+    def load(self, path):
+        """Sound for path, decoded only on a cache miss"""
+        if not pygame.mixer.get_init():
+            return pygame.mixer.Sound(path)  # Falla igual que sin caché
+        prefix, entry = self._entry(path)
+        try:
+            with open(entry, 'rb') as archivo, \
+                    mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                sound = pygame.mixer.Sound(buffer=data)
+            self.stats['hits'] += 1
+            return sound
+        except (OSError, ValueError):
+            pass  # Sin entrada (o vacía, que mmap no admite)
+        sound = pygame.mixer.Sound(path)
+        self.stats['misses'] += 1
+        self._store(prefix, entry, sound.get_raw())
+        return sound
+
+    def _store(self, prefix, entry, pcm):
+        """Write an entry atomically and drop the older entries of the same source"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = entry + '.tmp'
+            with open(temporary, 'wb') as archivo:
+                archivo.write(pcm)
+            os.replace(temporary, entry)
+            for name in os.listdir(self.directory):
+                stale = os.path.join(self.directory, name)
+                if name.startswith(prefix) and stale != entry:
+                    os.remove(stale)
+        except OSError as error:
+            print(f"Warning: Could not write audio cache entry {entry}: {error}")
+
+class VariationBank:
+    """Files of one sound's variations; picks one at random, avoiding the last few picks"""
+    def __init__(self, paths, no_repeat=0):
+        self.paths = sorted(paths)
+        self.recent = deque(maxlen=max(0, min(no_repeat, len(self.paths) - 1)))
+
+    def pick(self):
+        if not self.paths:
+            return None
+        path = random.choice([path for path in self.paths if path not in self.recent])
+        self.recent.append(path)
+        return path
+
+    def discard(self, path):
+        """Forget a file that could not be decoded"""
+        self.paths.remove(path)
+        self.recent = deque(self.recent, maxlen=max(0, min(self.recent.maxlen, len(self.paths) - 1)))
 
 class ScreenData:
     """Auxiliary class to handle screen data and calculations"""
@@ -106,6 +370,13 @@ class ScreenData:
         self.border_y = 0
         self.tiles_x = 0
         self.tiles_y = 0
+        self.screens_x = 1
+        self.screens_y = 1
+        self.level_tiles = None  # Tamaño del nivel cargado, en baldosas
+        self.world_tiles_x = 0
+        self.world_tiles_y = 0
+        self.world_width = 0
+        self.world_height = 0
         self.display_surface = None
 
     def calculate_tile_size(self):
@@ -115,6 +386,17 @@ class ScreenData:
         self.tiles_y = self.total_height // self.tile_size
         self.border_x = self.total_width - (self.tiles_x * self.tile_size)
         self.border_y = self.total_height - (self.tiles_y * self.tile_size)
+        self.calculate_world_size()
+
+    def calculate_world_size(self):
+        """The world is the loaded level, or a grid of screens_x by screens_y screens"""
+        if self.level_tiles:
+            self.world_tiles_x, self.world_tiles_y = self.level_tiles
+        else:
+            self.world_tiles_x = self.tiles_x * self.screens_x
+            self.world_tiles_y = self.tiles_y * self.screens_y
+        self.world_width = self.world_tiles_x * self.tile_size + self.border_x
+        self.world_height = self.world_tiles_y * self.tile_size + self.border_y
 
     def calculate_position(self, x_tiles, y_tiles):
         """Calculate pixel position from tile coordinates"""
@@ -135,16 +417,292 @@ class ScreenData:
             "border_y": self.border_y,
             "tiles_x": self.tiles_x,
             "tiles_y": self.tiles_y,
+            "screens_x": self.screens_x,
+            "screens_y": self.screens_y,
+            "world_tiles_x": self.world_tiles_x,
+            "world_tiles_y": self.world_tiles_y,
+            "world_width": self.world_width,
+            "world_height": self.world_height,
             "display": self.display_surface
         }
         return [data[arg] for arg in args if arg in data] if len(args) > 1 else data[args[0]]
 
 # Clase para manejar cada pantalla
+class RenderQueue:
+    """Collects a frame's draw commands and submits them sorted by layer and batched"""
+    def __init__(self):
+        self.blit_commands = []  # (layer, id(surface), order, surface, dest, area, size)
+        self.rect_commands = []  # (layer, order, color, rect, width)
+        self.batch_commands = []  # (layer, order, [(surface, dest), ...], pixels)
+        self.line_commands = []  # (layer, order, color, start, end, width)
+        self.order = 0
+        self.offset = (0, 0)  # Desplazamiento de la cámara para las capas del mundo
+        self.scaled = weakref.WeakKeyDictionary()  # surface -> {size: superficie escalada}
+        self.stats = {'commands': 0, 'draw_calls': 0, 'blitted_pixels': 0}
+
+    def set_offset(self, offset):
+        """Camera translation applied to world layers; background and HUD stay on screen"""
+        self.offset = offset
+
+    def _to_screen(self, layer, dest):
+        if self.offset == (0, 0) or not GameConstants.LAYER_BACKGROUND < layer < GameConstants.LAYER_HUD:
+            return dest
+        if isinstance(dest, pygame.Rect):
+            return dest.move(self.offset)
+        return (dest[0] + self.offset[0], dest[1] + self.offset[1], *dest[2:])
+
+    def submit(self, surface, dest, layer, area=None):
+        """Queue a blit of surface at dest"""
+        dest = self._to_screen(layer, dest)
+        self.blit_commands.append((layer, id(surface), self.order, surface, dest, area, None))
+        self.order += 1
+
+    def submit_scaled(self, surface, rect, layer):
+        """Queue surface stretched to fill rect"""
+        size = (rect[2], rect[3])
+        rect = self._to_screen(layer, rect)
+        self.blit_commands.append((layer, id(surface), self.order, surface, rect, None, size))
+        self.order += 1
+
+    def submit_rect(self, color, rect, layer, width=0):
+        """Queue a pygame.draw.rect (filled when width is 0)"""
+        rect = self._to_screen(layer, rect)
+        self.rect_commands.append((layer, self.order, color, rect, width))
+        self.order += 1
+
+    def submit_line(self, color, start, end, layer, width=1):
+        """Queue a pygame.draw.line (debug overlay vectors)"""
+        self.line_commands.append((layer, self.order, color, self._to_screen(layer, start),
+                                   self._to_screen(layer, end), width))
+        self.order += 1
+
+    def submit_batch(self, blits, layer, pixels=None):
+        """Queue a prebuilt [(surface, dest), ...] sequence as one command (particles, enemies)"""
+        if pixels is None:
+            pixels = sum(surface.get_width() * surface.get_height() for surface, _ in blits)
+        if self.offset != (0, 0) and GameConstants.LAYER_BACKGROUND < layer < GameConstants.LAYER_HUD:
+            offset_x, offset_y = self.offset
+            blits = [(surface, (x + offset_x, y + offset_y)) for surface, (x, y) in blits]
+        self.batch_commands.append((layer, self.order, blits, pixels))
+        self.order += 1
+
+    def flush(self, target, scale=1.0):
+        """Draw everything queued onto target and reset for the next frame
+
+        With scale < 1 the commands are shrunk to fit a smaller internal target.
+        """
+        if scale != 1.0:
+            self._apply_scale(scale)
+        draw_calls = 0
+        blitted_pixels = 0
+        for rects, blits, batches, lines in self._layers():
+            # Dentro de una capa: rects, blits agrupados por superficie, los lotes y las líneas
+            for _, _, color, rect, width in rects:
+                self._draw_rect(target, color, rect, width)
+            draw_calls += len(rects)
+            if blits:
+                draw_calls += self._draw_blits(target, blits)
+                blitted_pixels += sum(self._blit_pixels(command) for command in blits)
+            for _, _, batch, pixels in batches:
+                draw_calls += self._draw_batch(target, batch)
+                blitted_pixels += pixels
+            for _, _, color, start, end, width in lines:
+                self._draw_line(target, color, start, end, width)
+            draw_calls += len(lines)
+
+        self.stats = {
+            'commands': (len(self.rect_commands) + len(self.blit_commands) + len(self.line_commands)
+                         + sum(len(command[2]) for command in self.batch_commands)),
+            'draw_calls': draw_calls,
+            'blitted_pixels': blitted_pixels
+        }
+        self.clear()
+        return self.stats
+
+    def _layers(self):
+        """Yield (rect, blit, batch, line commands) per layer, back to front"""
+        self.blit_commands.sort(key=lambda command: command[:3])
+        self.rect_commands.sort(key=lambda command: command[:2])
+        self.batch_commands.sort(key=lambda command: command[:2])
+        self.line_commands.sort(key=lambda command: command[:2])
+        queues = [self.rect_commands, self.blit_commands, self.batch_commands, self.line_commands]
+        indices = [0, 0, 0, 0]
+        while any(index < len(queue) for index, queue in zip(indices, queues)):
+            layer = min(queue[index][0] for index, queue in zip(indices, queues)
+                        if index < len(queue))
+            groups = []
+            for position, queue in enumerate(queues):
+                start = indices[position]
+                while indices[position] < len(queue) and queue[indices[position]][0] == layer:
+                    indices[position] += 1
+                groups.append(queue[start:indices[position]])
+            yield groups
+
+    def _apply_scale(self, scale):
+        """Rewrite the queued commands for a target scale times the screen size"""
+        def point(value):
+            return int(value * scale)
+
+        def scale_rect(rect):
+            x, y = point(rect[0]), point(rect[1])
+            # Desde los bordes escalados, para que las baldosas vecinas no dejen huecos
+            return pygame.Rect(x, y, max(1, point(rect[0] + rect[2]) - x),
+                               max(1, point(rect[1] + rect[3]) - y))
+
+        blits = []
+        for layer, surface_id, order, surface, dest, area, size in self.blit_commands:
+            if area:
+                width, height = surface.get_size()
+                surface = self._get_scaled(surface, (max(1, point(width)), max(1, point(height))))
+                blits.append((layer, surface_id, order, surface, (point(dest[0]), point(dest[1])),
+                              scale_rect(area), None))
+                continue
+            width, height = size or surface.get_size()
+            rect = scale_rect((dest[0], dest[1], width, height))
+            blits.append((layer, surface_id, order, surface, rect.topleft, None, rect.size))
+        self.blit_commands = blits
+        self.rect_commands = [
+            (layer, order, color, scale_rect(rect), max(1, point(width)) if width else 0)
+            for layer, order, color, rect, width in self.rect_commands
+        ]
+        batches = []
+        shrunk = {}  # Los lotes repiten pocas superficies (cuadros de partículas y enemigos)
+        for layer, order, batch, pixels in self.batch_commands:
+            scaled = []
+            for surface, (x, y) in batch:
+                small = shrunk.get(surface)
+                if small is None:
+                    width, height = surface.get_size()
+                    small = self._get_scaled(surface, (max(1, point(width)), max(1, point(height))))
+                    shrunk[surface] = small
+                scaled.append((small, (int(x * scale), int(y * scale))))
+            batches.append((layer, order, scaled, int(pixels * scale * scale)))
+        self.batch_commands = batches
+        self.line_commands = [
+            (layer, order, color, (point(start[0]), point(start[1])), (point(end[0]), point(end[1])),
+             max(1, point(width)))
+            for layer, order, color, start, end, width in self.line_commands
+        ]
+
+    @staticmethod
+    def _blit_pixels(command):
+        surface, area, size = command[3], command[5], command[6]
+        if size:
+            return size[0] * size[1]
+        if area:
+            return area[2] * area[3]
+        return surface.get_width() * surface.get_height()
+
+    def _draw_rect(self, target, color, rect, width):
+        pygame.draw.rect(target, color, rect, width)
+
+    def _draw_line(self, target, color, start, end, width):
+        pygame.draw.line(target, color, start, end, width)
+
+    def _draw_blits(self, target, blits):
+        """Submit one layer as a single batch, returns the number of draw calls"""
+        batch = []
+        for command in blits:
+            surface, dest, area, size = command[3:]
+            if size and size != surface.get_size():
+                surface = self._get_scaled(surface, size)
+            batch.append((surface, dest) if area is None else (surface, dest, area))
+
+        fblits = getattr(target, 'fblits', None)  # pygame-ce
+        if fblits and all(len(command) == 2 for command in batch):
+            fblits(batch)
+        else:
+            target.blits(batch, doreturn=False)
+        return 1
+
+    def _draw_batch(self, target, batch):
+        fblits = getattr(target, 'fblits', None)  # pygame-ce
+        if fblits:
+            fblits(batch)
+        else:
+            target.blits(batch, doreturn=False)
+        return 1
+
+    def _get_scaled(self, surface, size):
+        """Scaled copy of surface, created once per size"""
+        sizes = self.scaled.setdefault(surface, {})
+        scaled = sizes.get(size)
+        if scaled is None:
+            scaled = pygame.transform.scale(surface, size)
+            sizes[size] = scaled
+        return scaled
+
+    def clear(self):
+        self.blit_commands.clear()
+        self.rect_commands.clear()
+        self.batch_commands.clear()
+        self.line_commands.clear()
+        self.order = 0
+
+class TextureRenderQueue(RenderQueue):
+    """RenderQueue that draws through an SDL2 Renderer; each surface is uploaded once"""
+    def __init__(self, renderer):
+        super().__init__()
+        self.renderer = renderer
+        self.textures = weakref.WeakKeyDictionary()  # surface -> Texture
+
+    def get_texture(self, surface):
+        texture = self.textures.get(surface)
+        if texture is None:
+            texture = Texture.from_surface(self.renderer, surface)
+            self.textures[surface] = texture
+        return texture
+
+    def _draw_rect(self, target, color, rect, width):
+        renderer = self.renderer
+        renderer.draw_color = color if len(color) == 4 else (*color, 255)
+        rect = pygame.Rect(rect)
+        if width == 0:
+            renderer.fill_rect(rect)
+            return
+        for _ in range(width):
+            renderer.draw_rect(rect)
+            rect.inflate_ip(-2, -2)
+
+    def _draw_line(self, target, color, start, end, width):
+        renderer = self.renderer
+        renderer.draw_color = color if len(color) == 4 else (*color, 255)
+        # El renderer sólo traza líneas de 1 px: el grosor se hace con líneas paralelas
+        for step in range(width):
+            renderer.draw_line((start[0], start[1] + step), (end[0], end[1] + step))
+
+    def _draw_blits(self, target, blits):
+        # Escalar aquí es gratis: lo hace el renderer al dibujar la textura
+        for command in blits:
+            surface, dest, area, size = command[3:]
+            texture = self.get_texture(surface)
+            if size is None:
+                size = (area[2], area[3]) if area else surface.get_size()
+            texture.draw(srcrect=area, dstrect=pygame.Rect(dest[0], dest[1], *size))
+        return len(blits)
+
+    def _draw_batch(self, target, batch):
+        # La textura puede salirse de la ventana; el renderer la recorta
+        for surface, dest in batch:
+            texture = self.get_texture(surface)
+            texture.draw(dstrect=(dest[0], dest[1], texture.width, texture.height))
+        return len(batch)
+
 class Pantalla:
-    def __init__(self, width, height, title="Screen"):
+    def __init__(self, width, height, title="Screen", fullscreen=True):
         self.screen_data = ScreenData()
         self.width = width
         self.height = height
+        self.title = title
+        self.fullscreen = fullscreen
+        self.render_queue = RenderQueue()
+        self.view_rect = None  # Parte del mundo que se ve; None es la primera pantalla
+        self.overlays = {}  # (color, alpha, tamaño) -> superficie del velo
+        self.winner_texts = {}
+        self.alpha_overlays = True  # False: overlays opacos, sin mezcla alfa
+        self.render_scale = 1.0     # Resolución interna relativa a la pantalla
+        self.render_target = None
+        self.frame_sinks = []       # Reciben cada frame presentado (FrameFeed, MatchRecorder)
         pygame.display.set_caption(title)
         self.display_surface = self._select_screen(0)
         self._calculate_dimensions()
@@ -153,22 +711,52 @@ class Pantalla:
         self.screen_data.calculate_tile_size()
 
     def _select_screen(self, screen_index):
-        monitors = get_monitors()
-        if (screen_index < 0 or screen_index >= len(monitors)):
-            screen_index = 0
-            
-        self.screen_data.total_width = monitors[screen_index].width
-        self.screen_data.total_height = monitors[screen_index].height
-        self.screen_data.mid_y = self.screen_data.total_height // 2
-        self.screen_data.mid_x = self.screen_data.total_width // 2
+        screen_index = self._set_screen_size(screen_index)
         
         self.screen_data.display_surface = pygame.display.set_mode(
             (self.screen_data.total_width, self.screen_data.total_height),
-            pygame.FULLSCREEN,
+            pygame.FULLSCREEN if self.fullscreen else 0,
             display=screen_index
         )
         return self.screen_data.display_surface
 
+    def _set_screen_size(self, screen_index):
+        """Fill the screen size from the monitor (fullscreen) or from width/height"""
+        if self.fullscreen:
+            monitors = get_monitors()
+            if (screen_index < 0 or screen_index >= len(monitors)):
+                screen_index = 0
+            self.screen_data.total_width = monitors[screen_index].width
+            self.screen_data.total_height = monitors[screen_index].height
+        else:
+            self.screen_data.total_width = self.width
+            self.screen_data.total_height = self.height
+        self.screen_data.mid_y = self.screen_data.total_height // 2
+        self.screen_data.mid_x = self.screen_data.total_width // 2
+        return screen_index
+
+    def set_world_size(self, screens_x, screens_y):
+        """Make the world screens_x by screens_y screens big"""
+        self.screen_data.screens_x = screens_x
+        self.screen_data.screens_y = screens_y
+        self.screen_data.calculate_world_size()
+
+    def set_world_tiles(self, tiles_x, tiles_y):
+        """Size the world to a level measured in tiles"""
+        self.screen_data.level_tiles = (tiles_x, tiles_y)
+        self.screen_data.calculate_world_size()
+
+    def set_camera(self, view_rect):
+        """Draw the world as seen from view_rect (None: no camera)"""
+        self.view_rect = view_rect
+        self.render_queue.set_offset((-view_rect[0], -view_rect[1]) if view_rect else (0, 0))
+
+    def get_view_rect(self):
+        """World rect currently on screen, used for culling"""
+        if self.view_rect:
+            return pygame.Rect(self.view_rect)
+        return pygame.Rect(0, 0, self.screen_data.total_width, self.screen_data.total_height)
+
     def get_screen_data(self, *args):
         """Get screen data using method chaining"""
         if len(args) == 1:
@@ -177,37 +765,92 @@ class Pantalla:
 
     def actualizar_juego(self, **kwargs):
         """Update game display with all game objects"""
+        self.dibujar_juego(**kwargs)
+        self._update_display()
+
+    def dibujar_juego(self, **kwargs):
+        """Draw all game objects without presenting, so overlays can go on top"""
         self._clear_screen()
+        self.set_camera(kwargs.get('camera'))
         self._draw_all_objects(kwargs)
+        self._flush_render_queue()
+
+    def actualizar_pantalla(self):
+        """Present whatever has been drawn"""
         self._update_display()
 
+    def _flush_render_queue(self):
+        """Submit every queued draw command to the display"""
+        if self.render_scale == 1.0:
+            self.render_queue.flush(self.display_surface)
+            return
+        # Se dibuja en pequeño y se estira a la pantalla en un solo paso
+        display_size = self.display_surface.get_size()
+        size = tuple(max(1, int(side * self.render_scale)) for side in display_size)
+        if self.render_target is None or self.render_target.get_size() != size:
+            self.render_target = pygame.Surface(size, 0, self.display_surface)
+        self.render_target.fill(GameConstants.COLORS['BLACK'])
+        self.render_queue.flush(self.render_target, self.render_scale)
+        pygame.transform.scale(self.render_target, display_size, self.display_surface)
+
+    def set_render_scale(self, scale):
+        """Draw at scale times the screen resolution (1.0: native)"""
+        self.render_scale = scale
+        self.render_target = None
+
+    def get_render_stats(self):
+        """Draw commands, draw calls and blitted pixels of the last frame"""
+        return self.render_queue.stats
+
+    def add_frame_sink(self, sink):
+        """Hand every presented frame to sink.publish(surface) (FrameFeed, MatchRecorder)"""
+        self.frame_sinks = self.frame_sinks + [sink]
+        if len(self.frame_sinks) > 1:
+            return
+        update_display = self._update_display
+
+        def publishing_update():
+            update_display()
+            for frame_sink in self.frame_sinks:
+                frame_sink.publish(self.display_surface)
+
+        self._update_display = publishing_update  # Tapa el método de la clase
+
+    def remove_frame_sink(self, sink):
+        """Stop handing frames to sink; with none left presenting costs nothing extra"""
+        self.frame_sinks = [frame_sink for frame_sink in self.frame_sinks if frame_sink is not sink]
+        if not self.frame_sinks:
+            self.__dict__.pop('_update_display', None)
+
     def _clear_screen(self):
         """Clear screen with background color"""
-        self.display_surface.fill(GameConstants.COLORS['BLACK'])
+        if self.render_scale == 1.0:  # Si no, el objetivo interno escalado cubre toda la pantalla
+            self.display_surface.fill(GameConstants.COLORS['BLACK'])
 
     def _draw_all_objects(self, game_objects):
-        """Draw all game objects in the correct order"""
-        # Dibujar fondo primero
+        """Queue all game objects; each one picks its own layer"""
         if 'fondo' in game_objects:
             game_objects['fondo'].dibujar(self)
 
-        # Dibujar jugadores que no están cavando
+        # Los jugadores cavando van en una capa detrás de las plataformas
         if 'jugadores' in game_objects:
+            view = self.get_view_rect()
             for jugador in game_objects['jugadores']:
-                if jugador.estado_gravedad == GameConstants.STATE_DIGGING:
+                if view.colliderect(jugador.rect):
                     jugador.dibujar(self)
 
-        # Dibujar plataformas
         if 'plataforma' in game_objects:
             game_objects['plataforma'].dibujar(self)
 
-        # Dibujar jugadores que están cavando
-        if 'jugadores' in game_objects:
-            for jugador in game_objects['jugadores']:
-                if jugador.estado_gravedad != GameConstants.STATE_DIGGING:
-                    jugador.dibujar(self)
+        if game_objects.get('enemigos'):
+            game_objects['enemigos'].dibujar(self)
+
+        if game_objects.get('proyectiles'):
+            game_objects['proyectiles'].dibujar(self)
+
+        if 'particulas' in game_objects:
+            game_objects['particulas'].dibujar(self)
 
-        # Dibujar HUD al final
         if 'hud' in game_objects:
             game_objects['hud'](self)
 
@@ -218,19 +861,33 @@ class Pantalla:
     def actualizar_menu(self, winner=None):
         """Update menu display with overlay and optional winner"""
         self._clear_screen()
+        self.set_camera(None)
         self._draw_menu_overlay()
         if winner:
             self._draw_winner(winner)
+        self._flush_render_queue()
         self._update_display()
 
     def _draw_menu_overlay(self):
         """Draw semi-transparent menu overlay"""
-        overlay = pygame.Surface(
-            (self.screen_data.total_width, self.screen_data.total_height), 
-            pygame.SRCALPHA
-        )
-        overlay.fill((*GameConstants.MENU_OVERLAY_COLOR, GameConstants.MENU_OVERLAY_ALPHA))
-        self.display_surface.blit(overlay, (0, 0))
+        self.submit_overlay(GameConstants.MENU_OVERLAY_COLOR, GameConstants.MENU_OVERLAY_ALPHA,
+                            GameConstants.LAYER_BACKGROUND)
+
+    def submit_overlay(self, color, alpha, layer):
+        """Queue a full-screen translucent veil; its surface is made once per color and size"""
+        size = (self.screen_data.total_width, self.screen_data.total_height)
+        if not self.alpha_overlays:
+            # Sin mezcla alfa: el color ya mezclado con negro, opaco
+            color = tuple(channel * alpha // 255 for channel in color)
+            self.render_queue.submit_rect(color, pygame.Rect((0, 0), size), layer)
+            return
+        key = (color, alpha, size)
+        overlay = self.overlays.get(key)
+        if overlay is None:
+            overlay = pygame.Surface(size, pygame.SRCALPHA)
+            overlay.fill((*color, alpha))
+            self.overlays[key] = overlay
+        self.render_queue.submit(overlay, (0, 0), layer)
 
     def _draw_winner(self, winner):
         """Draw winner sprite and text in menu"""
@@ -248,18 +905,387 @@ class Pantalla:
             sprite_rect = winner_sprite.get_rect(
                 center=(self.screen_data.mid_x,
                        self.screen_data.mid_y))
-            self.display_surface.blit(winner_sprite, sprite_rect)
-
-        # Draw winner text
-        font = pygame.font.Font(None, GameConstants.VICTORY_TITLE_SIZE)
-        text = font.render(f"Player {winner.player_id} Wins!", True, 
-                         GameConstants.VICTORY_TEXT_COLOR)
+            self.render_queue.submit(winner_sprite, sprite_rect, GameConstants.LAYER_HUD)
+
+        # Draw winner text (se renderiza una vez por ganador)
+        text = self.winner_texts.get(winner.player_id)
+        if text is None:
+            font = pygame.font.Font(None, GameConstants.VICTORY_TITLE_SIZE)
+            text = font.render(f"Player {winner.player_id} Wins!", True, 
+                             GameConstants.VICTORY_TEXT_COLOR)
+            self.winner_texts[winner.player_id] = text
         text_rect = text.get_rect(centerx=self.screen_data.mid_x, y=100)
-        self.display_surface.blit(text, text_rect)
+        self.render_queue.submit(text, text_rect, GameConstants.LAYER_HUD)
 
     def detener(self):
         pygame.display.quit()
 
+class PantallaSDL2(Pantalla):
+    """Pantalla drawn through pygame._sdl2.video textures; the GPU does blending and scaling"""
+    def __init__(self, width, height, title="Screen", fullscreen=True, software=False):
+        if Renderer is None:
+            raise pygame.error("pygame._sdl2.video is not available in this pygame build")
+        self.software = software  # Renderer por software de SDL, para máquinas sin GPU
+        super().__init__(width, height, title, fullscreen)
+        self.render_queue = TextureRenderQueue(self.renderer)
+        self.legacy_dirty = False
+
+    def _select_screen(self, screen_index):
+        self._set_screen_size(screen_index)
+        size = (self.screen_data.total_width, self.screen_data.total_height)
+        self.window = Window(self.title, size=size, fullscreen=self.fullscreen)
+        self.renderer = Renderer(self.window, accelerated=0 if self.software else -1)
+        self.renderer.draw_blend_mode = 1  # SDL_BLENDMODE_BLEND para los rects con alpha
+        # Superficie para el código que sigue dibujando directo a "display", con su textura de
+        # streaming: se crea una vez y sólo se actualiza en los frames en que alguien la usó
+        self.screen_data.display_surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.legacy_texture = Texture(self.renderer, size, depth=32, streaming=True)
+        self.legacy_texture.blend_mode = 1  # SDL_BLENDMODE_BLEND: lo no dibujado es transparente
+        return self.screen_data.display_surface
+
+    def get_screen_data(self, *args):
+        if "display" in args:
+            self.legacy_dirty = True
+        return super().get_screen_data(*args)
+
+    def _clear_screen(self):
+        self.renderer.draw_color = (*GameConstants.COLORS['BLACK'], 255)
+        self.renderer.clear()
+        if self.legacy_dirty:
+            self.display_surface.fill((0, 0, 0, 0))
+            self.legacy_dirty = False
+
+    def submit_overlay(self, color, alpha, layer):
+        """Alpha overlay blended by the renderer, no full-screen surface needed"""
+        self.render_queue.submit_rect(
+            (*color, alpha),
+            pygame.Rect(0, 0, self.screen_data.total_width, self.screen_data.total_height),
+            layer
+        )
+
+    def set_render_scale(self, scale):
+        """The GPU already scales for free; resolution is not a cost worth trading here"""
+
+    def _update_display(self):
+        if self.legacy_dirty:
+            # Sólo se sube cuando alguien dibujó directamente en la superficie
+            self.legacy_texture.update(self.display_surface)
+            self.legacy_texture.draw()
+        self.renderer.present()
+
+    def detener(self):
+        self.window.destroy()
+        pygame.display.quit()
+
+class PantallaVirtual(Pantalla):
+    """Off-screen Pantalla for headless simulation (bots, benchmarks)"""
+    def __init__(self, width, height, title="Screen"):
+        super().__init__(width, height, title, fullscreen=False)
+
+    def _select_screen(self, screen_index):
+        self._set_screen_size(screen_index)
+        self.screen_data.display_surface = pygame.Surface((self.width, self.height))
+        return self.screen_data.display_surface
+
+    def _update_display(self):
+        """Nothing to present off-screen"""
+
+    def detener(self):
+        pass
+
+class FrameFeed:
+    """Presented frames copied into a shared-memory ring for spectator and streaming tools
+
+    Layout: a BLOCK-sized header (HEADER, then the newest frame number), then
+    SLOTS slots of one BLOCK (sequence, frame number, timestamp) plus the raw
+    pixels of the display surface (pitch * height bytes, format in the header).
+    Each slot is a seqlock: its sequence is odd while a frame is being copied in,
+    so a reader that sees the same even sequence before and after using the
+    pixels knows they were not overwritten. Readers attach with FrameFeedReader.
+    """
+    MAGIC = b'UCBF'
+    VERSION = 1
+    # magia, versión, ancho, alto, pitch, bytes por pixel, slots, shifts RGBA
+    HEADER = struct.Struct('<4sIIIIII4B')
+    LATEST = HEADER.size // 8  # Palabra de 8 bytes con el último frame completo
+    BLOCK = 64                 # Cabeceras y pixeles alineados a línea de caché
+
+    def __init__(self, surface, name=GameConstants.FRAME_FEED_NAME, fps=GameConstants.FRAME_FEED_FPS,
+                 slots=GameConstants.FRAME_FEED_SLOTS):
+        self.size = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.frame_bytes = FrameFeed._aligned(self.pitch * self.size[1])
+        self.slots = slots
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.next_time = 0.0
+        self.frame_number = 0
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=FrameFeed.BLOCK + slots * (FrameFeed.BLOCK + self.frame_bytes))
+        self.name = self.shm.name
+        FrameFeed.HEADER.pack_into(self.shm.buf, 0, FrameFeed.MAGIC, FrameFeed.VERSION, *self.size,
+                                   self.pitch, surface.get_bytesize(), slots, *surface.get_shifts())
+        # struct.pack_into pone a cero el registro antes de escribirlo: los contadores que se
+        # leen en vivo se escriben palabra a palabra para que nadie vea un cero intermedio
+        self.words = self.shm.buf.cast('Q')
+        self.times = self.shm.buf.cast('d')
+        self.published = 0
+        self.skipped = 0
+        self.copy_time = 0.0
+
+    @staticmethod
+    def _aligned(size):
+        return -(-size // FrameFeed.BLOCK) * FrameFeed.BLOCK
+
+    @staticmethod
+    def slot_offset(slot, frame_bytes):
+        return FrameFeed.BLOCK + slot * (FrameFeed.BLOCK + frame_bytes)
+
+    def publish(self, surface):
+        """Copy surface into the next slot unless the fps limit says to skip this frame"""
+        now = time.perf_counter()
+        if now < self.next_time or surface.get_size() != self.size:
+            self.skipped += 1
+            return False
+        # Si el juego va más lento que el límite no se acumula deuda de frames
+        self.next_time = max(self.next_time + self.interval, now)
+        self.frame_number += 1
+        offset = FrameFeed.slot_offset(self.frame_number % self.slots, self.frame_bytes)
+        word = offset // 8
+        self.words[word] += 1  # Impar: copiando
+        self.words[word + 1] = self.frame_number
+        self.times[word + 2] = now
+        start = offset + FrameFeed.BLOCK
+        self.shm.buf[start:start + self.pitch * self.size[1]] = surface.get_buffer()
+        self.words[word] += 1
+        self.words[FrameFeed.LATEST] = self.frame_number
+        self.published += 1
+        self.copy_time += time.perf_counter() - now
+        return True
+
+    def get_stats(self):
+        return {'published': self.published, 'skipped': self.skipped,
+                'copy_ms': self.copy_time * 1000.0 / max(1, self.published)}
+
+    def close(self):
+        self.words.release()
+        self.times.release()
+        self.shm.close()
+        self.shm.unlink()
+
+class FrameFeedReader:
+    """Read side of a FrameFeed, for use from another process
+
+    latest() hands out a memoryview straight into shared memory, no copy: wrap
+    it with numpy.frombuffer or pygame.image.frombuffer, then call valid() to
+    check the writer did not reuse the slot meanwhile (it has SLOTS - 1 frames
+    of slack at the feed's fps). Release the view before close().
+    """
+    def __init__(self, name=GameConstants.FRAME_FEED_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if multiprocessing.parent_process() is None:
+            # Un proceso independiente tiene su propio tracker de recursos, que borraría la
+            # memoria del juego al salir; los hijos de multiprocessing comparten el del padre
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            except (ImportError, AttributeError):
+                pass
+        magic, version, width, height, self.pitch, self.bytesize, self.slots, *shifts = \
+            FrameFeed.HEADER.unpack_from(self.shm.buf, 0)
+        if magic != FrameFeed.MAGIC or version != FrameFeed.VERSION:
+            self.shm.close()
+            raise ValueError(f"{name} is not a version {FrameFeed.VERSION} frame feed")
+        self.size = (width, height)
+        self.shifts = tuple(shifts)
+        self.frame_bytes = FrameFeed._aligned(self.pitch * height)
+        self.words = self.shm.buf.cast('Q')
+        self.times = self.shm.buf.cast('d')
+
+    def latest_number(self):
+        return self.words[FrameFeed.LATEST]
+
+    def latest(self):
+        """(frame number, timestamp, sequence, pixels) of the newest complete frame, or None"""
+        number = self.words[FrameFeed.LATEST]
+        if not number:
+            return None
+        offset = FrameFeed.slot_offset(number % self.slots, self.frame_bytes)
+        word = offset // 8
+        sequence = self.words[word]
+        if sequence % 2 or self.words[word + 1] != number:
+            return None  # El escritor ya está reutilizando el slot
+        timestamp = self.times[word + 2]
+        start = offset + FrameFeed.BLOCK
+        return number, timestamp, sequence, self.shm.buf[start:start + self.pitch * self.size[1]]
+
+    def valid(self, number, sequence):
+        """True if the frame returned by latest() was not touched since"""
+        return self.words[FrameFeed.slot_offset(number % self.slots, self.frame_bytes) // 8] == sequence
+
+    def copy_latest(self, out):
+        """Copy the newest complete frame into a writable buffer; its frame number or None"""
+        frame = self.latest()
+        if frame is None:
+            return None
+        number, _, sequence, pixels = frame
+        memoryview(out).cast('B')[:len(pixels)] = pixels
+        pixels.release()
+        return number if self.valid(number, sequence) else None
+
+    def close(self):
+        self.words.release()
+        self.times.release()
+        self.shm.close()
+
+_recorder_memory = {}  # Bloques de memoria compartida abiertos en cada proceso codificador
+
+
+def _encode_png(name, offset, size, pitch, bitsize, masks, path):
+    """Process pool worker: one pooled frame from shared memory to a PNG; returns seconds spent"""
+    start = time.perf_counter()
+    shm = _recorder_memory.get(name)
+    if shm is None:
+        shm = _recorder_memory[name] = shared_memory.SharedMemory(name=name)
+    frame = pygame.Surface(size, 0, bitsize, masks)
+    pixels = memoryview(frame.get_view('0'))
+    pixels[:] = shm.buf[offset:offset + pitch * size[1]]
+    pixels.release()
+    pygame.image.save(frame, path)
+    return time.perf_counter() - start
+
+class MatchRecorder:
+    """Presented frames encoded to disk without stalling the game loop
+
+    publish() copies the display into a free buffer of a small shared-memory
+    pool and queues it; when every buffer is still waiting to be encoded the
+    frame is dropped and counted instead. 'png' compresses numbered images in a
+    process pool (pygame holds the GIL while saving); 'raw' writes the pixels in
+    order from one thread to a .raw file or to the stdin of an encoder command,
+    e.g. "ffmpeg -f rawvideo -pix_fmt {pix_fmt} -s {width}x{height} -r {fps} -i - match.mp4".
+    """
+    FORMATS = ('png', 'raw')
+
+    def __init__(self, directory, file_format='png', fps=GameConstants.RECORD_FPS, encoder=None,
+                 workers=GameConstants.RECORD_WORKERS, buffers=GameConstants.RECORD_BUFFERS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.file_format = file_format
+        self.encoder = encoder
+        self.fps = fps
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.workers = 1 if file_format == 'raw' else workers  # El vídeo crudo va en orden
+        self.buffers = buffers
+        self.prefix = time.strftime("match-%Y%m%d-%H%M%S")
+        self.shm = None       # Se crea con el primer frame, del tamaño y formato de la pantalla
+        self.free = deque()   # Índices de buffers libres; los devuelve el callback del ejecutor
+        self.executor = None
+        self.output = None
+        self.process = None
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+        self.captured = 0
+        self.dropped = 0
+        self.encoded = 0
+        self.failed = 0
+        self.encode_time = 0.0
+
+    def _open(self, surface):
+        self.size = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.format = (surface.get_bitsize(), surface.get_masks())
+        self.frame_bytes = self.pitch * self.size[1]
+        self.shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * self.buffers)
+        self.free.extend(range(self.buffers))
+        if self.file_format == 'png':
+            self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'))
+            return
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grabacion")
+        pix_fmt = MatchRecorder.pixel_format(surface)
+        if self.encoder:
+            command = self.encoder.format(width=self.size[0], height=self.size[1],
+                                          fps=self.fps or GameConstants.FPS, pix_fmt=pix_fmt)
+            self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, cwd=self.directory)
+            self.output = self.process.stdin
+        else:
+            self.output = open(os.path.join(
+                self.directory, f"{self.prefix}-{self.size[0]}x{self.size[1]}-{pix_fmt}.raw"), 'wb')
+
+    @staticmethod
+    def pixel_format(surface):
+        """ffmpeg name of the surface's byte order, e.g. bgr0 for the usual 32-bit display"""
+        channels = ['0'] * surface.get_bytesize()
+        for channel, shift, mask in zip('rgba', surface.get_shifts(), surface.get_masks()):
+            if mask:
+                channels[shift // 8] = channel
+        return ''.join(channels) + ('24' if len(channels) == 3 else '')
+
+    def publish(self, surface):
+        """Queue this frame for encoding unless the fps limit or a full pool says to skip it"""
+        now = time.perf_counter()
+        if now < self.next_time:
+            return False
+        self.next_time = max(self.next_time + self.interval, now)
+        if self.shm is None:
+            self._open(surface)
+        if surface.get_size() != self.size:
+            self.dropped += 1
+            return False
+        try:
+            index = self.free.popleft()
+        except IndexError:
+            self.dropped += 1  # Los codificadores no dan abasto: se pierde el frame, no el ritmo
+            return False
+        offset = index * self.frame_bytes
+        self.shm.buf[offset:offset + self.frame_bytes] = surface.get_buffer()
+        self.captured += 1
+        if self.file_format == 'png':
+            path = os.path.join(self.directory, f"{self.prefix}-{self.captured:06d}.png")
+            future = self.executor.submit(_encode_png, self.shm.name, offset, self.size, self.pitch,
+                                          *self.format, path)
+        else:
+            future = self.executor.submit(self._write_raw, offset)
+        future.add_done_callback(lambda done, index=index: self._encoded(done, index))
+        return True
+
+    def _write_raw(self, offset):
+        start = time.perf_counter()
+        self.output.write(self.shm.buf[offset:offset + self.frame_bytes])
+        return time.perf_counter() - start
+
+    def _encoded(self, future, index):
+        try:
+            with self.lock:
+                try:
+                    self.encode_time += future.result()
+                    self.encoded += 1
+                except Exception as error:
+                    # Cualquier fallo del codificador (disco, pygame, proceso caído) cuenta como perdido
+                    if not self.failed:
+                        print(f"Warning: could not encode recorded frame: {error}")
+                    self.failed += 1
+        finally:
+            self.free.append(index)
+
+    def get_stats(self):
+        """Frames captured, dropped under backpressure and encoded, and what the encoders sustain"""
+        encode_ms = self.encode_time * 1000.0 / max(1, self.encoded)
+        return {'captured': self.captured, 'dropped': self.dropped, 'encoded': self.encoded,
+                'failed': self.failed, 'encode_ms': encode_ms,
+                'encode_fps': self.workers * 1000.0 / encode_ms if encode_ms else 0.0}
+
+    def close(self):
+        """Finish every queued frame and release the pool"""
+        if self.shm is None:
+            return
+        self.executor.shutdown(wait=True)
+        if self.output:
+            self.output.close()
+        if self.process:
+            self.process.wait()
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
 # Clase para manejar el personaje
 class CollisionState:
     """Class to handle collision states"""
@@ -315,11 +1341,43 @@ class CollisionHandler:
         else:
             CollisionHandler._apply_collision_effects(player1, player2, damage, direction)
 
+    @staticmethod
+    def find_player_pairs(players):
+        """Sort-and-sweep broadphase on the x axis, returns overlapping player pairs"""
+        # Ordenar por borde izquierdo; el índice conserva el orden original de la pareja
+        ordered = sorted(
+            ((player.rect.left, index, player) for index, player in enumerate(players)),
+            key=lambda entry: (entry[0], entry[1])
+        )
+        pairs = []
+        active = []
+        for left, index, player in ordered:
+            # Descartar los que ya terminaron antes de que empiece este jugador
+            active = [entry for entry in active if entry[2].rect.right > left]
+            for other_index, other in ((entry[1], entry[2]) for entry in active):
+                if player.rect.colliderect(other.rect):
+                    pairs.append((other, player) if other_index < index else (player, other))
+            active.append((left, index, player))
+        return pairs
+
+    @staticmethod
+    def check_all_player_collisions(players, damage_threshold=5, damage_factor=0.5):
+        """Run impact response only for the pairs the broadphase reports as overlapping"""
+        pairs = CollisionHandler.find_player_pairs(players)
+        for player1, player2 in pairs:
+            CollisionHandler.check_player_collisions(
+                player1, player2, damage_threshold, damage_factor)
+        return len(pairs)
+
     @staticmethod
     def _apply_collision_effects(receiver, attacker, damage, direction):
         """Apply collision effects to the receiving player"""
         # Apply damage considering blocking
-        if receiver.bloqueando and receiver.direccion_bloqueo == direction:
+        blocked = receiver.bloqueando and receiver.direccion_bloqueo == direction
+        receiver.efectos.record(Telemetry.BLOCK if blocked else Telemetry.HIT,
+                                receiver.player_id, attacker.player_id, damage,
+                                receiver.rect.centerx, receiver.rect.centery)
+        if blocked:
             damage *= 0.3  # 70% damage reduction when blocking correctly
             # Reverse some momentum back to attacker
             if direction in ['left', 'right']:
@@ -339,15 +1397,19 @@ class CollisionHandler:
                 receiver.velocidad_y = knockback_force
 
         receiver.take_damage(damage)
+        receiver.efectos.impact(
+            (receiver.rect.centerx + attacker.rect.centerx) / 2,
+            (receiver.rect.centery + attacker.rect.centery) / 2,
+            damage,
+            receiver.tamaño
+        )
 
     @staticmethod
-    def update_character_state(character, collision_state, keys):
+    def update_character_state(character, collision_state, acciones):
         """Update character state based on collisions"""
         if collision_state.body:
-            # Usar los controles específicos del jugador para verificar la tecla abajo
-            down_key = character.controls.get_key('down')
             if (character.estado_gravedad in [GameConstants.STATE_DIGGING, GameConstants.STATE_FALLING] and 
-                keys[down_key]):  # Cambiar pygame.K_DOWN por down_key
+                acciones & InputState.DOWN):
                 character.estado_gravedad = GameConstants.STATE_DIGGING
             else:
                 character.estado_gravedad = GameConstants.STATE_IDLE
@@ -363,13 +1425,46 @@ class CollisionHandler:
             character.estado_gravedad = GameConstants.STATE_FALLING
             character.cavando(False)
 
+class Efectos:
+    """Where the physics sends its side effects: sounds, particles and telemetry
+
+    Each Personaje carries one. The game's players share Efectos.del_juego(),
+    bound to the process singletons; headless simulations (bot rollouts,
+    CubeBattleEnv) pass SIN_EFECTOS so they never touch them.
+    """
+    _juego = None
+
+    def __init__(self):
+        particulas = ParticleSystem()
+        self.sound = ResourceManager().play_sound
+        self.impact = particulas.emit_impact
+        self.dig = particulas.emit_dig
+        self.record = Telemetry().record
+
+    @classmethod
+    def del_juego(cls):
+        if cls._juego is None:
+            cls._juego = cls()
+        return cls._juego
+
+class SinEfectos:
+    """Efectos that drop everything"""
+    @staticmethod
+    def _nada(*args, **kwargs):
+        pass
+
+    sound = impact = dig = record = _nada
+
+SIN_EFECTOS = SinEfectos()
+
 class Personaje:
     """Player character with configurable controls and physics"""
-    def __init__(self, x, y, tamaño, controls=None, player_id=1):
+    def __init__(self, x, y, tamaño, controls=None, player_id=1, efectos=None):
         self._init_physics(x, y, tamaño)
         self._init_state(player_id)
         self._init_controls(controls, player_id)
         self._init_stats()
+        self.efectos = efectos or Efectos.del_juego()
 
     def _init_physics(self, x, y, tamaño):
         """Initialize physics-related attributes"""
@@ -398,11 +1493,10 @@ class Personaje:
     def _init_state(self, player_id):
         """Initialize state variables"""
         self.player_id = player_id
-        # Configurar sprite según player_id
-        self.sprite_config = {
-            1: {'row': 0, 'col': 0},  # Jugador 1: sprite en (0,0)
-            2: {'row': 1, 'col': 1}   # Jugador 2: sprite en (1,1)
-        }.get(player_id, {'row': 0, 'col': 0})  # Default a (0,0) si no es 1 o 2
+        # Configurar sprite según player_id (1: (0,0), 2: (1,1), luego se repiten)
+        sprites = GameConstants.PLAYER_SPRITES
+        row, col = sprites[(max(player_id, 1) - 1) % len(sprites)]
+        self.sprite_config = {'row': row, 'col': col}
         
         self.salto = False
         self.cavar = False
@@ -419,76 +1513,70 @@ class Personaje:
         """Initialize player stats"""
         self.health = GameConstants.PLAYER_MAX_HEALTH
 
-    def actualizar_velocidades(self, teclas, velocidad_escalada_x, velocidad_escalada_y):
+    def actualizar_velocidades(self, acciones, velocidad_escalada_x, velocidad_escalada_y):
         """Update velocities based on input"""
-        self._handle_horizontal_movement(teclas, velocidad_escalada_x)
-        self._handle_vertical_movement(teclas, velocidad_escalada_y)
+        self._handle_horizontal_movement(acciones, velocidad_escalada_x)
+        self._handle_vertical_movement(acciones, velocidad_escalada_y)
 
-    def _handle_horizontal_movement(self, teclas, velocidad_escalada_x):
+    def _handle_horizontal_movement(self, acciones, velocidad_escalada_x):
         """Handle left/right movement"""
-        if (teclas[self.controls.get_key('left')] and 
+        if (acciones & InputState.LEFT and 
             self.velocidad_maxima * -1 <= velocidad_escalada_x):
             self.velocidad_x -= self.aceleracion
             
-        if (teclas[self.controls.get_key('right')] and 
+        if (acciones & InputState.RIGHT and 
             self.velocidad_maxima >= velocidad_escalada_x):
             self.velocidad_x += self.aceleracion
 
-    def _handle_vertical_movement(self, teclas, velocidad_escalada_y):
+    def _handle_vertical_movement(self, acciones, velocidad_escalada_y):
         """Handle jumping and digging"""
-        resource_manager = ResourceManager()
-        
         # Jumping
-        if self._can_jump(teclas, velocidad_escalada_y):
-            self._perform_jump(resource_manager)
+        if self._can_jump(acciones, velocidad_escalada_y):
+            self._perform_jump()
             
         # Digging
-        if self._can_dig(teclas, velocidad_escalada_y):
-            self._perform_dig(resource_manager)
+        if self._can_dig(acciones, velocidad_escalada_y):
+            self._perform_dig()
 
-    def _can_jump(self, teclas, velocidad_escalada_y):
-        return (teclas[self.controls.get_key('up')] and 
+    def _can_jump(self, acciones, velocidad_escalada_y):
+        return (acciones & InputState.UP and 
                 self.velocidad_maxima * -1 <= velocidad_escalada_y and 
                 self.salto)
 
-    def _can_dig(self, teclas, velocidad_escalada_y):
-        return (teclas[self.controls.get_key('down')] and 
+    def _can_dig(self, acciones, velocidad_escalada_y):
+        return (acciones & InputState.DOWN and 
                 self.velocidad_maxima >= velocidad_escalada_y and 
                 self.cavar)
 
-    def _perform_jump(self, resource_manager):
-        resource_manager.play_sound('jump')
+    def _perform_jump(self):
+        self.efectos.sound('jump')
         self.salto = False
         self.estado_gravedad = GameConstants.STATE_FALLING
         self.velocidad_y -= self.aceleracion * GameConstants.JUMP_FORCE
 
-    def _perform_dig(self, resource_manager):
-        resource_manager.play_sound('dig')
+    def _perform_dig(self):
+        self.efectos.sound('dig')
+        self.efectos.dig(self.rect.centerx, self.rect.bottom, self.tamaño)
+        self.efectos.record(Telemetry.DIG, self.player_id, x=self.rect.centerx, y=self.rect.bottom)
         self.cavar = False
         self.estado_gravedad = GameConstants.STATE_DIGGING
         self.velocidad_y += self.aceleracion * GameConstants.JUMP_FORCE
 
-    def frenar(self, teclas):
+    def frenar(self, acciones):
         """Apply braking forces"""
-        self._brake_horizontal(teclas)
-        self._brake_vertical(teclas)
+        self._brake_horizontal(acciones)
+        self._brake_vertical(acciones)
 
-    def _brake_horizontal(self, teclas):
+    def _brake_horizontal(self, acciones):
         """Apply horizontal braking"""
-        left_key = self.controls.get_key('left')
-        right_key = self.controls.get_key('right')
-        
-        if not teclas[left_key] and not teclas[right_key] and self.velocidad_x != 0:
+        if not acciones & (InputState.LEFT | InputState.RIGHT) and self.velocidad_x != 0:
             self._apply_horizontal_brake()
         else:
             self._apply_horizontal_resistance()
 
-    def _brake_vertical(self, teclas):
+    def _brake_vertical(self, acciones):
         """Apply vertical braking"""
-        up_key = self.controls.get_key('up')
-        down_key = self.controls.get_key('down')
-        
-        if not teclas[up_key] and not teclas[down_key] and self.velocidad_y != 0:
+        if not acciones & (InputState.UP | InputState.DOWN) and self.velocidad_y != 0:
             self._apply_vertical_brake()
         else:
             self._apply_vertical_resistance()
@@ -530,18 +1618,17 @@ class Personaje:
     def cavando(self, nuevo_estado):
         self.cavar = nuevo_estado
 
-    def bloquear(self, teclas):
+    def bloquear(self, acciones):
         """Handle blocking"""
-        block_key = self.controls.get_key('block')
-        if teclas[block_key]:
+        if acciones & InputState.BLOCK:
             self.bloqueando = True
-            if teclas[self.controls.get_key('left')]:
+            if acciones & InputState.LEFT:
                 self.direccion_bloqueo = 'left'
-            elif teclas[self.controls.get_key('right')]:
+            elif acciones & InputState.RIGHT:
                 self.direccion_bloqueo = 'right'
-            elif teclas[self.controls.get_key('up')]:
+            elif acciones & InputState.UP:
                 self.direccion_bloqueo = 'up'
-            elif teclas[self.controls.get_key('down')]:
+            elif acciones & InputState.DOWN:
                 self.direccion_bloqueo = 'down'
         else:
             self.bloqueando = False
@@ -560,12 +1647,14 @@ class Personaje:
             'bottom': self.abajo_rect
         }
 
-    def calcular_colision(self, controlador, teclas):
-        collision_state = CollisionHandler.check_collisions(
+    def calcular_colision(self, controlador, acciones):
+        """Resolve platform contacts for this frame; returns the CollisionState"""
+        collision_state = controlador.check_collisions(
             self.get_collision_rects(), 
-            controlador.get_rects()
+            self.rect.inflate(self.tamaño * 2, self.tamaño * 2)
         )
-        CollisionHandler.update_character_state(self, collision_state, teclas)
+        CollisionHandler.update_character_state(self, collision_state, acciones)
+        return collision_state
                     
     def actualizar_posicion_rects(self):
         """Actualiza la posición de todos los rectángulos del personaje"""
@@ -599,34 +1688,36 @@ class Personaje:
             self.rect.y = self.ensima_Colision.y - self.tamaño
             self.actualizar_posicion_rects()
 
-    def mover(self, teclas, delta_time, pantalla):
+    def mover(self, acciones, delta_time, pantalla):
         self._check_respawn(pantalla)
-        self._update_physics(teclas)
+        self._update_physics(acciones)
         
         velocidad_escalada = self._scale_velocities(delta_time)
-        self.actualizar_velocidades(teclas, *velocidad_escalada)
+        self.actualizar_velocidades(acciones, *velocidad_escalada)
         self._update_position(velocidad_escalada)
 
     def _check_respawn(self, pantalla):
         """Check if player needs to respawn and apply respawn damage"""
         datos_pantalla = pantalla.get_screen_data(
-            "tiles_y", "tiles_x", "border_x", 
+            "world_tiles_y", "world_tiles_x", "border_x", 
             "border_y", "tile_size"
         )
         inicio_X = datos_pantalla[2] // 2 
         inicio_Y = datos_pantalla[3] // 2
+        # El fondo del mundo, no de la pantalla, es la caída
         tamaño_X = datos_pantalla[4] * datos_pantalla[1]
         tamaño_Y = datos_pantalla[4] * datos_pantalla[0]
         
         if self.rect.y > tamaño_Y + self.tamaño:
+            self.efectos.record(Telemetry.RESPAWN, self.player_id, x=self.rect.centerx, y=self.rect.y)
             self.take_damage(GameConstants.PLAYER_RESPAWN_DAMAGE)
             self.reiniciar_posicion(inicio_X + tamaño_X//2, inicio_Y + tamaño_Y//2)
 
-    def _update_physics(self, teclas):
+    def _update_physics(self, acciones):
         """Update physics state"""
         self.accion_gravedad()
-        self.frenar(teclas)
-        self.bloquear(teclas)
+        self.frenar(acciones)
+        self.bloquear(acciones)
 
     def _update_position(self, velocidades):
         """Update position based on scaled velocities"""
@@ -644,6 +1735,8 @@ class Personaje:
 
     def take_damage(self, amount):
         self.health = max(0, self.health - amount)
+        self.efectos.record(Telemetry.DAMAGE, self.player_id, value=amount,
+                            x=self.rect.centerx, y=self.rect.centery)
 
     def heal(self, amount):
         self.health = min(GameConstants.PLAYER_MAX_HEALTH, self.health + amount)
@@ -651,55 +1744,143 @@ class Personaje:
     def get_health_percentage(self):
         return self.health / GameConstants.PLAYER_MAX_HEALTH
 
+    def is_alive(self):
+        return self.health > 0
+
     def dibujar(self, pantalla=Pantalla):
         resource_manager = ResourceManager()
-        display = pantalla.get_screen_data("display")
+        render_queue = pantalla.render_queue
+        layer = (GameConstants.LAYER_DIGGING
+                 if self.estado_gravedad == GameConstants.STATE_DIGGING
+                 else GameConstants.LAYER_PLAYERS)
         
-        player_image = resource_manager.get_scaled_sprite(
+        player_image = resource_manager.get_sprite(
             'player', 
-            self.tamaño, 
-            self.tamaño, 
             self.sprite_config['row'], 
             self.sprite_config['col']
         )
         
         if player_image:
-            display.blit(player_image, self.rect)
+            render_queue.submit_scaled(player_image, self.rect, layer)
         else:
-            pygame.draw.rect(display, GameConstants.COLORS['RED'], self.rect)
-            
-        #probar hitbox
-        pygame.draw.rect(display, GameConstants.COLORS['BLUE'], self.arriba_rect)
-        pygame.draw.rect(display, GameConstants.COLORS['BLUE'], self.abajo_rect)
-        pygame.draw.rect(display, GameConstants.COLORS['BLUE'], self.derecha_rect)
-        pygame.draw.rect(display, GameConstants.COLORS['BLUE'], self.izquierda_rect)
+            render_queue.submit_rect(GameConstants.COLORS['RED'], self.rect, layer)
 
 
 # Clase para manejar el fondo
 class Fondo:
     def __init__(self):
-        pass
+        self.surface = None
+        self.surface_key = None
+        self.detail = True
+
+    def set_detail(self, detail):
+        """Without detail the screen is just cleared to black"""
+        self.detail = detail
 
     def dibujar(self, pantalla=Pantalla):
+        if not self.detail:
+            return
         datos_pantalla = pantalla.get_screen_data(
             "tiles_y", 
             "tiles_x",
             "border_x",
             "border_y",
             "tile_size",
-            "display"
+            "width",
+            "height"
             )
         
-        for y in range(datos_pantalla[0]):
-            for x in range(datos_pantalla[1]):
+        # El tablero se dibuja una sola vez y luego es un único blit
+        if self.surface is None or self.surface_key != datos_pantalla:
+            self.surface = self._crear_tablero(*datos_pantalla)
+            self.surface_key = datos_pantalla
+        pantalla.render_queue.submit(self.surface, (0, 0), GameConstants.LAYER_BACKGROUND)
+
+    def _crear_tablero(self, tiles_y, tiles_x, border_x, border_y, tile_size, width, height):
+        """Bake the checkerboard into a screen-sized surface"""
+        surface = pygame.Surface((width, height))
+        surface.fill(GameConstants.COLORS['BLACK'])
+        for y in range(tiles_y):
+            for x in range(tiles_x):
                  if (x + y) % 2 == 0:
                     rect = pygame.Rect(
-                        datos_pantalla[2] // 2 + x * datos_pantalla[4],
-                        datos_pantalla[3] // 2 + y * datos_pantalla[4],
-                        datos_pantalla[4],
-                        datos_pantalla[4]
+                        border_x // 2 + x * tile_size,
+                        border_y // 2 + y * tile_size,
+                        tile_size,
+                        tile_size
                     )
-                    pygame.draw.rect(datos_pantalla[5], GameConstants.COLORS['WHITE'], rect)
+                    pygame.draw.rect(surface, GameConstants.COLORS['WHITE'], rect)
+        return surface
+
+class FondoParallax:
+    """Scrolling starfield; each layer is pre-tiled once and drawn with a single blit"""
+    # (imagen, velocidad de deriva en baldosas/s, factor de desplazamiento con la cámara)
+    LAYERS = [
+        ('stars_far', 0.25, 0.2),
+        ('stars_near', 0.75, 0.5)
+    ]
+    PIXEL_SCALE = 8  # Baldosas de 8 px, como Plataformas.png
+
+    def __init__(self, layers=None):
+        self.layers = layers or FondoParallax.LAYERS
+        self.tiled = []       # (superficie, ancho de la baldosa, alto, deriva px/s, factor)
+        self.surface_key = None
+        self.start_time = pygame.time.get_ticks()
+        self.detail = True
+        for key, _, _ in self.layers:
+            ResourceManager().add_reload_listener(key, self._drop_layers)
+
+    def _drop_layers(self, key):
+        self.surface_key = None  # Se vuelven a teselar en el próximo dibujar
+
+    def set_detail(self, detail):
+        """Without detail only the farthest layer is drawn"""
+        self.detail = detail
+
+    def dibujar(self, pantalla=Pantalla):
+        datos_pantalla = pantalla.get_screen_data("width", "height", "tile_size")
+        if self.surface_key != datos_pantalla:
+            self.tiled = self._crear_capas(*datos_pantalla)
+            self.surface_key = datos_pantalla
+
+        width, height = datos_pantalla[:2]
+        seconds = (pygame.time.get_ticks() - self.start_time) / 1000.0
+        scroll = pantalla.get_view_rect().topleft
+        blits = []
+        for surface, tile_width, tile_height, drift, factor in self.tiled[:None if self.detail else 1]:
+            # La superficie mide pantalla + una baldosa: con el resto basta un blit desplazado
+            offset_x = int(seconds * drift + scroll[0] * factor) % tile_width
+            offset_y = int(scroll[1] * factor) % tile_height
+            blits.append((surface, (-offset_x, -offset_y)))
+        pantalla.render_queue.submit_batch(blits, GameConstants.LAYER_BACKGROUND,
+                                           width * height * len(blits))
+
+    def _crear_capas(self, width, height, tile_size):
+        """Tile every layer image into a (screen + one tile) surface"""
+        scale = max(1, tile_size // FondoParallax.PIXEL_SCALE)
+        resource_manager = ResourceManager()
+        capas = []
+        for index, (key, drift, factor) in enumerate(self.layers):
+            tile = resource_manager.get_image(key)
+            if tile is None:
+                print(f"Warning: Background layer {key} is not loaded")
+                continue
+            tile = pygame.transform.scale(tile, (tile.get_width() * scale, tile.get_height() * scale))
+            tile_width, tile_height = tile.get_size()
+            surface = pygame.Surface((width + tile_width, height + tile_height), pygame.SRCALPHA)
+            for y in range(0, surface.get_height(), tile_height):
+                for x in range(0, surface.get_width(), tile_width):
+                    surface.blit(tile, (x, y))
+            # La capa del fondo es opaca; las demás solo tienen alfa 0/255
+            if index == 0:
+                base = pygame.Surface(surface.get_size())
+                base.fill(GameConstants.COLORS['BLACK'])
+                base.blit(surface, (0, 0))
+                surface = base.convert() if pygame.display.get_surface() else base
+            else:
+                surface = ParticleSystem._bake_frame(surface)
+            capas.append((surface, tile_width, tile_height, drift * tile_size, factor))
+        return capas
 
 
 # Clase para manejar Plataformas
@@ -731,7 +1912,7 @@ class Plataforma:
     def dibujar(self, pantalla=Pantalla):
         if self.visible:
             tamaño = pantalla.get_screen_data("tile_size")
-            pantalla = pantalla.get_screen_data("display")
+            render_queue = pantalla.render_queue
             
             #platform = _make_plataform(pantalla)
             resource_manager = ResourceManager()
@@ -739,26 +1920,217 @@ class Plataforma:
             platform_row = resource_manager.get_scaled_sprite('platform_rock', tamaño, tamaño, 0, 0)
 
             if platform_row:
-                pantalla.blit(platform_row, self.rect)
+                render_queue.submit(platform_row, self.rect, GameConstants.LAYER_PLATFORMS)
             else:
-                pygame.draw.rect(pantalla, GameConstants.COLORS['GREEN'], self.rect)
+                render_queue.submit_rect(GameConstants.COLORS['GREEN'], self.rect,
+                                         GameConstants.LAYER_PLATFORMS)
+
+class PlataformaMovil(Plataforma):
+    """Kinematic platform: loops along a waypoint path and/or shows and hides on a timer
+
+    ruta lists top-left positions visited in order at velocidad px/s, then back to
+    the first. With tiempo_visible and tiempo_oculta it is there for the first and
+    gone for the second, in seconds. Position and visibility are functions of
+    time, so replays and resets always land in the same place.
+    """
+    def __init__(self, ruta=(), velocidad=0.0, tiempo_visible=0.0, tiempo_oculta=0.0, fase=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.ruta = [tuple(punto) for punto in ruta] or [self.rect.topleft]
+        self.velocidad = velocidad
+        self.tiempo_visible = tiempo_visible
+        self.tiempo_oculta = tiempo_oculta
+        self.fase = fase
+        self.tiempo = fase
+        # Longitud de cada tramo (el último vuelve al primer punto) para ubicar la plataforma
+        self.tramos = []
+        for (x1, y1), (x2, y2) in zip(self.ruta, self.ruta[1:] + self.ruta[:1]):
+            self.tramos.append((x1, y1, x2 - x1, y2 - y1, math.hypot(x2 - x1, y2 - y1)))
+        self.longitud = sum(tramo[4] for tramo in self.tramos)
+        # Todo lo que puede llegar a ocupar a lo largo de la ruta
+        self.alcance = self.rect.unionall([pygame.Rect(punto, self.rect.size) for punto in self.ruta])
+
+    def posicion(self, tiempo=None):
+        """Top-left corner at the current time (or at tiempo)"""
+        if not self.longitud or not self.velocidad:
+            return self.ruta[0]
+        tiempo = self.tiempo if tiempo is None else tiempo
+        distancia = (tiempo * self.velocidad) % self.longitud
+        for x, y, dx, dy, largo in self.tramos:
+            if distancia <= largo and largo:
+                t = distancia / largo
+                return round(x + dx * t), round(y + dy * t)
+            distancia -= largo
+        return self.ruta[0]
+
+    def visible_ahora(self, tiempo=None):
+        if not (self.tiempo_visible and self.tiempo_oculta):
+            return True
+        tiempo = self.tiempo if tiempo is None else tiempo
+        return tiempo % (self.tiempo_visible + self.tiempo_oculta) < self.tiempo_visible
+
+class PlatformGrid:
+    """Uniform spatial hash of platform indices, so queries only visit nearby cells"""
+    def __init__(self, cell_size):
+        self.cell_size = max(1, int(cell_size))
+        self.cells = {}  # (columna, fila) -> [índices de plataforma]
+
+    def _cell_range(self, rect):
+        cell = self.cell_size
+        return (range(rect.left // cell, (rect.right - 1) // cell + 1),
+                range(rect.top // cell, (rect.bottom - 1) // cell + 1))
+
+    def rebuild(self, plataformas):
+        self.cells = {}
+        for index, plataforma in enumerate(plataformas):
+            columns, rows = self._cell_range(plataforma.rect)
+            for column in columns:
+                for row in rows:
+                    self.cells.setdefault((column, row), []).append(index)
+
+    def move(self, index, old_rect, new_rect):
+        """Move one platform between cells; nothing to do while it stays within the same ones"""
+        old_columns, old_rows = self._cell_range(old_rect)
+        new_columns, new_rows = self._cell_range(new_rect)
+        if old_columns == new_columns and old_rows == new_rows:
+            return False
+        for column in old_columns:
+            for row in old_rows:
+                cell = self.cells[(column, row)]
+                cell.remove(index)
+                if not cell:
+                    del self.cells[(column, row)]
+        for column in new_columns:
+            for row in new_rows:
+                self.cells.setdefault((column, row), []).append(index)
+        return True
+
+    def query(self, rect):
+        """Indices of the platforms in the cells rect touches, in list order"""
+        columns, rows = self._cell_range(rect)
+        found = set()
+        for column in columns:
+            for row in rows:
+                found.update(self.cells.get((column, row), ()))
+        return sorted(found)
 
 class controlador_plataformas:
     def __init__(self):
         self.plataformas = []
+        self.moviles = []  # PlataformaMovil de la lista, avanzadas por mover_plataformas
+        self.version = 0  # Cambia cada vez que cambia la lista de plataformas
+        self.layout_version = 0  # Cambia además cuando una plataforma se mueve, aparece o desaparece
+        self.cell_size = GameConstants.PLATFORM_GRID_CELL * 32
+        self.grid = None
+        self.grid_version = None
+        self.grid_indices = {}  # id(plataforma) -> índice en la lista del último rebuild
+        self.reindexed = 0      # Plataformas que cambiaron de celda en el último mover_plataformas
+        self.reloj = 0.0        # Segundos que llevan andando las plataformas móviles
 
     def agregar_plataforma(self, plataforma):
         self.plataformas.append(plataforma)
+        self._list_changed()
 
     def remover_plataforma(self, plataforma):
         if plataforma in self.plataformas:
             self.plataformas.remove(plataforma)
+            self._list_changed()
+
+    def agregar_plataformas(self, plataformas):
+        """Add many platforms with a single index rebuild"""
+        self.plataformas.extend(plataformas)
+        self._list_changed()
+
+    def remover_plataformas(self, plataformas):
+        """Remove many platforms with a single pass over the list"""
+        removidas = set(map(id, plataformas))
+        self.plataformas = [p for p in self.plataformas if id(p) not in removidas]
+        self._list_changed()
+
+    def _list_changed(self):
+        self.moviles = [p for p in self.plataformas if isinstance(p, PlataformaMovil)]
+        self.version += 1
+        self.layout_version += 1
 
     def get_rects(self):
-        return [plataforma.get_rect() for plataforma in self.plataformas]
+        """Rects of the platforms that are there right now (hidden ones do not collide)"""
+        return [plataforma.get_rect() for plataforma in self.plataformas if plataforma.visible]
+
+    def _get_grid(self):
+        if self.grid is None or self.grid_version != self.version:
+            self.grid = PlatformGrid(self.cell_size)
+            self.grid.rebuild(self.plataformas)
+            self.grid_version = self.version
+            self.grid_indices = {id(plataforma): index for index, plataforma in enumerate(self.plataformas)}
+        return self.grid
+
+    def mover_plataforma(self, plataforma, x, y):
+        """Move a platform, updating only its own cells in the index"""
+        anterior = plataforma.rect.copy()
+        plataforma.rect.topleft = (x, y)
+        self.layout_version += 1
+        # Con el índice desfasado no hace falta: se reconstruye entero en la próxima consulta
+        if self.grid is not None and self.grid_version == self.version:
+            return self.grid.move(self.grid_indices[id(plataforma)], anterior, plataforma.rect)
+        return False
+
+    def mover_plataformas(self, delta_time, jugadores=()):
+        """Advance the kinematic platforms, carrying whoever stands on one that moved"""
+        self.reindexed = 0
+        self.reloj += delta_time
+        # ensima_Colision es el mismo rect que devolvió la consulta de colisiones
+        apoyados = {}
+        for jugador in jugadores:
+            if jugador.ensima_Colision is not None and jugador.estado_gravedad != GameConstants.STATE_FALLING:
+                apoyados.setdefault(id(jugador.ensima_Colision), []).append(jugador)
+        for plataforma in self.moviles:
+            plataforma.tiempo = plataforma.fase + self.reloj
+            visible = plataforma.visible_ahora()
+            if visible != plataforma.visible:
+                plataforma.visible = visible
+                self.layout_version += 1
+            x, y = plataforma.posicion()
+            dx, dy = x - plataforma.rect.x, y - plataforma.rect.y
+            if not (dx or dy):
+                continue
+            for jugador in apoyados.get(id(plataforma.rect), ()):
+                jugador.rect.move_ip(dx, dy)
+                jugador.actualizar_posicion_rects()
+            self.reindexed += self.mover_plataforma(plataforma, x, y)
+
+    def reiniciar_moviles(self):
+        """Put every kinematic platform back at its starting time"""
+        self.poner_reloj(0.0)
+
+    def poner_reloj(self, reloj, jugadores=()):
+        """Move the kinematic platforms to where they are reloj seconds into the match"""
+        self.mover_plataformas(reloj - self.reloj, jugadores)
+
+    def moviles_cerca(self, rect):
+        """Kinematic platforms whose path comes within rect"""
+        return [plataforma for plataforma in self.moviles if plataforma.alcance.colliderect(rect)]
+
+    def movil_specs(self):
+        """Picklable description of the kinematic platforms, enough to rebuild them elsewhere"""
+        return [(p.tipo, p.ancho, p.alto, p.ruta, p.velocidad, p.tiempo_visible, p.tiempo_oculta, p.fase)
+                for p in self.moviles]
+
+    def query(self, rect):
+        """Visible platforms that may overlap rect"""
+        rect = pygame.Rect(rect)
+        return [self.plataformas[index] for index in self._get_grid().query(rect)
+                if self.plataformas[index].visible and self.plataformas[index].rect.colliderect(rect)]
+
+    def get_rects_near(self, rect):
+        """Collision rects of the platforms that may overlap rect"""
+        return [plataforma.rect for plataforma in self.query(rect)]
+
+    def check_collisions(self, character_rects, area):
+        """CollisionState for a character's sensors, testing only the platforms in area"""
+        return CollisionHandler.check_collisions(character_rects, self.get_rects_near(area))
 
     def dibujar(self, pantalla=Pantalla):
-        for plataforma in self.plataformas:
+        # Sólo las plataformas dentro de la vista
+        for plataforma in self.query(pantalla.get_view_rect()):
             plataforma.dibujar(pantalla)
 
 class PlatformConfig:
@@ -775,6 +2147,8 @@ def crear_plataformas(controlador=controlador_plataformas, pantalla=Pantalla):
         "mid_y", "mid_x", "tile_size", 
         "border_x", "border_y", "tiles_x", "tiles_y"
     )
+    screens_x, screens_y = pantalla.get_screen_data("screens_x", "screens_y")
+    controlador.cell_size = screen_data[2] * GameConstants.PLATFORM_GRID_CELL
     
     # Configuración de todas las plataformas
     plataformas_config = [
@@ -784,49 +2158,646 @@ def crear_plataformas(controlador=controlador_plataformas, pantalla=Pantalla):
         PlatformConfig("prueba2", 1, 4, 25, 14)
     ]
 
-    # Crear y agregar cada plataforma
-    for config in plataformas_config:
-        x, y = pantalla.screen_data.calculate_position(config.pos_x, config.pos_y)
-        
-        plataforma = Plataforma(
-            tipo=config.tipo,
-            alto=screen_data[2] * config.alto_factor,
-            ancho=screen_data[2] * config.ancho_factor,
-            posicion_X=x,
-            posicion_Y=y
-        )
-        controlador.agregar_plataforma(plataforma)
+    # Crear y agregar cada plataforma; un mundo grande repite la pantalla en cuadrícula
+    for screen_y in range(screens_y):
+        for screen_x in range(screens_x):
+            for config in plataformas_config:
+                x, y = pantalla.screen_data.calculate_position(
+                    config.pos_x + screen_x * screen_data[5],
+                    config.pos_y + screen_y * screen_data[6])
+
+                plataforma = Plataforma(
+                    tipo=config.tipo,
+                    alto=screen_data[2] * config.alto_factor,
+                    ancho=screen_data[2] * config.ancho_factor,
+                    posicion_X=x,
+                    posicion_Y=y
+                )
+                controlador.agregar_plataforma(plataforma)
 
     return controlador
 
+def crear_plataformas_moviles(controlador, pantalla, count, seed=0):
+    """Scatter count kinematic "voladora" platforms over the world, each on its own loop"""
+    rng = random.Random(seed)
+    tamaño, world_width, world_height = pantalla.get_screen_data("tile_size", "world_width", "world_height")
+    alcance = GameConstants.MOVING_PLATFORM_RANGE * tamaño
+    plataformas = []
+    for _ in range(count):
+        ancho = tamaño * rng.choice((2, 3, 4))
+        alto = tamaño // 2
+        x = rng.uniform(0, world_width - ancho - alcance)
+        y = rng.uniform(tamaño * 2, world_height - alto - alcance)
+        # Ida y vuelta horizontal, vertical o un rectángulo
+        forma = rng.randrange(3)
+        dx, dy = rng.uniform(tamaño, alcance), rng.uniform(tamaño, alcance)
+        if forma == 0:
+            ruta = [(x, y), (x + dx, y)]
+        elif forma == 1:
+            ruta = [(x, y), (x, y + dy)]
+        else:
+            ruta = [(x, y), (x + dx, y), (x + dx, y + dy), (x, y + dy)]
+        intermitente = rng.random() < GameConstants.MOVING_PLATFORM_TOGGLE_SHARE
+        presente, ausente = GameConstants.MOVING_PLATFORM_TOGGLE if intermitente else (0.0, 0.0)
+        plataformas.append(PlataformaMovil(
+            tipo="voladora", ancho=ancho, alto=alto, posicion_X=round(x), posicion_Y=round(y),
+            ruta=[(round(px), round(py)) for px, py in ruta],
+            velocidad=rng.uniform(*GameConstants.MOVING_PLATFORM_SPEED) * tamaño,
+            tiempo_visible=presente, tiempo_oculta=ausente,
+            fase=rng.uniform(0, 10.0)))
+    controlador.agregar_plataformas(plataformas)
+    controlador.reiniciar_moviles()
+    return plataformas
+
+class LevelFile:
+    """Chunked level on disk, read through mmap so only the chunks used get paged in
+
+    Layout: header, chunks_x * chunks_y index entries (offset, count) in row order,
+    then the platform records; positions are in tiles relative to their chunk.
+    """
+    MAGIC = b'UCBL'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHHHII')   # magic, versión, ancho y alto del chunk, reservado, chunks_x, chunks_y
+    INDEX_ENTRY = struct.Struct('<II')    # offset, número de plataformas
+    PLATFORM = struct.Struct('<4fB3x')    # x, y, ancho, alto, tipo
+    TYPES = ['suelo', 'voladora', 'prueba1', 'prueba2']
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, chunk_width, chunk_height, _, chunks_x, chunks_y = \
+            LevelFile.HEADER.unpack_from(self.data, 0)
+        if magic != LevelFile.MAGIC or version != LevelFile.VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {LevelFile.VERSION} level file")
+        self.chunk_size = (chunk_width, chunk_height)
+        self.chunks = (chunks_x, chunks_y)
+
+    @property
+    def size_tiles(self):
+        return (self.chunks[0] * self.chunk_size[0], self.chunks[1] * self.chunk_size[1])
+
+    def read_chunk(self, chunk_x, chunk_y):
+        """Platforms of one chunk as (x, y, width, height, type) in level tiles"""
+        if not (0 <= chunk_x < self.chunks[0] and 0 <= chunk_y < self.chunks[1]):
+            return []
+        entry = LevelFile.HEADER.size + (chunk_y * self.chunks[0] + chunk_x) * LevelFile.INDEX_ENTRY.size
+        offset, count = LevelFile.INDEX_ENTRY.unpack_from(self.data, entry)
+        origin_x = chunk_x * self.chunk_size[0]
+        origin_y = chunk_y * self.chunk_size[1]
+        records = self.data[offset:offset + count * LevelFile.PLATFORM.size]
+        return [(origin_x + x, origin_y + y, width, height, LevelFile.TYPES[tipo])
+                for x, y, width, height, tipo in LevelFile.PLATFORM.iter_unpack(records)]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    @staticmethod
+    def write(path, chunks_x, chunks_y, chunk_platforms, chunk_size=GameConstants.LEVEL_CHUNK_TILES):
+        """Write a level, asking chunk_platforms(x, y) for each chunk's platforms in turn"""
+        index = bytearray(chunks_x * chunks_y * LevelFile.INDEX_ENTRY.size)
+        with open(path, 'wb') as archivo:
+            archivo.write(LevelFile.HEADER.pack(LevelFile.MAGIC, LevelFile.VERSION,
+                                                chunk_size, chunk_size, 0, chunks_x, chunks_y))
+            archivo.write(index)  # Se rellena al final
+            offset = archivo.tell()
+            for chunk_y in range(chunks_y):
+                for chunk_x in range(chunks_x):
+                    records = [LevelFile.PLATFORM.pack(x, y, width, height, LevelFile.TYPES.index(tipo))
+                               for x, y, width, height, tipo in chunk_platforms(chunk_x, chunk_y)]
+                    LevelFile.INDEX_ENTRY.pack_into(
+                        index, (chunk_y * chunks_x + chunk_x) * LevelFile.INDEX_ENTRY.size,
+                        offset, len(records))
+                    archivo.write(b''.join(records))
+                    offset += len(records) * LevelFile.PLATFORM.size
+            archivo.seek(LevelFile.HEADER.size)
+            archivo.write(index)
+
+def generar_nivel(path, chunks_x, chunks_y, seed=0):
+    """Procedural level: every chunk gets a ground strip and a few floating platforms"""
+    size = GameConstants.LEVEL_CHUNK_TILES
+
+    def chunk_platforms(chunk_x, chunk_y):
+        rng = random.Random((seed * 1000003 + chunk_y) * 1000003 + chunk_x)
+        ancho = rng.randint(size // 2, size)
+        plataformas = [(rng.randint(0, size - ancho), size * 3 / 4, ancho, 1, 'suelo')]
+        for _ in range(rng.randint(0, 2)):
+            ancho = rng.randint(2, 5)
+            plataformas.append((rng.randint(0, size - ancho), rng.randint(2, size // 2),
+                                ancho, rng.choice((0.5, 1)), 'voladora'))
+        return plataformas
+
+    LevelFile.write(path, chunks_x, chunks_y, chunk_platforms, size)
+
+class LevelStreamer:
+    """Keeps the chunks around the active area resident, loading them on a background thread"""
+    def __init__(self, level, controlador, pantalla, budget=GameConstants.LEVEL_RESIDENT_CHUNKS):
+        self.level = level
+        self.controlador = controlador
+        self.screen_data = pantalla.screen_data
+        tile_size = pantalla.get_screen_data("tile_size")
+        self.chunk_pixels = (level.chunk_size[0] * tile_size, level.chunk_size[1] * tile_size)
+        self.budget = budget
+        self.resident = {}    # (chunk_x, chunk_y) -> [Plataforma]; sólo el hilo principal
+        self.loading = set()  # Pedidos al hilo y aún no aplicados
+        self.wanted = set()
+        self.wanted_range = None
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.chunks_loaded = 0
+        self.chunks_unloaded = 0
+        self.thread = threading.Thread(target=self._worker, name="niveles", daemon=True)
+        self.thread.start()
+
+    def _chunk_range(self, rect):
+        """Chunks overlapping rect plus the stream margin, clipped to the level"""
+        width, height = self.chunk_pixels
+        margin = GameConstants.LEVEL_STREAM_MARGIN
+        left = max(0, rect.left // width - margin)
+        top = max(0, rect.top // height - margin)
+        right = min(self.level.chunks[0] - 1, (rect.right - 1) // width + margin)
+        bottom = min(self.level.chunks[1] - 1, (rect.bottom - 1) // height + margin)
+        return left, top, right, bottom
+
+    def prime(self, rect):
+        """Load the chunks around rect synchronously, e.g. before the first frame"""
+        self._set_wanted(rect)
+        nuevas = []
+        for key in self.wanted:
+            self.resident[key] = self._build_chunk(key)
+            nuevas += self.resident[key]
+        self.chunks_loaded += len(self.wanted)
+        self.controlador.agregar_plataformas(nuevas)
+
+    def update(self, rect):
+        """Request the chunks rect needs, apply finished loads and evict over the budget"""
+        if self._set_wanted(rect):
+            missing = [key for key in self.wanted if key not in self.resident and key not in self.loading]
+            if missing:
+                center = rect.centerx / self.chunk_pixels[0], rect.centery / self.chunk_pixels[1]
+                missing.sort(key=lambda key: (key[0] - center[0]) ** 2 + (key[1] - center[1]) ** 2)
+                self.loading.update(missing)
+                self.requests.put(missing)
+        self._apply_loads()
+        self._evict(rect)
+
+    def _set_wanted(self, rect):
+        chunk_range = self._chunk_range(rect)
+        if chunk_range == self.wanted_range:
+            return False
+        self.wanted_range = chunk_range
+        left, top, right, bottom = chunk_range
+        self.wanted = {(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)}
+        return True
+
+    def _apply_loads(self):
+        nuevas = []
+        while True:
+            try:
+                key, plataformas = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.loading.discard(key)
+            # Si la cámara ya se fue, el chunk no hace falta
+            if key in self.wanted and key not in self.resident:
+                self.resident[key] = plataformas
+                nuevas += plataformas
+                self.chunks_loaded += 1
+        if nuevas:
+            self.controlador.agregar_plataformas(nuevas)
+
+    def _evict(self, rect):
+        """Drop the chunks farthest from rect that are no longer wanted"""
+        limit = max(self.budget, len(self.wanted))
+        if len(self.resident) <= limit:
+            return
+        center = rect.centerx / self.chunk_pixels[0], rect.centery / self.chunk_pixels[1]
+        candidates = sorted((key for key in self.resident if key not in self.wanted),
+                            key=lambda key: (key[0] - center[0]) ** 2 + (key[1] - center[1]) ** 2,
+                            reverse=True)
+        removidas = []
+        for key in candidates[:len(self.resident) - limit]:
+            removidas += self.resident.pop(key)
+            self.chunks_unloaded += 1
+        self.controlador.remover_plataformas(removidas)
+
+    def _worker(self):
+        """Background thread: read chunks from the mapped file and build their platforms"""
+        while True:
+            keys = self.requests.get()
+            if keys is None:
+                break
+            for key in keys:
+                self.results.put((key, self._build_chunk(key)))
+
+    def _build_chunk(self, key):
+        tile_size = self.screen_data.tile_size
+        plataformas = []
+        for x, y, width, height, tipo in self.level.read_chunk(*key):
+            posicion_X, posicion_Y = self.screen_data.calculate_position(x, y)
+            plataformas.append(Plataforma(
+                tipo=tipo,
+                alto=tile_size * height,
+                ancho=tile_size * width,
+                posicion_X=posicion_X,
+                posicion_Y=posicion_Y
+            ))
+        return plataformas
+
+    def resident_platforms(self):
+        return sum(len(plataformas) for plataformas in self.resident.values())
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+        self.level.close()
+
+class Terreno:
+    """Destructible terrain: a bit mask at subtile resolution, collided and drawn per block
+
+    Works as a drop-in for controlador_plataformas; its platforms are the collider
+    rects of each block, rebuilt only for the blocks a carve touched.
+    """
+    def __init__(self, pantalla, rects):
+        tile_size, border_x, border_y, world_width, world_height = pantalla.get_screen_data(
+            "tile_size", "border_x", "border_y", "world_width", "world_height")
+        self.cell = max(1, tile_size // GameConstants.TERRAIN_SUBTILES)
+        self.origin = (border_x // 2, border_y // 2)
+        self.block = GameConstants.TERRAIN_BLOCK_CELLS
+        self.mask = pygame.mask.Mask((-(-(world_width - self.origin[0]) // self.cell),
+                                      -(-(world_height - self.origin[1]) // self.cell)))
+        self.cell_size = self.cell * self.block  # Para el índice de las copias del pipeline
+        self.dig_radius = tile_size * GameConstants.TERRAIN_DIG_RADIUS
+        self.source_rects = [pygame.Rect(rect) for rect in rects]
+        self.blocks = {}     # (columna, fila) -> [Plataforma] colisionadores del bloque
+        self.surfaces = {}   # (columna, fila) -> superficie del bloque, se crea al dibujarlo
+        self.dirty = set()
+        self.version = 0
+        self.cached_plataformas = None
+        self.filled_masks = {}
+        self.circle_masks = {}
+        self.reset()
+
+    @classmethod
+    def from_controller(cls, controlador, pantalla):
+        return cls(pantalla, controlador.get_rects())
+
+    def reset(self):
+        """Rebuild the terrain from the original platforms"""
+        self.mask.clear()
+        for rect in self.source_rects:
+            left, top, right, bottom = self._to_cells(rect, rounded=True)
+            if right > left and bottom > top:
+                self.mask.draw(self._filled_mask(right - left, bottom - top), (left, top))
+        self.blocks.clear()
+        self.surfaces.clear()
+        columns, rows = self._block_count()
+        self.dirty = {(column, row) for column in range(columns) for row in range(rows)}
+        self._refresh()
+
+    def _block_count(self):
+        width, height = self.mask.get_size()
+        return -(-width // self.block), -(-height // self.block)
+
+    def _to_cells(self, rect, rounded=False):
+        """Cell range (left, top, right, bottom) covered by a pixel rect, clipped to the mask"""
+        width, height = self.mask.get_size()
+        x = (rect[0] - self.origin[0]) / self.cell
+        y = (rect[1] - self.origin[1]) / self.cell
+        right = x + rect[2] / self.cell
+        bottom = y + rect[3] / self.cell
+        if rounded:
+            x, y, right, bottom = round(x), round(y), round(right), round(bottom)
+        else:
+            x, y, right, bottom = math.floor(x), math.floor(y), math.ceil(right), math.ceil(bottom)
+        return max(0, x), max(0, y), min(width, right), min(height, bottom)
+
+    def _blocks_in(self, left, top, right, bottom):
+        block = self.block
+        return [(column, row)
+                for column in range(left // block, (right - 1) // block + 1)
+                for row in range(top // block, (bottom - 1) // block + 1)]
+
+    def _filled_mask(self, width, height):
+        key = (width, height)
+        mask = self.filled_masks.get(key)
+        if mask is None:
+            mask = self.filled_masks[key] = pygame.mask.Mask(key, fill=True)
+        return mask
+
+    def _circle_mask(self, radius):
+        mask = self.circle_masks.get(radius)
+        if mask is None:
+            surface = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+            pygame.draw.circle(surface, (255, 255, 255, 255), (radius, radius), radius)
+            mask = self.circle_masks[radius] = pygame.mask.from_surface(surface)
+        return mask
+
+    def carve(self, center, radius=None):
+        """Remove a disc of terrain; the work is deferred to the next query or draw"""
+        radius = max(1, round((radius or self.dig_radius) / self.cell))
+        x = int((center[0] - self.origin[0]) // self.cell) - radius
+        y = int((center[1] - self.origin[1]) // self.cell) - radius
+        circle = self._circle_mask(radius)
+        if self.mask.overlap(circle, (x, y)) is None:
+            return
+        self.mask.erase(circle, (x, y))
+        width, height = self.mask.get_size()
+        size = radius * 2 + 1
+        self.dirty.update(self._blocks_in(max(0, x), max(0, y), min(width, x + size), min(height, y + size)))
+
+    def _refresh(self):
+        """Rebuild colliders of the dirty blocks only; their surfaces are redrawn when seen"""
+        if not self.dirty:
+            return
+        for key in self.dirty:
+            colliders = self._build_colliders(key)
+            if colliders:
+                self.blocks[key] = colliders
+            else:
+                self.blocks.pop(key, None)
+            self.surfaces.pop(key, None)
+        self.dirty.clear()
+        self.cached_plataformas = None
+        self.version += 1
+
+    def _block_mask(self, key):
+        mask = pygame.mask.Mask((self.block, self.block))
+        mask.draw(self.mask, (-key[0] * self.block, -key[1] * self.block))
+        return mask
+
+    def _build_colliders(self, key):
+        """Merge each row's runs of set cells downwards into as few rects as possible"""
+        mask = self._block_mask(key)
+        if not mask.count():
+            return []
+        width, height = mask.get_size()
+        open_runs = {}  # (inicio, fin) -> fila donde empezó
+        rects = []
+        for y in range(height + 1):
+            runs = set()
+            x = 0
+            while y < height and x < width:
+                if mask.get_at((x, y)):
+                    start = x
+                    while x < width and mask.get_at((x, y)):
+                        x += 1
+                    runs.add((start, x))
+                x += 1
+            for run in list(open_runs):
+                if run not in runs:
+                    rects.append((run[0], open_runs.pop(run), run[1], y))
+            for run in runs:
+                open_runs.setdefault(run, y)
+
+        base_x = self.origin[0] + key[0] * self.block * self.cell
+        base_y = self.origin[1] + key[1] * self.block * self.cell
+        return [Plataforma(tipo='terreno',
+                           posicion_X=base_x + left * self.cell,
+                           posicion_Y=base_y + top * self.cell,
+                           ancho=(right - left) * self.cell,
+                           alto=(bottom - top) * self.cell)
+                for left, top, right, bottom in rects]
+
+    @property
+    def plataformas(self):
+        self._refresh()
+        if self.cached_plataformas is None:
+            self.cached_plataformas = [p for colliders in self.blocks.values() for p in colliders]
+        return self.cached_plataformas
+
+    def get_rects(self):
+        return [plataforma.rect for plataforma in self.plataformas]
+
+    def query(self, rect):
+        """Colliders overlapping rect, looked up by block"""
+        self._refresh()
+        rect = pygame.Rect(rect)
+        found = []
+        for key in self._blocks_in(*self._to_cells(rect)):
+            found += [p for p in self.blocks.get(key, ()) if p.rect.colliderect(rect)]
+        return found
+
+    def get_rects_near(self, rect):
+        return [plataforma.rect for plataforma in self.query(rect)]
+
+    def _overlaps(self, rect):
+        left, top, right, bottom = self._to_cells(rect)
+        if right <= left or bottom <= top:
+            return False
+        return self.mask.overlap(self._filled_mask(right - left, bottom - top), (left, top)) is not None
+
+    def check_collisions(self, character_rects, area=None):
+        """Sensor collisions by mask overlap; the ground is the highest collider under the feet"""
+        self._refresh()
+        state = CollisionState()
+        state.body = self._overlaps(character_rects['main'])
+        state.top = self._overlaps(character_rects['top'])
+        if self._overlaps(character_rects['bottom']):
+            state.platform = min(self.get_rects_near(character_rects['bottom']),
+                                 key=lambda rect: rect.top, default=None)
+            state.bottom = state.platform is not None
+        return state
+
+    def dibujar(self, pantalla=Pantalla):
+        self._refresh()
+        left, top, right, bottom = self._to_cells(pantalla.get_view_rect())
+        if right <= left or bottom <= top:
+            return
+        render_queue = pantalla.render_queue
+        for key in self._blocks_in(left, top, right, bottom):
+            if key not in self.blocks:
+                continue
+            surface = self.surfaces.get(key)
+            if surface is None:
+                surface = self.surfaces[key] = self._render_block(key)
+            render_queue.submit(surface, (self.origin[0] + key[0] * self.block * self.cell,
+                                          self.origin[1] + key[1] * self.block * self.cell),
+                                GameConstants.LAYER_PLATFORMS)
+
+    def _render_block(self, key):
+        """Block surface straight from its mask, scaled up and colorkeyed"""
+        surface = self._block_mask(key).to_surface(
+            setcolor=GameConstants.COLORS['GREEN'], unsetcolor=GameConstants.PARTICLE_COLORKEY)
+        surface = pygame.transform.scale(surface, (self.block * self.cell, self.block * self.cell))
+        if pygame.display.get_surface():
+            surface = surface.convert()
+        surface.set_colorkey(GameConstants.PARTICLE_COLORKEY, pygame.RLEACCEL)
+        return surface
+
+def crear_jugadores(pantalla=Pantalla, num_players=2):
+    """Create the players at their spawn positions"""
+    tamaño_baldosa = pantalla.get_screen_data("tile_size")
+    screen_width = pantalla.get_screen_data("width")
+    screen_height = pantalla.get_screen_data("height")
+    spawn_positions = GameConstants.calculate_spawn_positions(
+        screen_width, screen_height, num_players)
+
+    return [
+        Personaje(
+            spawn_positions[player_id][0],
+            spawn_positions[player_id][1],
+            tamaño_baldosa,
+            player_id=player_id
+        )
+        for player_id in range(1, num_players + 1)
+    ]
+
+class Camera:
+    """Follows the players through a dead zone with exponential smoothing, clamped to the world"""
+    def __init__(self, view_width, view_height, world_width, world_height):
+        self.view_width = view_width
+        self.view_height = view_height
+        self.world_width = world_width
+        self.world_height = world_height
+        self.x = 0.0
+        self.y = 0.0
+
+    @staticmethod
+    def _focus(targets):
+        """Center of the box around every target"""
+        left = min(target.rect.left for target in targets)
+        right = max(target.rect.right for target in targets)
+        top = min(target.rect.top for target in targets)
+        bottom = max(target.rect.bottom for target in targets)
+        return (left + right) / 2, (top + bottom) / 2
+
+    def follow(self, targets, delta_time):
+        if not targets:
+            return
+        focus_x, focus_y = self._focus(targets)
+        # Sólo se mueve lo que el objetivo sale de la zona muerta del centro
+        half_x = self.view_width * GameConstants.CAMERA_DEAD_ZONE / 2
+        half_y = self.view_height * GameConstants.CAMERA_DEAD_ZONE / 2
+        center_x = self.x + self.view_width / 2
+        center_y = self.y + self.view_height / 2
+        target_x = self.x + max(0, abs(focus_x - center_x) - half_x) * math.copysign(1, focus_x - center_x)
+        target_y = self.y + max(0, abs(focus_y - center_y) - half_y) * math.copysign(1, focus_y - center_y)
+
+        blend = 1 - math.exp(-GameConstants.CAMERA_SMOOTHING * delta_time)
+        self.x += (target_x - self.x) * blend
+        self.y += (target_y - self.y) * blend
+        self._clamp()
+
+    def snap(self, targets):
+        """Center on the targets immediately, e.g. after a reset"""
+        if targets:
+            focus_x, focus_y = self._focus(targets)
+            self.x = focus_x - self.view_width / 2
+            self.y = focus_y - self.view_height / 2
+            self._clamp()
+
+    def _clamp(self):
+        self.x = min(max(self.x, 0), max(0, self.world_width - self.view_width))
+        self.y = min(max(self.y, 0), max(0, self.world_height - self.view_height))
+
+    @property
+    def view_rect(self):
+        return pygame.Rect(round(self.x), round(self.y), self.view_width, self.view_height)
+
 class GameStateManager:
     """Manages game states and transitions"""
-    def __init__(self, pantalla, jugadores, controlador, hud):
+    # DebugDraw los tapa en la instancia mientras graba; apagado son las funciones de siempre
+    _player_collisions = staticmethod(CollisionHandler.check_all_player_collisions)
+    _platform_collision = staticmethod(Personaje.calcular_colision)
+
+    def __init__(self, pantalla, jugadores, controlador, hud, bots=None, pipelined=False, enemies=0,
+                 fondo=None, level=None, destructible=False, dev=False, late_latch=False,
+                 adaptive_quality=False, profiler=None, moving_platforms=0, projectiles=True):
         self.pantalla = pantalla
-        self._setup_game_objects(jugadores, controlador, hud)
-        self._setup_game_state()
+        self.bots = bots or {}  # player_id -> BotController
+        self._setup_game_objects(jugadores, controlador, hud, fondo)
+        self._setup_game_state(level, destructible, moving_platforms)
+        self._setup_camera()
+        self._setup_streaming(level)
+        self._setup_enemies(enemies)
+        self._setup_projectiles(projectiles)
+        self.frame_stats = FrameStats()
+        self.input_state = InputState()
+        self.late_latch = late_latch
+        self.key_presses = []        # (tecla, instante) de los KEYDOWN del último vaciado de la cola
+        self.last_drain = time.perf_counter()  # Vaciado anterior: lo más pronto que pudo llegar una tecla
+        self.pending_latency = []    # [instante, frames que faltan para presentarse]
+        self.input_latency = FrameStats()
+        self.governor = QualityGovernor(self) if adaptive_quality else None
+        self.debug_draw = DebugDraw(self)
+        self.profiler = profiler or FrameProfiler()
+        self.pipeline = SimulationPipeline(self) if pipelined else None
+        self.asset_watcher = AssetWatcher(self.resource_manager) if dev else None
         self.victory_screen = None
         self.last_winner = None
 
-    def _setup_game_objects(self, jugadores, controlador, hud):
+    def _setup_game_objects(self, jugadores, controlador, hud, fondo=None):
         """Initialize game objects"""
         self.jugadores = jugadores if isinstance(jugadores, list) else [jugadores]
         self.controlador = controlador
         self.hud = hud
-        self.fondo = Fondo()
+        self.fondo = fondo or Fondo()
         self.resource_manager = ResourceManager()
         self.resource_manager.load_resources()
+        self.particulas = ParticleSystem()
+        self.particulas.set_particle_size(
+            self.pantalla.get_screen_data("tile_size") // GameConstants.PARTICLE_SIZE_DIVISOR)
 
-    def _setup_game_state(self):
+    def _setup_game_state(self, level=None, destructible=False, moving_platforms=0):
         """Initialize game state variables"""
         self.clock = pygame.time.Clock()
         self.current_state = "menu"
         self.running = True
-        self.controlador = crear_plataformas(self.controlador, self.pantalla)
+        if level:
+            # Las plataformas del nivel llegan por chunks desde LevelStreamer
+            self.pantalla.set_world_tiles(*level.size_tiles)
+            self.controlador.cell_size = (self.pantalla.get_screen_data("tile_size")
+                                          * GameConstants.PLATFORM_GRID_CELL)
+        else:
+            self.controlador = crear_plataformas(self.controlador, self.pantalla)
+            if moving_platforms:
+                crear_plataformas_moviles(self.controlador, self.pantalla, moving_platforms)
+            if destructible:
+                self.controlador = Terreno.from_controller(self.controlador, self.pantalla)
+
+    def _setup_streaming(self, level):
+        self.streamer = None
+        if level:
+            self.streamer = LevelStreamer(level, self.controlador, self.pantalla)
+            self.streamer.prime(self._active_rect())
+
+    def _setup_camera(self):
+        self.camera = Camera(*self.pantalla.get_screen_data("width", "height", "world_width", "world_height"))
+        self.camera.snap(self.jugadores)
+
+    def _active_rect(self):
+        """World rect around the view where non-essential entities keep simulating"""
+        view = self.camera.view_rect
+        return view.inflate(view.width * GameConstants.ENEMY_ACTIVE_MARGIN * 2,
+                            view.height * GameConstants.ENEMY_ACTIVE_MARGIN * 2)
+
+    def _setup_enemies(self, count):
+        """Create the enemy world once the platforms exist"""
+        self.num_enemigos = count
+        self.enemigos = None
+        if count and np is not None:
+            self.enemigos = EnemyWorld(self.pantalla.get_screen_data("tile_size"))
+            self._spawn_enemies()
+
+    def _setup_projectiles(self, enabled):
+        self.proyectiles = None
+        if enabled and np is not None:
+            self.proyectiles = ProjectileSystem(self.pantalla.get_screen_data("tile_size"))
+
+    def _spawn_enemies(self):
+        self.enemigos.spawn_random(self.num_enemigos, self.controlador,
+                                   *self.pantalla.get_screen_data("world_width", "world_height"))
 
     def run(self):
         """Main game loop"""
         while self.running:
+            if self.profiler.pending:
+                self.profiler.tick(self)
+            if self.asset_watcher:
+                self.asset_watcher.apply_changes()
             self.running = not self._handle_current_state()
         return True
 
@@ -856,28 +2827,69 @@ class GameStateManager:
 
     def handle_playing(self):
         """Handle playing state"""
+        # Se vacía y se fecha antes de dormir en los dos modos, para que midan lo mismo
         if self._check_quit_event():
             return True
 
         delta_time = self._update_time()
-        teclas = pygame.key.get_pressed()
+        # Con late latching se vuelve a vaciar al despertar, justo antes de simular
+        if self.late_latch and self._check_quit_event(keep=True):
+            return True
+        frame_start = time.perf_counter()
+        entrada = self.input_state.poll(
+            [key for key, _ in self.key_presses] if self.late_latch else ())
 
-        if self._handle_escape_key(teclas):
+        if self._handle_escape_key(entrada.keys):
             return False
 
-        self._update_game_state(teclas, delta_time)
-        self._render_game()
+        # Con el pipeline el efecto de esta entrada se presenta un frame después
+        delay = 1 if self.pipeline else 0
+        self.pending_latency += [[stamp, delay] for _, stamp in self.key_presses]
+        self._step_frame(entrada, delta_time)
+        self._record_input_latency()
+        frame_ms = (time.perf_counter() - frame_start) * 1000.0
+        self.frame_stats.record(frame_ms)
+        if self.governor:
+            self.governor.update(frame_ms)
         return False
 
+    def _record_input_latency(self):
+        """Time from each key press to the present of the frame that simulated it"""
+        if not self.pending_latency:
+            return
+        presented = time.perf_counter()
+        pending = []
+        for entry in self.pending_latency:
+            if entry[1]:
+                entry[1] -= 1
+                pending.append(entry)
+            else:
+                self.input_latency.record((presented - entry[0]) * 1000.0)
+        self.pending_latency = pending
+
+    def get_input_stats(self):
+        """Key-press-to-present latency in ms over the last presses, counted from the drain before each press"""
+        return {
+            'presses': self.input_latency.frames,
+            'average': self.input_latency.average(),
+            'worst': self.input_latency.worst()
+        }
+
+    def _step_frame(self, entrada, delta_time):
+        """Simulate and draw one frame, pipelined across threads when enabled"""
+        if self.pipeline:
+            vivos = self.pipeline.step(entrada, delta_time)
+            self.debug_draw.collect()  # Se dibujan con el snapshot de este frame, en el siguiente paso
+        else:
+            vivos = self._update_game_state(entrada, delta_time)
+            self.debug_draw.collect()
+            self._render_game()
+        # El cambio de estado y la pantalla de victoria se hacen siempre en el hilo principal
+        if vivos is not None:
+            self._finish_match(vivos)
+
     def handle_victory(self):
         """Handle victory screen state"""
-        # Dibujamos solo una vez el fondo del juego
-        self.pantalla.actualizar_juego(
-            fondo=self.fondo,
-            jugadores=self.jugadores,
-            plataforma=self.controlador
-        )
-        
         result = self.victory_screen.handle_input()
         
         if result == "quit":
@@ -888,46 +2900,90 @@ class GameStateManager:
             self._transition_to_state("menu")
             return False
         
-        # Dibujamos la capa de victoria encima
-        self.victory_screen.draw(self.pantalla.get_screen_data("display"))
-        pygame.display.flip()
+        self._render_victory()
         return False
 
     def _render_victory(self):
-        """Render victory screen"""
+        """Render the match with the victory screen queued on top, in one flush"""
         self.pantalla.actualizar_juego(
+            camera=self.camera.view_rect,
             fondo=self.fondo,
-            jugadores=self.jugadores,
-            plataforma=self.controlador
+            jugadores=self._get_alive_players(),
+            plataforma=self.controlador,
+            hud=self.victory_screen.draw
         )
-        self.victory_screen.draw(self.pantalla.get_screen_data("display"))
-        pygame.display.flip()
+
+    def _get_alive_players(self):
+        """Players still in the match"""
+        return [jugador for jugador in self.jugadores if jugador.is_alive()]
 
     def _check_victory(self):
-        """Check if someone won"""
-        for jugador in self.jugadores:
-            if jugador.health <= 0:
-                winner = next(p for p in self.jugadores if p != jugador)
-                self.victory_screen = VictoryScreen(self.pantalla, winner)
-                self._transition_to_state("victory")
-                break
+        """Survivors once at most one player is left standing, else None; changes no state"""
+        if len(self.jugadores) < 2:
+            return None
+        vivos = self._get_alive_players()
+        return vivos if len(vivos) <= 1 else None
+
+    def _finish_match(self, vivos):
+        """Show the victory screen for the survivors _check_victory returned"""
+        # Si caen todos en el mismo frame es empate: no hay ganador que registrar
+        winner = vivos[0] if vivos else None
+        if winner is not None:
+            Telemetry().record(Telemetry.VICTORY, winner.player_id, value=len(self.jugadores))
+        self.victory_screen = VictoryScreen(self.pantalla, winner)
+        self._transition_to_state("victory")
 
     def _reset_game(self):
         """Reset game state for a new match"""
         screen_width = self.pantalla.get_screen_data("width")
         screen_height = self.pantalla.get_screen_data("height")
-        spawn_positions = GameConstants.calculate_spawn_positions(screen_width, screen_height)
+        spawn_positions = GameConstants.calculate_spawn_positions(
+            screen_width, screen_height, len(self.jugadores))
         
         for jugador in self.jugadores:
             jugador.health = GameConstants.PLAYER_MAX_HEALTH
             spawn_pos = spawn_positions[jugador.player_id]
             jugador.reiniciar_posicion(spawn_pos[0], spawn_pos[1])
 
-    def _check_quit_event(self):
-        """Check for quit events"""
+        for bot in self.bots.values():
+            bot.reset()
+
+        self.particulas.clear()
+        if self.proyectiles is not None:
+            self.proyectiles.clear()
+        self.camera.snap(self.jugadores)
+        if isinstance(self.controlador, Terreno):
+            self.controlador.reset()
+        elif self.controlador.moviles:
+            self.controlador.reiniciar_moviles()
+
+        if self.enemigos:
+            self.enemigos.clear()
+            self._spawn_enemies()
+
+        if self.pipeline:
+            self.pipeline.invalidate()
+
+    def _check_quit_event(self, keep=False):
+        """Check for quit events, keeping this drain's key presses for edges and latency
+
+        keep adds to the presses of an earlier drain of the same frame (late latching).
+        """
+        # pygame no expone la marca de tiempo de SDL: cada pulsación se fecha en el vaciado
+        # anterior, lo más pronto que pudo llegar, así los dos modos miden la misma cota
+        drained = self.last_drain
+        self.last_drain = time.perf_counter()
+        if not keep:
+            self.key_presses = []
         for evento in pygame.event.get():
             if evento.type == pygame.QUIT:
                 return True
+            if evento.type == pygame.KEYDOWN:
+                self.key_presses.append((evento.key, drained))
+                if evento.key == pygame.K_F3:
+                    self.debug_draw.toggle()
+                elif evento.key == pygame.K_F9:
+                    self.profiler.request()
         return False
         
     def _transition_to_state(self, new_state):
@@ -946,36 +3002,1510 @@ class GameStateManager:
         """Update game time"""
         return self.clock.tick(GameConstants.FPS) / 1000.0
 
-    def _update_game_state(self, teclas, delta_time):
-        """Update game state for all players"""
+    def _update_game_state(self, entrada, delta_time):
+        """Update game state for all players; entrada is an InputFrame or VirtualKeys
+
+        Returns _check_victory's result. Safe to run off the main thread: it
+        never changes current_state or builds UI, _step_frame does that.
+        """
+        vivos = self._get_alive_players()
+        if self.streamer:
+            self.streamer.update(self._active_rect())
+        self._update_bots(vivos)
+        # Las plataformas se mueven antes que los jugadores para que las colisiones vean su posición nueva
+        if getattr(self.controlador, 'moviles', None):
+            self.controlador.mover_plataformas(delta_time, vivos)
+
         # Update player states first
-        for jugador in self.jugadores:
-            self._update_player(jugador, teclas, delta_time)
+        for jugador in vivos:
+            bot = self.bots.get(jugador.player_id)
+            acciones = (bot.get_keys() if bot else entrada).actions(jugador.controls)
+            self._update_player(jugador, acciones, delta_time)
         
         # Then check collisions
-        if len(self.jugadores) > 1:
-            CollisionHandler.check_player_collisions(
-                self.jugadores[0],
-                self.jugadores[1],
-                damage_threshold=7,  # Adjusted threshold
-                damage_factor=0.8    # Adjusted damage factor
+        if len(vivos) > 1:
+            self._player_collisions(
+                vivos,
+                damage_threshold=GameConstants.PLAYER_DAMAGE_THRESHOLD,
+                damage_factor=GameConstants.PLAYER_DAMAGE_FACTOR
             )
-        self._check_victory()  # Add this line at the end
-
-    def _update_player(self, jugador, teclas, delta_time):
-        """Update individual player state"""
-        jugador.calcular_colision(self.controlador, teclas)
-        jugador.mover(teclas, delta_time, self.pantalla)
+        self.camera.follow(vivos, delta_time)
+        if self.enemigos:
+            self.enemigos.update(delta_time, vivos, self.controlador,
+                                 *self.pantalla.get_screen_data("world_width", "world_height"),
+                                 active_rect=self._active_rect())
+        if self.proyectiles is not None:
+            self.proyectiles.update(delta_time, vivos, self.controlador,
+                                    *self.pantalla.get_screen_data("world_width", "world_height"))
+        self.particulas.update(delta_time)
+        return self._check_victory()
+
+    def _update_bots(self, vivos):
+        """Hand the current match state to the bots; never waits for their plans"""
+        if not self.bots:
+            return
+        snapshot = BotPlanner.make_snapshot(vivos)
+        for jugador in vivos:
+            bot = self.bots.get(jugador.player_id)
+            if bot:
+                bot.update(snapshot, self.controlador)
+
+    def _update_player(self, jugador, acciones, delta_time):
+        """Update individual player state from its action bits"""
+        cavaba = jugador.estado_gravedad == GameConstants.STATE_DIGGING
+        self._platform_collision(jugador, self.controlador, acciones)
+        jugador.mover(acciones, delta_time, self.pantalla)
+        if self.proyectiles is not None:
+            self.proyectiles.handle_input(jugador, acciones, delta_time)
+        # Cada golpe de cavar en terreno destructible abre un hueco bajo el jugador
+        if (not cavaba and jugador.estado_gravedad == GameConstants.STATE_DIGGING
+                and isinstance(self.controlador, Terreno)):
+            self.controlador.carve(jugador.rect.midbottom)
 
     def _render_game(self):
         """Render game state"""
+        view = self.camera.view_rect
         self.pantalla.actualizar_juego(
+            camera=view,
             fondo=self.fondo,
-            jugadores=self.jugadores,
+            jugadores=self._get_alive_players(),
             plataforma=self.controlador,
+            enemigos=self.enemigos.render_state(view) if self.enemigos else None,
+            proyectiles=self.proyectiles.render_state(view) if self.proyectiles is not None else None,
+            particulas=self.particulas.render_state(view),
             hud=lambda p: self.hud.dibujar(p, self.jugadores)
         )
 
+    def _render_frame(self, frame):
+        """Render a FrameSnapshot instead of the live objects"""
+        self.pantalla.actualizar_juego(
+            camera=frame.camera,
+            fondo=self.fondo,
+            jugadores=frame.jugadores_vivos,
+            plataforma=frame.controlador,
+            enemigos=frame.enemigos,
+            proyectiles=frame.proyectiles,
+            particulas=frame.particulas,
+            hud=lambda p: self.hud.dibujar(p, frame.jugadores)
+        )
+
+    def close(self):
+        """Release worker threads"""
+        self.debug_draw.close()
+        self.profiler.close()
+        if self.pipeline:
+            self.pipeline.close()
+        if self.streamer:
+            self.streamer.close()
+        if self.asset_watcher:
+            self.asset_watcher.close()
+
+class FrameStats:
+    """Rolling per-frame timings in milliseconds"""
+    def __init__(self, window=GameConstants.FRAME_STATS_WINDOW):
+        self.frame_times = deque(maxlen=window)
+        self.frames = 0
+
+    def record(self, frame_ms):
+        self.frame_times.append(frame_ms)
+        self.frames += 1
+
+    def average(self):
+        if not self.frame_times:
+            return 0.0
+        return sum(self.frame_times) / len(self.frame_times)
+
+    def worst(self):
+        return max(self.frame_times, default=0.0)
+
+class QualityGovernor:
+    """Steps optional visual costs down while frames miss the budget, and back up with headroom
+
+    Level 0 is full quality; each level also keeps every cut of the levels before
+    it. Going up needs a lower average than going down, held for several windows,
+    so a level that only just fits does not flip back and forth.
+    """
+    LEVELS = ['full', 'hitboxes', 'background', 'particles', 'overlays', 'resolution']
+
+    def __init__(self, game, budget_ms=1000.0 / GameConstants.FPS):
+        self.game = game
+        self.budget_ms = budget_ms
+        self.level = 0
+        self.window = FrameStats(GameConstants.QUALITY_WINDOW)
+        self.headroom_windows = 0
+        self.changes = 0
+
+    @property
+    def level_name(self):
+        return QualityGovernor.LEVELS[self.level]
+
+    def update(self, frame_ms):
+        """Feed one frame's work time; decides once per full window"""
+        self.window.record(frame_ms)
+        if len(self.window.frame_times) < GameConstants.QUALITY_WINDOW:
+            return
+        average = self.window.average()
+        self.window.frame_times.clear()
+        if average > self.budget_ms * GameConstants.QUALITY_DOWN:
+            self.headroom_windows = 0
+            if self.level < len(QualityGovernor.LEVELS) - 1:
+                self.set_level(self.level + 1)
+        elif average < self.budget_ms * GameConstants.QUALITY_UP and self.level > 0:
+            self.headroom_windows += 1
+            if self.headroom_windows >= GameConstants.QUALITY_UP_WINDOWS:
+                self.headroom_windows = 0
+                self.set_level(self.level - 1)
+        else:
+            self.headroom_windows = 0
+
+    def set_level(self, level):
+        """Apply every cut up to level and undo the ones past it"""
+        self.level = level
+        self.changes += 1
+        game = self.game
+        game.debug_draw.set_suppressed(level >= 1)
+        if hasattr(game.fondo, 'set_detail'):
+            game.fondo.set_detail(level < 2)
+        game.particulas.count_scale = 1.0 if level < 3 else GameConstants.QUALITY_PARTICLE_SCALE
+        game.pantalla.alpha_overlays = level < 4
+        game.pantalla.set_render_scale(1.0 if level < 5 else GameConstants.QUALITY_RENDER_SCALE)
+        print(f"Quality level {level} ({self.level_name})")
+
+class DebugDraw:
+    """F3 overlay: sensors, platform colliders, contacts, velocities and broadphase cells
+
+    While it is off none of it runs: turning it on wraps this game's screen
+    _draw_all_objects so the overlay is queued on LAYER_DEBUG with the rest of
+    the frame, and swaps the game's collision calls for recording ones that
+    keep contacts and broadphase pairs; turning it off drops them again.
+    Nothing shared between games is touched. The simulation (maybe on the
+    pipeline worker) only appends to those lists; collect() hands them to
+    draw() on the main thread once the frame is simulated.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.enabled = False
+        self.suppressed = False  # Lo impone el QualityGovernor sin olvidar el estado de F3
+        self.installed = False   # Si los envoltorios de la pantalla y el juego están puestos
+        self.contacts = None     # (rect del personaje, CollisionState) del frame en curso; None si está apagado
+        self.pairs = None        # Parejas de jugadores del broadphase; None si está apagado
+        self.shown = ([], [])    # Contactos y parejas del último frame simulado, los que se dibujan
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self._update_hooks()
+
+    def set_suppressed(self, suppressed):
+        self.suppressed = suppressed
+        self._update_hooks()
+
+    def close(self):
+        self.enabled = False
+        self._update_hooks()
+
+    def _update_hooks(self):
+        active = self.enabled and not self.suppressed
+        if active and not self.installed:
+            self._install()
+        elif not active and self.installed:
+            self._remove()
+
+    def _install(self):
+        pantalla = self.game.pantalla
+        draw_all_objects = pantalla._draw_all_objects
+
+        def _draw_all_objects(game_objects):
+            draw_all_objects(game_objects)
+            self.draw(pantalla, game_objects)
+
+        self.contacts = []
+        self.pairs = []
+        pantalla._draw_all_objects = _draw_all_objects  # Tapa el método de la clase
+        self.game._platform_collision = self._record_contact
+        self.game._player_collisions = self._record_pairs
+        self.installed = True
+
+    def _remove(self):
+        del self.game.pantalla._draw_all_objects
+        del self.game._platform_collision
+        del self.game._player_collisions
+        self.installed = False
+        self.contacts = None
+        self.pairs = None
+        self.shown = ([], [])
+
+    def _record_contact(self, jugador, controlador, acciones):
+        """Personaje.calcular_colision, keeping the contact for the overlay"""
+        rect = pygame.Rect(jugador.rect)
+        self.contacts.append((rect, jugador.calcular_colision(controlador, acciones)))
+
+    def _record_pairs(self, players, damage_threshold, damage_factor):
+        """CollisionHandler.check_all_player_collisions, keeping the pairs for the overlay"""
+        pairs = CollisionHandler.find_player_pairs(players)
+        self.pairs += [(player1.rect.center, player2.rect.center) for player1, player2 in pairs]
+        for player1, player2 in pairs:
+            CollisionHandler.check_player_collisions(player1, player2, damage_threshold, damage_factor)
+        return len(pairs)
+
+    def collect(self):
+        """Swap in fresh lists for the next frame; main thread, while no simulation runs"""
+        if self.installed:
+            self.shown = (self.contacts, self.pairs)
+            self.contacts = []
+            self.pairs = []
+
+    def draw(self, pantalla, game_objects):
+        """Queue the overlay on LAYER_DEBUG in world coordinates; the queue applies the camera"""
+        render_queue = pantalla.render_queue
+        layer = GameConstants.LAYER_DEBUG
+        view = pantalla.get_view_rect()
+        colors = GameConstants.DEBUG_COLORS
+        contacts, pairs = self.shown
+        controlador = game_objects.get('plataforma')
+
+        if controlador is not None:
+            for rect in self._cells(controlador, view):
+                render_queue.submit_rect(colors['cell'], rect, layer, 1)
+            for rect in controlador.get_rects_near(view):
+                render_queue.submit_rect(colors['collider'], pygame.Rect(rect), layer, 1)
+
+        for jugador in game_objects.get('jugadores', ()):
+            for rect in (jugador.arriba_rect, jugador.abajo_rect, jugador.derecha_rect, jugador.izquierda_rect):
+                render_queue.submit_rect(colors['sensor'], pygame.Rect(rect), layer, 1)
+            # Las copias del pipeline no llevan velocidad
+            velocidad_x = getattr(jugador, 'velocidad_x', None)
+            if velocidad_x is not None:
+                start = jugador.rect.center
+                end = (start[0] + velocidad_x * GameConstants.DEBUG_VELOCITY_SCALE,
+                       start[1] + jugador.velocidad_y * GameConstants.DEBUG_VELOCITY_SCALE)
+                render_queue.submit_line(colors['velocity'], start, end, layer, 2)
+
+        for rect, state in contacts:
+            if state.body:
+                render_queue.submit_rect(colors['contact'], rect, layer, 1)
+            if state.top:
+                render_queue.submit_line(colors['contact'], rect.topleft, rect.topright, layer, 2)
+            if state.bottom and state.platform:
+                render_queue.submit_rect(colors['contact'], pygame.Rect(state.platform), layer, 2)
+
+        for start, end in pairs:
+            render_queue.submit_line(colors['pair'], start, end, layer, 2)
+
+    @staticmethod
+    def _cells(controlador, view):
+        """Occupied broadphase cells (or terrain blocks) in view"""
+        if hasattr(controlador, '_get_grid'):
+            grid = controlador._get_grid()
+            cells, size, origin = grid.cells, grid.cell_size, (0, 0)
+        elif hasattr(controlador, 'blocks'):
+            cells, size, origin = controlador.blocks, controlador.cell_size, controlador.origin
+        else:
+            return []
+        rects = (pygame.Rect(origin[0] + column * size, origin[1] + row * size, size, size)
+                 for column, row in cells)
+        return [rect for rect in rects if rect.colliderect(view)]
+
+class FrameProfiler:
+    """Deep profile of exactly the next N frames of the game loop, off the rest of the time
+
+    'cprofile' traces every call on the game thread; 'sampling' walks the stacks
+    of all threads every PROFILE_SAMPLE_INTERVAL from a helper thread. Both write
+    a .pstats file and a .collapsed file (one 'frame;frame;frame weight' line per
+    stack, weights in microseconds) ready for flamegraph.pl or speedscope.
+    """
+    MODES = ('cprofile', 'sampling')
+
+    def __init__(self, mode='cprofile', directory=GameConstants.PROFILE_DIR,
+                 frames=GameConstants.PROFILE_FRAMES):
+        self.mode = mode
+        self.directory = directory
+        self.frames = frames
+        self.pending = False      # El bucle principal solo mira esto mientras no se pide nada
+        self.requested = 0
+        self.frames_left = 0
+        self.profile = None
+        self.sampler = None
+        self.files = []
+
+    def request(self, frames=None):
+        """Capture the given number of frames, starting with the next one"""
+        if not self.frames_left:
+            self.requested = frames or self.frames
+            self.pending = True
+
+    def tick(self, game):
+        """Called at the top of every loop iteration while pending"""
+        if self.frames_left:
+            self.frames_left -= 1
+            if not self.frames_left:
+                self._stop()
+        elif self.requested:
+            self._start(game)
+
+    def close(self):
+        if self.frames_left:
+            self.frames_left = 0
+            self._stop()
+
+    def _start(self, game):
+        self.tag = (f"{time.strftime('%Y%m%d-%H%M%S')}-{game.current_state}"
+                    f"-{len(game.jugadores)}p-{len(game.controlador.get_rects())}plat")
+        self.frames_left, self.requested = self.requested, 0
+        if self.mode == 'sampling':
+            self.samples = {}
+            self.stop_event = threading.Event()
+            self.sampler = threading.Thread(target=self._sample, name="perfilador", daemon=True)
+            self.sampler.start()
+        else:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def _stop(self):
+        self.pending = False
+        if self.mode == 'sampling':
+            self.stop_event.set()
+            self.sampler.join()
+            self.sampler = None
+            stats = FrameProfiler._stats_from_samples(self.samples)
+            stacks = {stack: seconds for stack, (seconds, _) in self.samples.items()}
+        else:
+            self.profile.disable()
+            stats = pstats.Stats(self.profile).stats
+            self.profile = None
+            stacks = FrameProfiler._stacks_from_stats(stats)
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"profile-{self.tag}-{self.mode}")
+        with open(base + '.pstats', 'wb') as archivo:
+            marshal.dump(stats, archivo)
+        with open(base + '.collapsed', 'w') as archivo:
+            for stack, seconds in stacks.items():
+                weight = round(seconds * 1e6)
+                if weight:
+                    archivo.write(';'.join(map(FrameProfiler._label, stack)) + f" {weight}\n")
+        self.files += [base + '.pstats', base + '.collapsed']
+        print(f"Profile written to {base}.pstats/.collapsed")
+
+    def _sample(self):
+        """Helper thread: one stack per thread per tick, weighted by the time since the last tick"""
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self.stop_event.wait(GameConstants.PROFILE_SAMPLE_INTERVAL):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                # La raíz de cada pila es el hilo, como hace py-spy
+                stack.append(('~', 0, f"<thread {names.get(ident, ident)}>"))
+                entry = self.samples.setdefault(tuple(reversed(stack)), [0.0, 0])
+                entry[0] += weight
+                entry[1] += 1
+
+    @staticmethod
+    def _stats_from_samples(samples):
+        """pstats' {function: (calls, calls, own, cumulative, callers)}, counting samples as calls"""
+        stats = {}
+        for stack, (seconds, count) in samples.items():
+            seen = set()
+            for depth, func in enumerate(stack):
+                leaf = depth == len(stack) - 1
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                if leaf:
+                    entry[2] += seconds
+                if func in seen:
+                    continue  # Recursión: el tiempo acumulado cuenta una vez por muestra
+                seen.add(func)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+                if depth:
+                    edge = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    edge[0] += count
+                    edge[1] += count
+                    edge[2] += seconds if leaf else 0.0
+                    edge[3] += seconds
+        return {func: (cc, nc, own, total, {caller: tuple(edge) for caller, edge in callers.items()})
+                for func, (cc, nc, own, total, callers) in stats.items()}
+
+    @staticmethod
+    def _stacks_from_stats(stats):
+        """Approximate stacks from cProfile's call graph
+
+        cProfile only keeps caller -> callee edges, so each function's own time
+        is split over its callers in proportion to the time spent along each edge.
+        """
+        stacks = {}
+
+        def climb(path, seconds):
+            callers = stats[path[-1]][4] if path[-1] in stats else {}
+            shares = {caller: edge[3] for caller, edge in callers.items() if caller not in path}
+            total = sum(shares.values())
+            if not total or len(path) >= GameConstants.PROFILE_MAX_DEPTH:
+                stack = tuple(reversed(path))
+                stacks[stack] = stacks.get(stack, 0.0) + seconds
+                return
+            for caller, edge_seconds in shares.items():
+                share = seconds * edge_seconds / total
+                if share >= GameConstants.PROFILE_MIN_SHARE:
+                    climb(path + [caller], share)
+
+        for func, (_, _, own, _, _) in stats.items():
+            if own >= GameConstants.PROFILE_MIN_SHARE:
+                climb([func], own)
+        return stacks
+
+    @staticmethod
+    def _label(func):
+        filename, line, name = func
+        if filename == '~':
+            return name
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+class PersonajeSnapshot:
+    """Frozen copy of what Personaje.dibujar and the HUD read"""
+    __slots__ = ('player_id', 'tamaño', 'sprite_config', 'estado_gravedad', 'health',
+                 'rect', 'arriba_rect', 'abajo_rect', 'derecha_rect', 'izquierda_rect')
+
+    def __init__(self, jugador):
+        self.rect = jugador.rect.copy()
+        self.arriba_rect = jugador.arriba_rect.copy()
+        self.abajo_rect = jugador.abajo_rect.copy()
+        self.derecha_rect = jugador.derecha_rect.copy()
+        self.izquierda_rect = jugador.izquierda_rect.copy()
+        self.update_from(jugador)
+
+    def update_from(self, jugador):
+        """Copy the current state in place, reusing the rects"""
+        self.player_id = jugador.player_id
+        self.tamaño = jugador.tamaño
+        self.sprite_config = jugador.sprite_config
+        self.estado_gravedad = jugador.estado_gravedad
+        self.health = jugador.health
+        self.rect.update(jugador.rect)
+        self.arriba_rect.update(jugador.arriba_rect)
+        self.abajo_rect.update(jugador.abajo_rect)
+        self.derecha_rect.update(jugador.derecha_rect)
+        self.izquierda_rect.update(jugador.izquierda_rect)
+
+    # Se dibuja igual que el personaje vivo
+    dibujar = Personaje.dibujar
+    get_health_percentage = Personaje.get_health_percentage
+    is_alive = Personaje.is_alive
+
+class PlataformaSnapshot:
+    """Frozen copy of what Plataforma.dibujar reads"""
+    __slots__ = ('rect', 'visible')
+
+    def __init__(self, plataforma):
+        self.rect = plataforma.rect.copy()
+        self.visible = plataforma.visible
+
+    def update_from(self, plataforma):
+        self.rect.update(plataforma.rect)
+        self.visible = plataforma.visible
+
+    dibujar = Plataforma.dibujar
+
+class FrameSnapshot:
+    """One buffer of the double-buffered render state"""
+    def __init__(self):
+        self.jugadores = []
+        self.jugadores_vivos = []
+        self.controlador = controlador_plataformas()
+        self.particulas = None
+        self.enemigos = None
+        self.proyectiles = None
+        self.camera = None
+        self.source_version = None
+
+    def capture(self, jugadores, controlador, particulas, enemigos=None, camera=None, proyectiles=None):
+        """Copy the live entities into this buffer, reusing existing snapshots"""
+        self._sync(self.jugadores, jugadores, PersonajeSnapshot)
+        if self.source_version != controlador.version:
+            # Cambió la lista (p. ej. chunks cargados): copiarla entera
+            self.controlador.plataformas = [PlataformaSnapshot(p) for p in controlador.plataformas]
+            self.controlador.cell_size = controlador.cell_size
+            self.controlador.version += 1
+            self.source_version = controlador.version
+        else:
+            # Misma lista: las que se movieron pasan por el índice incremental del buffer
+            for snapshot, plataforma in zip(self.controlador.plataformas, controlador.plataformas):
+                snapshot.visible = plataforma.visible
+                if snapshot.rect.topleft != plataforma.rect.topleft:
+                    self.controlador.mover_plataforma(snapshot, *plataforma.rect.topleft)
+        self.jugadores_vivos = [jugador for jugador in self.jugadores if jugador.is_alive()]
+        self.camera = camera.view_rect if camera else None
+        self.particulas = particulas.render_state(self.camera)
+        self.enemigos = enemigos.render_state(self.camera) if enemigos else None
+        self.proyectiles = proyectiles.render_state(self.camera) if proyectiles is not None else None
+        return self
+
+    @staticmethod
+    def _sync(snapshots, objects, snapshot_class):
+        if len(snapshots) != len(objects):
+            snapshots[:] = [snapshot_class(obj) for obj in objects]
+            return
+        for snapshot, obj in zip(snapshots, objects):
+            snapshot.update_from(obj)
+
+class SimulationPipeline:
+    """Simulates frame N+1 on a worker thread while the main thread renders frame N"""
+    def __init__(self, game):
+        self.game = game
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="simulacion")
+        self.buffers = [FrameSnapshot(), FrameSnapshot()]
+        self.front = 0
+        self.valid = False
+
+    def invalidate(self):
+        """Drop the front buffer, e.g. after a reset"""
+        self.valid = False
+
+    def step(self, entrada, delta_time):
+        """Returns the simulated frame's _check_victory result for the caller to apply"""
+        if not self.valid:
+            self._capture(self.front)
+            self.valid = True
+
+        back = self.front ^ 1
+        future = self.executor.submit(self._simulate, entrada, delta_time, back)
+        # Mientras tanto se dibuja el frame anterior; blits y flip sueltan el GIL
+        self.game._render_frame(self.buffers[self.front])
+        vivos = future.result()
+        self.front = back
+        return vivos
+
+    def _simulate(self, entrada, delta_time, back):
+        """Worker side: simulation and snapshot only, the result goes back to step()"""
+        vivos = self.game._update_game_state(entrada, delta_time)
+        self._capture(back)
+        return vivos
+
+    def _capture(self, index):
+        self.buffers[index].capture(self.game.jugadores, self.game.controlador,
+                                    self.game.particulas, self.game.enemigos, self.game.camera,
+                                    self.game.proyectiles)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+class ParticleSystem:
+    """Pooled particles in preallocated NumPy arrays, updated and drawn in batches"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ParticleSystem, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.capacity = GameConstants.PARTICLE_CAPACITY
+        self.enabled = np is not None
+        self.particle_size = 8
+        self.count_scale = 1.0    # Fracción de cada ráfaga que se emite
+        self.frame_surfaces = {}  # tamaño -> lista de cuadros escalados
+        self.next_slot = 0
+        if self.enabled:
+            self._allocate()
+        ResourceManager().add_reload_listener('explosion', self._drop_frames)
+        self._initialized = True
+
+    def _allocate(self):
+        """All particle storage is allocated once, up front"""
+        capacity = self.capacity
+        self.position = np.zeros((capacity, 2), np.float32)   # Centro, en px
+        self.velocity = np.zeros((capacity, 2), np.float32)   # px/s
+        self.lifetime = np.zeros(capacity, np.float32)        # Segundos restantes (<= 0: libre)
+        self.max_lifetime = np.ones(capacity, np.float32)
+        self.gravity = np.zeros(capacity, np.float32)
+        self.frame = np.zeros(capacity, np.int32)
+        self._step = np.zeros((capacity, 2), np.float32)
+        self._scratch = np.zeros((2, capacity), np.float32)
+        self._progress = np.zeros(capacity, np.float32)
+        self.rng = np.random.default_rng()
+
+    def set_particle_size(self, size):
+        self.particle_size = max(1, int(size))
+
+    def emit(self, x, y, count, speed, lifetime=GameConstants.PARTICLE_LIFETIME,
+             gravity=0.0, angle_min=0.0, angle_max=2 * math.pi):
+        """Spawn count particles at (x, y), recycling the oldest slots when full"""
+        if not self.enabled or count <= 0:
+            return
+        count = min(max(1, int(count * self.count_scale)), self.capacity)
+        start = self.next_slot
+        stop = start + count
+        # Anillo: como mucho dos tramos contiguos, sin arrays de índices
+        if stop <= self.capacity:
+            self._fill(start, stop, x, y, speed, lifetime, gravity, angle_min, angle_max)
+        else:
+            self._fill(start, self.capacity, x, y, speed, lifetime, gravity, angle_min, angle_max)
+            self._fill(0, stop - self.capacity, x, y, speed, lifetime, gravity, angle_min, angle_max)
+        self.next_slot = stop % self.capacity
+
+    def _fill(self, start, stop, x, y, speed, lifetime, gravity, angle_min, angle_max):
+        count = stop - start
+        angle = self._scratch[0, :count]
+        magnitude = self._scratch[1, :count]
+        self.rng.random(out=angle, dtype=np.float32)
+        angle *= angle_max - angle_min
+        angle += angle_min
+        self.rng.random(out=magnitude, dtype=np.float32)
+        magnitude *= speed * 0.5
+        magnitude += speed * 0.5
+
+        velocity = self.velocity[start:stop]
+        np.cos(angle, out=velocity[:, 0])
+        np.sin(angle, out=velocity[:, 1])
+        velocity *= magnitude[:, None]
+        self.position[start:stop] = (x, y)
+        self.lifetime[start:stop] = lifetime
+        self.max_lifetime[start:stop] = lifetime
+        self.gravity[start:stop] = gravity
+        self.frame[start:stop] = 0
+
+    def emit_impact(self, x, y, damage, tamaño):
+        """Burst for a player-vs-player hit, bigger for harder hits"""
+        count = min(damage * GameConstants.PARTICLE_HIT_COUNT, GameConstants.PARTICLE_HIT_MAX)
+        self.emit(x, y, count, tamaño * GameConstants.PARTICLE_SPEED_FACTOR)
+
+    def emit_dig(self, x, y, tamaño):
+        """Debris thrown upwards when a player digs"""
+        self.emit(x, y, GameConstants.PARTICLE_DIG_COUNT,
+                  tamaño * GameConstants.PARTICLE_SPEED_FACTOR,
+                  gravity=tamaño * GameConstants.PARTICLE_GRAVITY_FACTOR,
+                  angle_min=math.pi * 1.15, angle_max=math.pi * 1.85)
+
+    def update(self, delta_time):
+        """Advance every particle in one vectorized pass"""
+        if not self.enabled:
+            return
+        np.multiply(self.gravity, delta_time, out=self._progress)
+        self.velocity[:, 1] += self._progress
+        np.multiply(self.velocity, delta_time, out=self._step)
+        self.position += self._step
+        self.lifetime -= delta_time
+
+        # Cuadro de animación según la vida consumida
+        np.divide(self.lifetime, self.max_lifetime, out=self._progress)
+        np.subtract(1.0, self._progress, out=self._progress)
+        self._progress *= GameConstants.PARTICLE_FRAMES
+        np.clip(self._progress, 0, GameConstants.PARTICLE_FRAMES - 1, out=self._progress)
+        self.frame[:] = self._progress
+
+    def live_count(self):
+        if not self.enabled:
+            return 0
+        return int(np.count_nonzero(self.lifetime > 0))
+
+    def clear(self):
+        if self.enabled:
+            self.lifetime.fill(0)
+
+    def render_state(self, view=None):
+        """Immutable draw data for the live particles in view (top-left positions and frames)"""
+        if not self.enabled:
+            return SpriteBatch([], GameConstants.LAYER_EFFECTS)
+        visible = self.lifetime > 0
+        if view is not None:
+            margin = self.particle_size
+            x, y = self.position[:, 0], self.position[:, 1]
+            visible &= ((x > view[0] - margin) & (x < view[0] + view[2] + margin)
+                        & (y > view[1] - margin) & (y < view[1] + view[3] + margin))
+        alive = np.flatnonzero(visible)
+        half = self.particle_size / 2
+        positions = (self.position[alive] - half).astype(np.int32).tolist()
+        surfaces = self.get_frame_surfaces(self.particle_size)
+        if surfaces is None:
+            return SpriteBatch([], GameConstants.LAYER_EFFECTS)
+        blits = list(zip(map(surfaces.__getitem__, self.frame[alive].tolist()), positions))
+        return SpriteBatch(blits, GameConstants.LAYER_EFFECTS,
+                           len(blits) * self.particle_size * self.particle_size)
+
+    def get_frame_surfaces(self, size):
+        """Explosion frames scaled to size, cached"""
+        surfaces = self.frame_surfaces.get(size)
+        if surfaces is None:
+            resource_manager = ResourceManager()
+            surfaces = [
+                resource_manager.get_scaled_sprite('explosion', size, size, index // 2, index % 2)
+                for index in range(GameConstants.PARTICLE_FRAMES)
+            ]
+            if not all(surfaces):
+                return None
+            surfaces = [self._bake_frame(surface) for surface in surfaces]
+            self.frame_surfaces[size] = surfaces
+        return surfaces
+
+    def _drop_frames(self, key):
+        self.frame_surfaces.clear()
+
+    @staticmethod
+    def _bake_frame(surface):
+        """Colorkey + RLE copy of a frame; explotion.png only has 0/255 alpha and
+        this blits several times faster than per-pixel alpha"""
+        if not pygame.display.get_surface():
+            return surface
+        baked = pygame.Surface(surface.get_size()).convert()
+        baked.fill(GameConstants.PARTICLE_COLORKEY)
+        baked.blit(surface, (0, 0))
+        baked.set_colorkey(GameConstants.PARTICLE_COLORKEY, pygame.RLEACCEL)
+        return baked
+
+class SpriteBatch:
+    """Immutable list of (surface, dest) blits, submitted as one RenderQueue batch"""
+    __slots__ = ('blits', 'layer', 'pixels')
+
+    def __init__(self, blits, layer, pixels=None):
+        self.blits = blits
+        self.layer = layer
+        self.pixels = pixels
+
+    def dibujar(self, pantalla=Pantalla):
+        if self.blits:
+            pantalla.render_queue.submit_batch(self.blits, self.layer, self.pixels)
+
+class Telemetry:
+    """Match events as fixed-size records, written to compressed files by a background thread
+
+    record() only packs one 28-byte RECORD and appends it to a bounded deque;
+    when the writer falls behind, new events are dropped and counted instead
+    of blocking.
+    """
+    _instance = None
+
+    HIT, DAMAGE, BLOCK, DIG, RESPAWN, VICTORY = range(6)
+    EVENT_NAMES = ['hit', 'damage', 'block', 'dig', 'respawn', 'victory']
+    RECORD = struct.Struct('<dBBBxffff')  # tiempo, evento, jugador, otro, valor, x, y, reservado
+    FORMATS = {'binary': '.bin.gz', 'jsonl': '.jsonl.gz'}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Telemetry, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.enabled = False
+        self.capacity = GameConstants.TELEMETRY_QUEUE_SIZE
+        self.queue = deque()
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.files = []
+        self.thread = None
+        self._initialized = True
+
+    def start(self, directory, file_format='binary'):
+        """Begin recording into directory; one file per TELEMETRY_FILE_EVENTS events"""
+        if self.enabled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.file_format = file_format
+        self.prefix = time.strftime("telemetry-%Y%m%d-%H%M%S")
+        self.start_time = time.perf_counter()
+        self.file = None
+        self.file_events = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._writer, name="telemetria", daemon=True)
+        self.enabled = True
+        self.thread.start()
+
+    def record(self, event, player=0, other=0, value=0.0, x=0.0, y=0.0):
+        """Queue one event; never blocks the caller"""
+        if not self.enabled:
+            return
+        if len(self.queue) >= self.capacity:
+            self.dropped += 1
+            return
+        # deque.append es atómico: no hace falta lock con el hilo escritor
+        self.queue.append(Telemetry.RECORD.pack(
+            time.perf_counter() - self.start_time, event, player, other, value, x, y, 0.0))
+        self.recorded += 1
+
+    def stop(self):
+        """Write everything still queued and close the current file"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.stop_event.set()
+        self.thread.join()
+
+    def get_stats(self):
+        return {'recorded': self.recorded, 'dropped': self.dropped,
+                'written': self.written, 'queued': len(self.queue), 'files': len(self.files)}
+
+    def _writer(self):
+        while not self.stop_event.wait(GameConstants.TELEMETRY_FLUSH_INTERVAL):
+            self._drain()
+        self._drain()
+        if self.file:
+            self.file.close()
+
+    def _drain(self):
+        """Move everything queued to disk in batches"""
+        queue_popleft = self.queue.popleft
+        while self.queue:
+            batch = []
+            try:
+                for _ in range(GameConstants.TELEMETRY_BATCH):
+                    batch.append(queue_popleft())
+            except IndexError:
+                pass
+            self._write(batch)
+
+    def _write(self, batch):
+        if self.file is None or self.file_events >= GameConstants.TELEMETRY_FILE_EVENTS:
+            self._rotate()
+        if self.file_format == 'jsonl':
+            data = ''.join(json.dumps(event) + '\n'
+                           for event in Telemetry.decode(b''.join(batch))).encode()
+        else:
+            data = b''.join(batch)
+        self.file.write(data)
+        self.file_events += len(batch)
+        self.written += len(batch)
+
+    def _rotate(self):
+        if self.file:
+            self.file.close()
+        path = os.path.join(self.directory, f"{self.prefix}-{len(self.files):04d}"
+                                            f"{Telemetry.FORMATS[self.file_format]}")
+        self.file = gzip.open(path, 'wb', compresslevel=6)
+        self.file_events = 0
+        self.files.append(path)
+
+    @staticmethod
+    def decode(data):
+        """Binary records back into event dicts"""
+        for time_s, event, player, other, value, x, y, _ in Telemetry.RECORD.iter_unpack(data):
+            yield {'t': round(time_s, 6), 'event': Telemetry.EVENT_NAMES[event], 'player': player,
+                   'other': other, 'value': round(value, 3), 'x': round(x, 1), 'y': round(y, 1)}
+
+    @staticmethod
+    def read(path):
+        """Events of a telemetry file written in either format"""
+        with gzip.open(path, 'rb') as archivo:
+            if path.endswith(Telemetry.FORMATS['jsonl']):
+                for line in archivo:
+                    yield json.loads(line)
+            else:
+                yield from Telemetry.decode(archivo.read())
+
+class PlatformArrays:
+    """Platform rects as (n, 4) float32 arrays for the batch systems
+
+    The fixed platforms are read only when the platform list changes; when a
+    platform just moves or blinks, only the kinematic ones are read again.
+    """
+    def __init__(self):
+        self.fixed = np.zeros((0, 4), np.float32)
+        self.moving = np.zeros((0, 4), np.float32)
+        self.all = self.fixed
+        self.version = None
+        self.layout_version = None
+
+    def update(self, controlador):
+        """Catch up with controlador; returns (fixed changed, moving changed)"""
+        moviles = getattr(controlador, 'moviles', ())
+        fixed_changed = controlador.version != self.version
+        if fixed_changed:
+            rects_moviles = {id(plataforma.rect) for plataforma in moviles}
+            self.fixed = self._array(rect for rect in controlador.get_rects() if id(rect) not in rects_moviles)
+            self.version = controlador.version
+        layout_version = getattr(controlador, 'layout_version', None)
+        moving_changed = fixed_changed or layout_version != self.layout_version
+        if moving_changed:
+            self.moving = self._array(plataforma.rect for plataforma in moviles if plataforma.visible)
+            self.layout_version = layout_version
+            self.all = np.concatenate((self.fixed, self.moving)) if len(self.moving) else self.fixed
+        return fixed_changed, moving_changed
+
+    @staticmethod
+    def _array(rects):
+        return np.array([tuple(rect) for rect in rects], np.float32).reshape(-1, 4)
+
+class EnemyWorld:
+    """Entity-component store for enemies: one array per component, one function per system"""
+    WALKER, FLYER, SPAWNER = 0, 1, 2
+
+    # Cada tipo: hoja de sprites, cuadros de animación y parámetros de comportamiento.
+    # size y speed van en baldosas (y baldosas por segundo)
+    KINDS = [
+        {'sheet': 'worm', 'frames': 5, 'cols': 2, 'behavior': WALKER, 'gravity': True,
+         'size': 0.8, 'speed': 1.5, 'damage': 10, 'anim_fps': 6},
+        {'sheet': 'bug', 'frames': 4, 'cols': 2, 'behavior': WALKER, 'gravity': True,
+         'size': 0.6, 'speed': 4.0, 'damage': 8, 'anim_fps': 10},
+        {'sheet': 'skeleton', 'frames': 9, 'cols': 3, 'behavior': WALKER, 'gravity': True,
+         'size': 1.2, 'speed': 2.5, 'damage': 15, 'anim_fps': 8},
+        {'sheet': 'ghost', 'frames': 4, 'cols': 2, 'behavior': FLYER, 'gravity': False,
+         'size': 1.0, 'speed': 2.0, 'damage': 12, 'anim_fps': 4},
+        {'sheet': 'wizmile', 'frames': 2, 'cols': 1, 'behavior': FLYER, 'gravity': False,
+         'size': 0.8, 'speed': 3.0, 'damage': 10, 'anim_fps': 3},
+        {'sheet': 'tombstone', 'frames': 1, 'cols': 1, 'behavior': SPAWNER, 'gravity': True,
+         'size': 0.9, 'speed': 0.0, 'damage': 0, 'anim_fps': 1}
+    ]
+    SPAWNED_KIND = 2  # Las lápidas generan esqueletos
+
+    def __init__(self, tile_size, capacity=GameConstants.ENEMY_CAPACITY):
+        self.tile_size = tile_size
+        self.capacity = capacity
+        self._setup_kind_tables()
+        self._allocate()
+        self.frame_table = None
+        for sheet in {config['sheet'] for config in EnemyWorld.KINDS}:
+            ResourceManager().add_reload_listener(sheet, self._drop_frame_table)
+        self.platforms = PlatformArrays()
+        self.rng = np.random.default_rng()
+
+    def _setup_kind_tables(self):
+        """Per-kind parameters as arrays, so systems can gather them with the kind column"""
+        kinds = EnemyWorld.KINDS
+        tile = self.tile_size
+        self.kind_behavior = np.array([k['behavior'] for k in kinds], np.int8)
+        self.kind_gravity = np.array([k['gravity'] for k in kinds], bool)
+        self.kind_speed = np.array([k['speed'] * tile for k in kinds], np.float32)
+        self.kind_damage = np.array([k['damage'] for k in kinds], np.float32)
+        self.kind_anim_fps = np.array([k['anim_fps'] for k in kinds], np.float32)
+        self.kind_frames = np.array([k['frames'] for k in kinds], np.int32)
+        self.max_frames = int(self.kind_frames.max())
+        sizes = []
+        resource_manager = ResourceManager()
+        for kind in kinds:
+            # Conservar la proporción del sprite original
+            sprite = resource_manager.get_sprite(kind['sheet'])
+            sprite_width, sprite_height = sprite.get_size() if sprite else (1, 1)
+            height = kind['size'] * tile
+            sizes.append((round(height * sprite_width / sprite_height), round(height)))
+        self.kind_size = np.array(sizes, np.float32)
+
+    def _allocate(self):
+        """Component arrays; an entity is an index into all of them"""
+        capacity = self.capacity
+        self.alive = np.zeros(capacity, bool)
+        self.kind = np.zeros(capacity, np.int8)
+        self.position = np.zeros((capacity, 2), np.float32)   # Esquina superior izquierda
+        self.velocity = np.zeros((capacity, 2), np.float32)
+        self.size = np.zeros((capacity, 2), np.float32)
+        self.on_ground = np.zeros(capacity, bool)
+        self.facing = np.zeros(capacity, np.int8)             # 0 derecha, 1 izquierda
+        self.anim_time = np.zeros(capacity, np.float32)
+        self.cooldown = np.zeros(capacity, np.float32)        # Golpe a jugadores / generar
+        self.active = np.zeros(capacity, bool)                # Vivos y cerca de la cámara
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def spawn(self, kind, x, y):
+        """Create an entity, returns its index or None when the store is full"""
+        if not self.free:
+            return None
+        index = self.free.pop()
+        self.alive[index] = True
+        self.kind[index] = kind
+        self.position[index] = (x, y)
+        self.velocity[index] = (0, 0)
+        self.size[index] = self.kind_size[kind]
+        self.on_ground[index] = False
+        self.facing[index] = self.rng.integers(2)
+        self.anim_time[index] = self.rng.random()
+        self.cooldown[index] = (GameConstants.ENEMY_SPAWN_INTERVAL
+                                if self.kind_behavior[kind] == EnemyWorld.SPAWNER else 0)
+        return index
+
+    def despawn(self, indices):
+        for index in np.atleast_1d(indices).tolist():
+            if self.alive[index]:
+                self.alive[index] = False
+                self.free.append(index)
+
+    def clear(self):
+        self.despawn(np.flatnonzero(self.alive))
+
+    def spawn_random(self, count, controlador, world_width, world_height):
+        """Scatter count enemies: walkers on platforms, flyers in the air, a few tombstones"""
+        rects = controlador.get_rects()
+        flyers = [i for i, k in enumerate(EnemyWorld.KINDS) if k['behavior'] == EnemyWorld.FLYER]
+        walkers = [i for i, k in enumerate(EnemyWorld.KINDS) if k['behavior'] == EnemyWorld.WALKER]
+        spawners = [i for i, k in enumerate(EnemyWorld.KINDS) if k['behavior'] == EnemyWorld.SPAWNER]
+        for number in range(count):
+            roll = self.rng.random()
+            if roll < 0.05 and rects:
+                kind = spawners[0]
+            elif roll < 0.35:
+                kind = flyers[self.rng.integers(len(flyers))]
+            else:
+                kind = walkers[self.rng.integers(len(walkers))]
+
+            width, height = self.kind_size[kind]
+            if self.kind_gravity[kind] and rects:
+                rect = rects[self.rng.integers(len(rects))]
+                x = rect.x + self.rng.random() * max(rect.width - width, 0)
+                y = rect.y - height
+            else:
+                x = self.rng.random() * (world_width - width)
+                y = self.rng.random() * world_height * 0.5
+            self.spawn(kind, x, y)
+
+    def update(self, delta_time, jugadores, controlador, world_width, world_height, active_rect=None):
+        """Run every system once over the entities inside active_rect (all when None)"""
+        self.active = self._in_rect(active_rect) if active_rect else self.alive.copy()
+        if not self.active.any():
+            return
+        targets = np.array([jugador.rect.center for jugador in jugadores], np.float32).reshape(-1, 2)
+        self._ai_system(delta_time, targets)
+        self._spawner_system(delta_time)
+        self._gravity_system(delta_time)
+        previous_bottom = self.position[:, 1] + self.size[:, 1]
+        self._movement_system(delta_time)
+        self._platform_collision_system(controlador, previous_bottom)
+        self._bounds_system(world_width, world_height)
+        self._player_contact_system(delta_time, jugadores)
+        self.anim_time[self.active] += delta_time
+
+    def _in_rect(self, rect):
+        """Mask of the live entities overlapping rect"""
+        left, top = self.position[:, 0], self.position[:, 1]
+        return (self.alive & (left < rect[0] + rect[2]) & (left + self.size[:, 0] > rect[0])
+                & (top < rect[1] + rect[3]) & (top + self.size[:, 1] > rect[1]))
+
+    def _ai_system(self, delta_time, targets):
+        """Walkers chase the nearest player along x, flyers steer straight at it"""
+        active = np.flatnonzero(self.active)
+        kind = self.kind[active]
+        behavior = self.kind_behavior[kind]
+        speed = self.kind_speed[kind]
+        centers = self.position[active] + self.size[active] / 2
+
+        if len(targets):
+            offsets = targets[None, :, :] - centers[:, None, :]
+            nearest = np.argmin((offsets ** 2).sum(axis=2), axis=1)
+            offset = offsets[np.arange(len(active)), nearest]
+        else:
+            offset = np.zeros_like(centers)
+
+        # Caminantes: persiguen dentro del radio, si no siguen en su dirección
+        walkers = behavior == EnemyWorld.WALKER
+        aggro = np.abs(offset[:, 0]) < GameConstants.ENEMY_AGGRO_TILES * self.tile_size
+        chase = walkers & aggro & (np.abs(offset[:, 0]) > 1)
+        facing = self.facing[active]
+        facing[chase] = (offset[chase, 0] < 0)
+        self.facing[active] = facing
+        direction = np.where(facing == 1, -1.0, 1.0).astype(np.float32)
+        self.velocity[active[walkers], 0] = direction[walkers] * speed[walkers]
+
+        # Voladores: velocidad hacia el objetivo, suavizada
+        flyers = behavior == EnemyWorld.FLYER
+        if flyers.any():
+            distance = np.maximum(np.linalg.norm(offset[flyers], axis=1), 1.0)
+            desired = offset[flyers] / distance[:, None] * speed[flyers, None]
+            current = self.velocity[active[flyers]]
+            steer = min(1.0, delta_time * 3)
+            self.velocity[active[flyers]] = current + (desired - current) * steer
+            self.facing[active[flyers]] = desired[:, 0] < 0
+
+        self.velocity[active[behavior == EnemyWorld.SPAWNER], 0] = 0
+
+    def _spawner_system(self, delta_time):
+        """Tombstones raise a skeleton every few seconds"""
+        spawners = np.flatnonzero(self.active & (self.kind_behavior[self.kind] == EnemyWorld.SPAWNER))
+        if not len(spawners):
+            return
+        self.cooldown[spawners] -= delta_time
+        for index in spawners[self.cooldown[spawners] <= 0].tolist():
+            self.cooldown[index] = GameConstants.ENEMY_SPAWN_INTERVAL
+            x, y = self.position[index]
+            height = self.kind_size[EnemyWorld.SPAWNED_KIND][1]
+            self.spawn(EnemyWorld.SPAWNED_KIND, x, y + self.size[index, 1] - height)
+
+    def _gravity_system(self, delta_time):
+        falling = self.active & self.kind_gravity[self.kind]
+        # La misma gravedad que Personaje, pasada de px/frame² a px/s²
+        gravity = self.tile_size / GameConstants.GRAVITY_FACTOR * GameConstants.FPS ** 2
+        self.velocity[falling, 1] += gravity * delta_time
+
+    def _movement_system(self, delta_time):
+        self.position[self.active] += self.velocity[self.active] * delta_time
+
+    def _platform_array(self, controlador):
+        """Platform rects as an (n, 4) array; fixed ones are only read when the list changes"""
+        self.platforms.update(controlador)
+        return self.platforms.all
+
+    def _platform_collision_system(self, controlador, previous_bottom):
+        """Land entities that crossed a platform top this frame (same AABB rule as the players)"""
+        platforms = self._platform_array(controlador)
+        solid = np.flatnonzero(self.active & self.kind_gravity[self.kind])
+        self.on_ground[solid] = False
+        if not len(platforms) or not len(solid):
+            return
+
+        left = self.position[solid, 0][:, None]
+        right = left + self.size[solid, 0][:, None]
+        bottom = (self.position[solid, 1] + self.size[solid, 1])[:, None]
+        was_above = previous_bottom[solid][:, None] <= platforms[None, :, 1] + 1
+        landing = ((left < platforms[None, :, 0] + platforms[None, :, 2])
+                   & (right > platforms[None, :, 0])
+                   & was_above
+                   & (bottom >= platforms[None, :, 1])
+                   & (self.velocity[solid, 1] >= 0)[:, None])
+        landed = landing.any(axis=1)
+        if not landed.any():
+            return
+
+        # Si cruza varias a la vez se queda en la más alta
+        tops = np.where(landing, platforms[None, :, 1], np.inf).min(axis=1)
+        indices = solid[landed]
+        self.position[indices, 1] = tops[landed] - self.size[indices, 1]
+        self.velocity[indices, 1] = 0
+        self.on_ground[indices] = True
+
+    def _bounds_system(self, world_width, world_height):
+        """Turn around at the side walls; anything that falls out of the world is removed"""
+        left_wall = self.active & (self.position[:, 0] < 0)
+        right_wall = self.active & (self.position[:, 0] + self.size[:, 0] > world_width)
+        self.position[left_wall, 0] = 0
+        self.position[right_wall, 0] = world_width - self.size[right_wall, 0]
+        self.facing[left_wall] = 0
+        self.facing[right_wall] = 1
+        fallen = self.active & (self.position[:, 1] > world_height + self.tile_size)
+        if fallen.any():
+            self.despawn(np.flatnonzero(fallen))
+
+    def _player_contact_system(self, delta_time, jugadores):
+        """Enemies hurt players on contact; players landing on top stomp them"""
+        self.cooldown[self.active & (self.kind_behavior[self.kind] != EnemyWorld.SPAWNER)] -= delta_time
+        left = self.position[:, 0]
+        top = self.position[:, 1]
+        right = left + self.size[:, 0]
+        bottom = top + self.size[:, 1]
+        for jugador in jugadores:
+            rect = jugador.rect
+            touching = (self.active & self.alive & (left < rect.right) & (right > rect.left)
+                        & (top < rect.bottom) & (bottom > rect.top))
+            if not touching.any():
+                continue
+            for index in np.flatnonzero(touching).tolist():
+                self._resolve_contact(jugador, index)
+
+    def _resolve_contact(self, jugador, index):
+        kind = self.kind[index]
+        x, y = self.position[index]
+        width, height = self.size[index]
+        if self.kind_behavior[kind] == EnemyWorld.SPAWNER:
+            return
+
+        # Pisotón: el jugador cae sobre la mitad superior del enemigo
+        if jugador.velocidad_y > 0 and jugador.rect.bottom <= y + height / 2:
+            jugador.velocidad_y = -jugador.aceleracion * GameConstants.JUMP_FORCE * GameConstants.ENEMY_STOMP_BOUNCE
+            jugador.efectos.impact(x + width / 2, y, 5, jugador.tamaño)
+            self.despawn(index)
+            return
+
+        if self.cooldown[index] > 0:
+            return
+        self.cooldown[index] = GameConstants.ENEMY_HIT_COOLDOWN
+        damage = float(self.kind_damage[kind])
+        # Mismas reglas de bloqueo que CollisionHandler._apply_collision_effects
+        direction = 'left' if x + width / 2 < jugador.rect.centerx else 'right'
+        if jugador.bloqueando and jugador.direccion_bloqueo == direction:
+            damage *= 0.3
+            self.velocity[index, 0] *= -1
+            self.facing[index] ^= 1
+        else:
+            knockback = damage * 2
+            jugador.velocidad_x = knockback if direction == 'left' else -knockback
+        jugador.take_damage(damage)
+
+    def _build_frame_table(self):
+        """Flat list of every (kind, facing, frame) surface, indexed by one integer code"""
+        resource_manager = ResourceManager()
+        table = []
+        for kind, config in enumerate(EnemyWorld.KINDS):
+            width, height = (int(v) for v in self.kind_size[kind])
+            frames = []
+            for frame in range(config['frames']):
+                sprite = resource_manager.get_scaled_sprite(
+                    config['sheet'], width, height, frame // config['cols'], frame % config['cols'])
+                frames.append(sprite or resource_manager._create_fallback_surface(width, height))
+            frames += [frames[-1]] * (self.max_frames - len(frames))
+            flipped = [pygame.transform.flip(frame, True, False) for frame in frames]
+            table += frames + flipped
+        return table
+
+    def _drop_frame_table(self, key):
+        self.frame_table = None
+
+    def render_state(self, view=None):
+        """Immutable blit batch for every live enemy in view, built without per-entity method calls"""
+        if self.frame_table is None:
+            self.frame_table = self._build_frame_table()
+        active = np.flatnonzero(self._in_rect(view) if view else self.alive)
+        kind = self.kind[active].astype(np.int32)
+        frames = (self.anim_time[active] * self.kind_anim_fps[kind]).astype(np.int32) % self.kind_frames[kind]
+        codes = (kind * 2 + self.facing[active]) * self.max_frames + frames
+        positions = self.position[active].astype(np.int32).tolist()
+        blits = list(zip(map(self.frame_table.__getitem__, codes.tolist()), positions))
+        pixels = int((self.size[active, 0] * self.size[active, 1]).sum())
+        return SpriteBatch(blits, GameConstants.LAYER_ENEMIES, pixels)
+
+class ProjectileSystem:
+    """Charged shots in a fixed pool of NumPy arrays, moved and collided in one batch pass
+
+    Holding charge builds up to PROJECTILE_MAX_CHARGE seconds and letting go
+    fires along the held direction, or the way the player last moved; more
+    charge means a bigger, faster shot that hits harder. Slots come from a
+    preallocated stack of free indices, so firing never allocates.
+    """
+    CELL_STRIDE = 1 << 20  # Clave de celda = fila * CELL_STRIDE + columna
+
+    def __init__(self, tile_size, capacity=GameConstants.PROJECTILE_CAPACITY):
+        self.tile_size = tile_size
+        self.capacity = capacity
+        self.cell_size = tile_size * GameConstants.PLATFORM_GRID_CELL
+        levels = GameConstants.PROJECTILE_LEVELS
+        self.level_size = np.maximum(1, np.round(
+            np.linspace(*GameConstants.PROJECTILE_SIZE, levels) * tile_size)).astype(np.float32)
+        self._allocate()
+        self.charge = {}     # player_id -> segundos que lleva cargando
+        self.cooldown = {}   # player_id -> segundos hasta poder cargar otra vez
+        self.facing = {}     # player_id -> (dx, dy) del último movimiento
+        self.platforms = PlatformArrays()
+        # (rects, claves de celda ordenadas, rect de cada clave) de las fijas y de las móviles
+        self.fixed_table = self.moving_table = self._bucket(self.platforms.fixed)
+        self.surfaces = None
+
+    def _allocate(self):
+        """Component arrays; a projectile is an index into all of them"""
+        capacity = self.capacity
+        self.alive = np.zeros(capacity, bool)
+        self.position = np.zeros((capacity, 2), np.float32)   # Centro
+        self.velocity = np.zeros((capacity, 2), np.float32)   # px/s
+        self.half = np.zeros(capacity, np.float32)            # Mitad del lado
+        self.damage = np.zeros(capacity, np.float32)
+        self.level = np.zeros(capacity, np.int8)
+        self.owner = np.zeros(capacity, np.int16)             # player_id de quien la disparó o devolvió
+        self.lifetime = np.zeros(capacity, np.float32)
+        # Pila de índices libres: disparar y retirar sólo mueven el tope
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.intp)
+        self.free_count = capacity
+
+    def __len__(self):
+        return self.capacity - self.free_count
+
+    def fire(self, owner, x, y, dx, dy, charge):
+        """Launch a shot from (x, y) along (dx, dy); returns its index or None when the pool is full"""
+        if not self.free_count:
+            return None
+        self.free_count -= 1
+        index = self.free[self.free_count]
+        strength = min(charge / GameConstants.PROJECTILE_MAX_CHARGE, 1.0)
+        level = round(strength * (GameConstants.PROJECTILE_LEVELS - 1))
+        slow, fast = GameConstants.PROJECTILE_SPEED
+        speed = (slow + (fast - slow) * strength) * self.tile_size
+        low, high = GameConstants.PROJECTILE_DAMAGE
+        self.alive[index] = True
+        self.position[index] = (x, y)
+        self.velocity[index] = (dx * speed, dy * speed)
+        self.half[index] = self.level_size[level] / 2
+        self.damage[index] = low + (high - low) * strength
+        self.level[index] = level
+        self.owner[index] = owner
+        self.lifetime[index] = GameConstants.PROJECTILE_LIFETIME
+        return index
+
+    def despawn(self, indices):
+        indices = np.atleast_1d(indices)
+        indices = indices[self.alive[indices]]
+        self.alive[indices] = False
+        self.free[self.free_count:self.free_count + len(indices)] = indices
+        self.free_count += len(indices)
+
+    def clear(self):
+        self.despawn(np.flatnonzero(self.alive))
+        self.charge.clear()
+        self.cooldown.clear()
+
+    def handle_input(self, jugador, acciones, delta_time):
+        """Build up charge while the charge action is held, fire when it is let go"""
+        player_id = jugador.player_id
+        # Mismo orden de prioridad que Personaje.bloquear
+        if acciones & InputState.LEFT:
+            self.facing[player_id] = (-1, 0)
+        elif acciones & InputState.RIGHT:
+            self.facing[player_id] = (1, 0)
+        elif acciones & InputState.UP:
+            self.facing[player_id] = (0, -1)
+        elif acciones & InputState.DOWN:
+            self.facing[player_id] = (0, 1)
+        cooldown = self.cooldown.get(player_id, 0.0)
+        if cooldown > 0:
+            self.cooldown[player_id] = cooldown - delta_time
+        if acciones & InputState.CHARGE:
+            if cooldown <= 0:
+                self.charge[player_id] = self.charge.get(player_id, 0.0) + delta_time
+            return
+        charge = self.charge.pop(player_id, 0.0)
+        if charge >= GameConstants.PROJECTILE_MIN_CHARGE:
+            dx, dy = self.facing.get(player_id, (1, 0))
+            self.fire(player_id, *jugador.rect.center, dx, dy, charge)
+            self.cooldown[player_id] = GameConstants.PROJECTILE_COOLDOWN
+
+    def update(self, delta_time, jugadores, controlador, world_width, world_height):
+        """Move every live shot, then retire the ones that expired, left the world or hit something"""
+        active = np.flatnonzero(self.alive)
+        if not len(active):
+            return
+        self.position[active] += self.velocity[active] * delta_time
+        self.lifetime[active] -= delta_time
+        position = self.position[active]
+        half = self.half[active]
+        x, y = position[:, 0], position[:, 1]
+        gone = ((self.lifetime[active] <= 0) | (x + half < 0) | (x - half > world_width)
+                | (y + half < 0) | (y - half > world_height))
+        gone |= self._platform_system(controlador, position, half)
+        self._player_system(jugadores, active, position, half, gone)
+        self.despawn(active[gone])
+
+    def _bucket(self, platforms):
+        """Platform rects bucketed by grid cell, as sorted cell keys and the rect of each key"""
+        # Inflado con el mayor medio lado: basta mirar la celda del centro de cada proyectil
+        margin = self.level_size[-1] / 2
+        cell = self.cell_size
+        first_col = np.floor((platforms[:, 0] - margin) / cell).astype(np.int64)
+        last_col = np.floor((platforms[:, 0] + platforms[:, 2] + margin) / cell).astype(np.int64)
+        first_row = np.floor((platforms[:, 1] - margin) / cell).astype(np.int64)
+        last_row = np.floor((platforms[:, 1] + platforms[:, 3] + margin) / cell).astype(np.int64)
+        columns = last_col - first_col + 1
+        counts = columns * (last_row - first_row + 1)
+        owner = np.repeat(np.arange(len(platforms)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        keys = ((first_row[owner] + local // columns[owner]) * ProjectileSystem.CELL_STRIDE
+                + first_col[owner] + local % columns[owner])
+        order = np.argsort(keys, kind='stable')
+        return platforms, keys[order], owner[order]
+
+    def _platform_system(self, controlador, position, half):
+        """Mask of the shots overlapping a platform (same AABB test as Rect.colliderect)"""
+        fixed_changed, moving_changed = self.platforms.update(controlador)
+        # Las fijas sólo se reparten en celdas cuando cambia la lista; las móviles cuando se mueven
+        if fixed_changed:
+            self.fixed_table = self._bucket(self.platforms.fixed)
+        if moving_changed:
+            self.moving_table = self._bucket(self.platforms.moving)
+        hit = np.zeros(len(position), bool)
+        cells = np.floor(position / self.cell_size).astype(np.int64)
+        keys = cells[:, 1] * ProjectileSystem.CELL_STRIDE + cells[:, 0]
+        for table in (self.fixed_table, self.moving_table):
+            self._table_hits(table, keys, position, half, hit)
+        return hit
+
+    @staticmethod
+    def _table_hits(table, keys, position, half, hit):
+        platforms, cell_keys, cell_platforms = table
+        if not len(cell_keys):
+            return
+        start = np.searchsorted(cell_keys, keys, 'left')
+        counts = np.searchsorted(cell_keys, keys, 'right') - start
+        total = counts.sum()
+        if not total:
+            return
+        # Una fila por pareja (proyectil, plataforma de su celda)
+        shots = np.repeat(np.arange(len(position)), counts)
+        entries = np.arange(total) - np.repeat(np.cumsum(counts) - counts - start, counts)
+        rects = platforms[cell_platforms[entries]]
+        center, size = position[shots], half[shots]
+        overlap = ((center[:, 0] - size < rects[:, 0] + rects[:, 2]) & (center[:, 0] + size > rects[:, 0])
+                   & (center[:, 1] - size < rects[:, 1] + rects[:, 3]) & (center[:, 1] + size > rects[:, 1]))
+        hit[shots[overlap]] = True
+
+    def _player_system(self, jugadores, active, position, half, gone):
+        """Shots hurt every player but the one who owns them"""
+        left = position[:, 0] - half
+        right = position[:, 0] + half
+        top = position[:, 1] - half
+        bottom = position[:, 1] + half
+        owner = self.owner[active]
+        for jugador in jugadores:
+            rect = jugador.rect
+            touching = (~gone & (owner != jugador.player_id) & (left < rect.right) & (right > rect.left)
+                        & (top < rect.bottom) & (bottom > rect.top))
+            if not touching.any():
+                continue
+            for slot in np.flatnonzero(touching).tolist():
+                gone[slot] = self._resolve_hit(jugador, active[slot])
+
+    def _resolve_hit(self, jugador, index):
+        """Damage, knockback and blocking; returns whether the shot is used up"""
+        x, y = self.position[index].tolist()
+        velocity_x, velocity_y = self.velocity[index].tolist()
+        damage = float(self.damage[index])
+        # Lado por el que llega, en el eje de la velocidad dominante como en CollisionHandler
+        if abs(velocity_x) > abs(velocity_y):
+            direction = 'left' if x < jugador.rect.centerx else 'right'
+        else:
+            direction = 'up' if y < jugador.rect.centery else 'down'
+        blocked = jugador.bloqueando and jugador.direccion_bloqueo == direction
+        jugador.efectos.record(Telemetry.BLOCK if blocked else Telemetry.HIT,
+                               jugador.player_id, int(self.owner[index]), damage,
+                               jugador.rect.centerx, jugador.rect.centery)
+        if blocked:
+            # Mismas reglas de bloqueo que CollisionHandler._apply_collision_effects; además se devuelve
+            damage *= 0.3
+            self.velocity[index] *= -1
+            self.owner[index] = jugador.player_id
+        else:
+            knockback = damage * 2
+            if direction in ('left', 'right'):
+                jugador.velocidad_x = knockback if direction == 'left' else -knockback
+            else:
+                jugador.velocidad_y = knockback if direction == 'up' else -knockback
+        jugador.take_damage(damage)
+        jugador.efectos.impact(x, y, damage, jugador.tamaño)
+        return not blocked
+
+    def _build_surfaces(self):
+        """One colorkeyed disc per charge level"""
+        surfaces = []
+        for size in self.level_size.astype(int).tolist():
+            surface = pygame.Surface((size, size))
+            surface.fill(GameConstants.PARTICLE_COLORKEY)
+            pygame.draw.circle(surface, GameConstants.PROJECTILE_COLOR, (size / 2, size / 2), size / 2)
+            if pygame.display.get_surface():
+                surface = surface.convert()
+            surface.set_colorkey(GameConstants.PARTICLE_COLORKEY, pygame.RLEACCEL)
+            surfaces.append(surface)
+        return surfaces
+
+    def render_state(self, view=None):
+        """Immutable blit batch for every live shot in view"""
+        if self.surfaces is None:
+            self.surfaces = self._build_surfaces()
+        visible = self.alive
+        if view is not None:
+            x, y, half = self.position[:, 0], self.position[:, 1], self.half
+            visible = (visible & (x + half > view[0]) & (x - half < view[0] + view[2])
+                       & (y + half > view[1]) & (y - half < view[1] + view[3]))
+        shown = np.flatnonzero(visible)
+        positions = (self.position[shown] - self.half[shown, None]).astype(np.int32).tolist()
+        blits = list(zip(map(self.surfaces.__getitem__, self.level[shown].tolist()), positions))
+        pixels = int((4 * self.half[shown] ** 2).sum())
+        return SpriteBatch(blits, GameConstants.LAYER_EFFECTS, pixels)
+
 class SpriteSheet:
     """Handles sprite sheets and tile cutting"""
     def __init__(self, surface):
@@ -1011,7 +4541,87 @@ class SpriteSheet:
 class ResourceManager:
     """Manages game resources like images and sounds"""
     _instance = None
-    
+
+    # Imágenes sueltas
+    IMAGE_PATHS = {
+        'background': 'assets/Texturas/background.png',
+        'stars_far': 'assets/Texturas/escalar/stars_far.png',
+        'stars_near': 'assets/Texturas/escalar/stars_near.png'
+    }
+
+    # Spritesheets y cómo recortarlas
+    SPRITESHEET_CONFIGS = {
+        'player': {
+            'path': 'assets/Texturas/Jugador.png',
+            'sprite_width': 16,
+            'sprite_height': 16,
+            'rows': 2,
+            'cols': 2,
+            'start_row': 0,  # Fila inicial para recortar
+            'start_col': 0   # Columna inicial para recortar
+        },
+        'platform': {
+            'path': 'assets/Texturas/Plataformas.png',
+            'sprite_width': 8,
+            'sprite_height': 8,
+            'rows': 0,
+            'cols': 0,
+            'start_row': 0, 
+            'start_col': 0   
+        },
+        'explosion': {
+            'path': 'assets/Texturas/escalar/explotion.png',
+            'sprite_width': 18,
+            'sprite_height': 18,
+            'rows': 3,
+            'cols': 2,
+            'start_row': 0,
+            'start_col': 0
+        },
+        'worm': {
+            'path': 'assets/Texturas/escalar/worm.png',
+            'sprite_width': 9,
+            'sprite_height': 8,
+            'rows': 3,
+            'cols': 2
+        },
+        'bug': {
+            'path': 'assets/Texturas/escalar/bug.png',
+            'sprite_width': 8,
+            'sprite_height': 8,
+            'rows': 2,
+            'cols': 2
+        },
+        'skeleton': {
+            'path': 'assets/Texturas/escalar/skeleton.png',
+            'sprite_width': 9,
+            'sprite_height': 14,
+            'rows': 3,
+            'cols': 3
+        },
+        'ghost': {
+            'path': 'assets/Texturas/escalar/ghost.png',
+            'sprite_width': 12,
+            'sprite_height': 11,
+            'rows': 2,
+            'cols': 2
+        },
+        'wizmile': {
+            'path': 'assets/Texturas/escalar/wizmile.png',
+            'sprite_width': 9,
+            'sprite_height': 9,
+            'rows': 2,
+            'cols': 1
+        },
+        'tombstone': {
+            'path': 'assets/Texturas/escalar/tombstone.png',
+            'sprite_width': 8,
+            'sprite_height': 9,
+            'rows': 1,
+            'cols': 1
+        }
+    }
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ResourceManager, cls).__new__(cls)
@@ -1027,6 +4637,16 @@ class ResourceManager:
         self.sound_delays = {}  # Almacena el tiempo de último uso de cada sonido
         self.spritesheets = {}  # Para almacenar spritesheets
         self.sprites = {}       # Para almacenar sprites individuales
+        self.scaled_sprites = {}  # (key, width, height, row, col) -> sprite escalado
+        self.audio_cache = AudioCache()
+        self.music = None
+        self.music_channel = None
+        self.sound_banks = {}     # clave -> VariationBank
+        self.decoded_variations = OrderedDict()  # ruta -> (Sound, bytes), en orden de uso
+        self.decoded_bytes = 0
+        self.variation_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.asset_index = {}     # ruta -> (tipo, clave) de todo lo cargado, para AssetWatcher
+        self.reload_listeners = {}  # clave -> cachés derivadas a vaciar al recargarla
         self.audio_config = AudioConfig()
         self._initialized = True
 
@@ -1047,7 +4667,7 @@ class ResourceManager:
         })
         
         if current_time - last_played >= sound_config['delay']:
-            sound = self.get_sound(key)
+            sound = self._pick_variation(key) or self.get_sound(key)
             if sound:
                 volume = (self.audio_config.master_volume * 
                          self.audio_config.sfx_volume * 
@@ -1058,6 +4678,44 @@ class ResourceManager:
 
     
 
+    def _pick_variation(self, key):
+        """A variation of key, decoded on first use; None when key has no bank"""
+        bank = self.sound_banks.get(key)
+        while bank and bank.paths:
+            path = bank.pick()
+            entry = self.decoded_variations.get(path)
+            if entry:
+                self.decoded_variations.move_to_end(path)
+                self.variation_stats['hits'] += 1
+                return entry[0]
+            try:
+                sound = pygame.mixer.Sound(path)
+            except (pygame.error, FileNotFoundError):
+                print(f"Warning: Could not load sound {path}")
+                bank.discard(path)
+                continue
+            self.variation_stats['misses'] += 1
+            self._store_variation(path, sound)
+            return sound
+        return None
+
+    def _store_variation(self, path, sound):
+        """Keep a decoded variation, evicting the least recently used past the budget"""
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        size = int(sound.get_length() * frequency) * channels * (abs(sample_format) // 8)
+        while self.decoded_variations and self.decoded_bytes + size > self.audio_config.variation_budget:
+            # Un canal que la esté reproduciendo conserva su propia referencia
+            _, (_, evicted) = self.decoded_variations.popitem(last=False)
+            self.decoded_bytes -= evicted
+            self.variation_stats['evictions'] += 1
+        self.decoded_variations[path] = (sound, size)
+        self.decoded_bytes += size
+
+    def get_variation_stats(self):
+        """Decoded variations, their PCM size and cache hits/misses/evictions"""
+        return dict(self.variation_stats, decoded=len(self.decoded_variations),
+                    decoded_bytes=self.decoded_bytes)
+
     def load_resources(self):
         """Load all game resources"""
         self._load_images()
@@ -1065,60 +4723,75 @@ class ResourceManager:
         
     def _load_images(self):
         """Load all game images"""
-        # Cargar imágenes normales
-        image_paths = {
-            'background': 'assets/Texturas/background.png'
-        }
-        
-        # Cargar y cortar spritesheets
-        spritesheet_configs = {
-            'player': {
-                'path': 'assets/Texturas/Jugador.png',
-                'sprite_width': 16,
-                'sprite_height': 16,
-                'rows': 2,
-                'cols': 2,
-                'start_row': 0,  # Fila inicial para recortar
-                'start_col': 0   # Columna inicial para recortar
-            },
-            'platform': {
-                'path': 'assets/Texturas/Plataformas.png',
-                'sprite_width': 8,
-                'sprite_height': 8,
-                'rows': 0,
-                'cols': 0,
-                'start_row': 0, 
-                'start_col': 0   
-            }
+        for key in self.IMAGE_PATHS:
+            self._load_image_entry(key)
+        for key in self.SPRITESHEET_CONFIGS:
+            self._load_spritesheet(key)
+
+    def _load_image_entry(self, key):
+        """Load one plain image"""
+        path = self.IMAGE_PATHS[key]
+        self.asset_index[path] = ('image', key)
+        try:
+            self.images[key] = self._load_image(path)
+        except (pygame.error, FileNotFoundError):
+            print(f"Warning: Could not load image {path}")
+            self.images[key] = self._create_fallback_surface(32, 32)
+
+    def _load_spritesheet(self, key):
+        """Load one spritesheet and cut it into sprites"""
+        config = self.SPRITESHEET_CONFIGS[key]
+        self.asset_index[config['path']] = ('spritesheet', key)
+        try:
+            sheet_surface = self._load_image(config['path'])
+            self.spritesheets[key] = SpriteSheet(sheet_surface)
+            self.sprites[key] = self.spritesheets[key].get_sprite_grid(
+                config['sprite_width'],
+                config['sprite_height'],
+                config['rows'],
+                config['cols'],
+                config.get('start_row', 0),  # Usar 0 como valor por defecto
+                config.get('start_col', 0)   # Usar 0 como valor por defecto
+            )
+        except (pygame.error, FileNotFoundError):
+            print(f"Warning: Could not load spritesheet {config['path']}")
+            self.sprites[key] = [[self._create_fallback_surface(
+                config['sprite_width'], 
+                config['sprite_height']
+            )]]
+
+    def reload_asset(self, path):
+        """Reload the one image, spritesheet or sound loaded from path and
+        drop only the surfaces derived from it; returns its key"""
+        kind, key = self.asset_index[path]
+        loaders = {
+            'image': self._load_image_entry,
+            'spritesheet': self._load_spritesheet,
+            'sound': self._load_sound,
+            'music': self._load_music
         }
-        
-        # Cargar imágenes normales
-        for key, path in image_paths.items():
-            try:
-                self.images[key] = pygame.image.load(path).convert_alpha()
-            except (pygame.error, FileNotFoundError):
-                print(f"Warning: Could not load image {path}")
-                self.images[key] = self._create_fallback_surface(32, 32)
+        loaders[kind](key)
+        for cache_key in [cache_key for cache_key in self.scaled_sprites if cache_key[0] == key]:
+            del self.scaled_sprites[cache_key]
+        listeners = self.reload_listeners.get(key, [])
+        for listener in list(listeners):
+            callback = listener()
+            if callback is None:
+                listeners.remove(listener)  # El dueño de la caché ya no existe
+            else:
+                callback(key)
+        return key
 
-        # Cargar y procesar spritesheets
-        for key, config in spritesheet_configs.items():
-            try:
-                sheet_surface = pygame.image.load(config['path']).convert_alpha()
-                self.spritesheets[key] = SpriteSheet(sheet_surface)
-                self.sprites[key] = self.spritesheets[key].get_sprite_grid(
-                    config['sprite_width'],
-                    config['sprite_height'],
-                    config['rows'],
-                    config['cols'],
-                    config.get('start_row', 0),  # Usar 0 como valor por defecto
-                    config.get('start_col', 0)   # Usar 0 como valor por defecto
-                )
-            except (pygame.error, FileNotFoundError):
-                print(f"Warning: Could not load spritesheet {config['path']}")
-                self.sprites[key] = [[self._create_fallback_surface(
-                    config['sprite_width'], 
-                    config['sprite_height']
-                )]]
+    def add_reload_listener(self, key, callback):
+        """Call callback(key) after key is reloaded; callback is a bound method, held weakly"""
+        self.reload_listeners.setdefault(key, []).append(weakref.WeakMethod(callback))
+
+    @staticmethod
+    def _load_image(path):
+        """Load an image, converting it when there is a display surface to convert to"""
+        image = pygame.image.load(path)
+        # El backend SDL2 no crea un modo de video; sus texturas no necesitan convert
+        return image.convert_alpha() if pygame.display.get_surface() else image
 
     def _create_fallback_surface(self, width, height):
         """Create a fallback surface with checkerboard pattern"""
@@ -1143,6 +4816,10 @@ class ResourceManager:
                          self.audio_config.sfx_volume * 
                          config['volume'])
                 sound.set_volume(volume)
+        if self.music:
+            self.music.set_volume(self.audio_config.master_volume *
+                                  self.audio_config.music_volume *
+                                  self.audio_config.music_config['volume'])
 
     def set_master_volume(self, volume):
         """Set master volume and update all sounds"""
@@ -1174,24 +4851,63 @@ class ResourceManager:
 
     def _load_sounds(self):
         """Load all game sounds and configure volumes"""
-        for key, config in self.audio_config.sound_configs.items():
-            try:
-                sound = pygame.mixer.Sound(config['path'])
-                # Aplicar volumen combinado (master * sfx * sound)
-                volume = (self.audio_config.master_volume * 
-                         self.audio_config.sfx_volume * 
-                         config['volume'])
-                sound.set_volume(volume)
-                self.sounds[key] = sound
-            except (pygame.error, FileNotFoundError):
-                print(f"Warning: Could not load sound {config['path']}")
+        for key in self.audio_config.sound_configs:
+            self._load_sound(key)
+        if self.music is None:
+            self._load_music()
+
+    def _load_music(self, key='music'):
+        """Decode the background music once; later load_resources() calls keep it"""
+        path = self.audio_config.music_config['path']
+        self.asset_index[path] = ('music', key)
+        try:
+            self.music = self.audio_cache.load(path)
+        except (pygame.error, FileNotFoundError):
+            print(f"Warning: Could not load music {path}")
+            return
+        if self.music_channel and self.music_channel.get_busy():
+            # Recargada mientras sonaba: se cambia por la nueva
+            self.music_channel.stop()
+            self.play_music()
+
+    def play_music(self):
+        """Loop the background music, unless it is already playing"""
+        if not self.music or (self.music_channel and self.music_channel.get_busy()):
+            return
+        self.update_volumes()
+        self.music_channel = self.music.play(loops=-1)
+
+    def _load_sound(self, key):
+        """Load one sound with its volume"""
+        config = self.audio_config.sound_configs[key]
+        self.asset_index[config['path']] = ('sound', key)
+        try:
+            sound = self.audio_cache.load(config['path'])
+            # Aplicar volumen combinado (master * sfx * sound)
+            volume = (self.audio_config.master_volume * 
+                     self.audio_config.sfx_volume * 
+                     config['volume'])
+            sound.set_volume(volume)
+            self.sounds[key] = sound
+        except (pygame.error, FileNotFoundError):
+            print(f"Warning: Could not load sound {config['path']}")
+        if 'variations' in config:
+            # Solo se listan los archivos; cada uno se decodifica la primera vez que suena
+            self.sound_banks[key] = VariationBank(glob.glob(config['variations']),
+                                                  config.get('no_repeat', 0))
 
     def get_scaled_sprite(self, key, width, height, row=0, col=0):
-        """Get a sprite scaled to specified dimensions"""
-        sprite = self.get_sprite(key, row, col)
-        if sprite:
-            return pygame.transform.scale(sprite, (width, height))
-        return None
+        """Get a sprite scaled to specified dimensions, scaling each size only once"""
+        cache_key = (key, width, height, row, col)
+        scaled = self.scaled_sprites.get(cache_key)
+        if scaled is None:
+            sprite = self.get_sprite(key, row, col)
+            if not sprite:
+                return None
+            # Las mismas superficies cada frame permiten agrupar los blits
+            scaled = pygame.transform.scale(sprite, (width, height))
+            self.scaled_sprites[cache_key] = scaled
+        return scaled
 
     def create_combined_surface(self, key, tile_width, tile_height, rows, cols, start_row=0, start_col=0):
         """Create a combined surface from multiple tiles"""
@@ -1203,12 +4919,75 @@ class ResourceManager:
                     combined_surface.blit(tile, (col * tile_width, row * tile_height))
         return combined_surface
 
+class AssetWatcher:
+    """Dev mode: watches the mtime and size of every loaded asset from a background thread
+
+    The thread only calls os.stat; reloads run on the game thread in apply_changes(),
+    where surfaces can be converted, and only touch the assets that changed.
+    """
+    def __init__(self, resource_manager=None, interval=GameConstants.ASSET_POLL_INTERVAL):
+        self.resource_manager = resource_manager or ResourceManager()
+        self.interval = interval
+        self.index = {path: self._stat(path) for path in self.resource_manager.asset_index}
+        self.pending = {}  # ruta -> firma vista una vez; se recarga cuando deja de cambiar
+        self.changes = queue.Queue()
+        self.reloads = 0
+        self.last_reload_ms = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._poll_loop, name='asset-watcher', daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _stat(path):
+        """(mtime, size) of path, or None while it is missing"""
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """Queue every asset whose signature changed and then held still for one poll"""
+        for path, known in self.index.items():
+            current = self._stat(path)
+            if current is None or current == known:
+                self.pending.pop(path, None)
+            elif self.pending.get(path) == current:
+                # Dos lecturas iguales: el editor terminó de escribir
+                del self.pending[path]
+                self.index[path] = current
+                self.changes.put(path)
+            else:
+                self.pending[path] = current
+
+    def apply_changes(self):
+        """Reload the assets queued by the watcher; cheap when nothing changed"""
+        while True:
+            try:
+                path = self.changes.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            key = self.resource_manager.reload_asset(path)
+            self.last_reload_ms = (time.perf_counter() - start) * 1000.0
+            self.reloads += 1
+            print(f"Reloaded {key} ({path}) in {self.last_reload_ms:.1f} ms")
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+
 class HUD:
     """Heads Up Display for game interface"""
     def __init__(self, game_constants):
         self.constants = game_constants
         self._setup_colors()
-        self._setup_rects()
+        self.background_rects = []
+        self.screen_size = None  # Las barras se calculan al dibujar, con el tamaño de la Pantalla
 
     def _setup_colors(self):
         """Setup color references for better readability"""
@@ -1218,65 +4997,65 @@ class HUD:
             'border': self.constants.COLORS['WHITE']
         }
 
-    def _setup_rects(self):
-        """Initialize health bar rectangles for both players"""
-        screen_width = pygame.display.get_surface().get_width()
-        screen_height = pygame.display.get_surface().get_height()
+    def _setup_rects(self, num_players, screen_size):
+        """Initialize health bar rectangles, spread along the bottom of the screen"""
+        screen_width, screen_height = screen_size
+        self.screen_size = screen_size
         
-        # Rectángulo jugador 1 (izquierda)
-        self.background_rect_p1 = pygame.Rect(
-            self.constants.UI_MARGIN,
-            screen_height - self.constants.UI_MARGIN_BOTTOM,
+        # Jugador 1 a la izquierda, el último a la derecha y el resto repartidos
+        available = screen_width - 2 * self.constants.UI_MARGIN
+        bar_width = min(
             self.constants.UI_HEALTH_WIDTH,
-            self.constants.UI_HEALTH_HEIGHT
+            (available - self.constants.UI_HEALTH_GAP * (num_players - 1)) // num_players
         )
+        step = (available - bar_width) / (num_players - 1) if num_players > 1 else 0
         
-        # Rectángulo jugador 2 (derecha)
-        self.background_rect_p2 = pygame.Rect(
-            screen_width - self.constants.UI_HEALTH_WIDTH - self.constants.UI_MARGIN,
-            screen_height - self.constants.UI_MARGIN_BOTTOM,
-            self.constants.UI_HEALTH_WIDTH,
-            self.constants.UI_HEALTH_HEIGHT
-        )
+        self.background_rects = [
+            pygame.Rect(
+                self.constants.UI_MARGIN + round(index * step),
+                screen_height - self.constants.UI_MARGIN_BOTTOM,
+                bar_width,
+                self.constants.UI_HEALTH_HEIGHT
+            )
+            for index in range(num_players)
+        ]
 
     def dibujar(self, pantalla=Pantalla, jugadores=None):
-        if not jugadores or len(jugadores) < 2:
+        if not jugadores:
             return
+        screen_size = tuple(pantalla.get_screen_data("width", "height"))
+        if len(jugadores) != len(self.background_rects) or screen_size != self.screen_size:
+            self._setup_rects(len(jugadores), screen_size)
             
-        display = pantalla.get_screen_data("display")
+        render_queue = pantalla.render_queue
         
-        # Dibujar barra de vida jugador 1
-        self._draw_player_health_bar(
-            display, 
-            jugadores[0].get_health_percentage(),
-            self.background_rect_p1
-        )
-        
-        # Dibujar barra de vida jugador 2
-        self._draw_player_health_bar(
-            display,
-            jugadores[1].get_health_percentage(),
-            self.background_rect_p2
-        )
+        # Dibujar una barra de vida por jugador
+        for jugador, background_rect in zip(jugadores, self.background_rects):
+            self._draw_player_health_bar(
+                render_queue,
+                jugador.get_health_percentage(),
+                background_rect
+            )
 
-    def _draw_player_health_bar(self, display, health_percentage, background_rect):
+    def _draw_player_health_bar(self, render_queue, health_percentage, background_rect):
         """Draw health bar for a specific player"""
+        layer = self.constants.LAYER_HUD
         # Fondo
-        pygame.draw.rect(display, self.colors['background'], background_rect)
+        render_queue.submit_rect(self.colors['background'], background_rect, layer)
         
         # Barra de vida actual
         health_rect = background_rect.copy()
-        health_rect.width = self.constants.UI_HEALTH_WIDTH * health_percentage
-        pygame.draw.rect(display, self.colors['health'], health_rect)
+        health_rect.width = background_rect.width * health_percentage
+        render_queue.submit_rect(self.colors['health'], health_rect, layer)
         
         # Borde
-        pygame.draw.rect(display, self.colors['border'], background_rect, 2)
+        render_queue.submit_rect(self.colors['border'], background_rect, layer, 2)
 
 class PlayerControls:
     """Configuration class for player controls"""
     def __init__(self, up=pygame.K_UP, down=pygame.K_DOWN, 
                  left=pygame.K_LEFT, right=pygame.K_RIGHT, 
-                 block=pygame.K_RCTRL, charge=pygame.K_KP0):
+                 block=pygame.K_RCTRL, charge=pygame.K_KP0, gamepad=None):
         self.controls = {
             'up': up,
             'down': down,
@@ -1285,6 +5064,8 @@ class PlayerControls:
             'block': block,
             'charge': charge
         }
+        self.gamepad = gamepad  # Índice del mando, o None
+        self._compile()
     
     def get_key(self, action):
         return self.controls.get(action)
@@ -1292,14 +5073,714 @@ class PlayerControls:
     def set_key(self, action, key):
         if action in self.controls:
             self.controls[action] = key
+            self._compile()
+
+    def _compile(self):
+        """(key, action bit) pairs read by InputFrame.actions; placeholder keys are skipped"""
+        self.key_bits = tuple((key, InputState.ACTION_BITS[action])
+                              for action, key in self.controls.items() if key > 0)
+
+    # (up, down, left, right, block, charge) para cada jugador de teclado
+    KEYBOARD_LAYOUTS = [
+        (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_RCTRL, pygame.K_KP0),
+        (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d, pygame.K_q, pygame.K_e),
+        (pygame.K_i, pygame.K_k, pygame.K_j, pygame.K_l, pygame.K_u, pygame.K_o),
+        (pygame.K_KP8, pygame.K_KP5, pygame.K_KP4, pygame.K_KP6, pygame.K_KP7, pygame.K_KP9)
+    ]
 
     @classmethod
     def get_default_controls(cls, player_number=1):
-        if player_number == 1:
-            return cls(pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_RCTRL, pygame.K_KP0)
-        return cls(pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d, pygame.K_q, pygame.K_e)
+        """Keyboard layout for the player; players past the last layout get no keys bound"""
+        # El mando N va siempre con el jugador N, también cuando no le queda teclado
+        gamepad = player_number - 1
+        if 1 <= player_number <= len(cls.KEYBOARD_LAYOUTS):
+            return cls(*cls.KEYBOARD_LAYOUTS[player_number - 1], gamepad=gamepad)
+        return cls(*([pygame.K_UNKNOWN] * 6), gamepad=gamepad)
+
+    @classmethod
+    def get_virtual_controls(cls):
+        """Distinct placeholder keys for players driven by VirtualKeys (bots)"""
+        return cls(*(-index for index in range(1, 7)))
+
+class InputState:
+    """Reads the keyboard and every gamepad once per frame into an InputFrame"""
+    ACTIONS = ('up', 'down', 'left', 'right', 'block', 'charge')
+    UP, DOWN, LEFT, RIGHT, BLOCK, CHARGE = (1 << index for index in range(len(ACTIONS)))
+    ACTION_BITS = dict(zip(ACTIONS, (UP, DOWN, LEFT, RIGHT, BLOCK, CHARGE)))
+    # Botones del mando (numeración SDL de un mando tipo Xbox): A salta, B bloquea, X cava
+    GAMEPAD_BUTTONS = ((0, UP), (1, BLOCK), (2, DOWN), (3, CHARGE))
+
+    def __init__(self):
+        self.gamepads = []  # (joystick, ejes, crucetas, botones)
+
+    def poll(self, pressed=()):
+        """Snapshot of this frame's input; later polls never change it
+
+        pressed holds the keys of this frame's KEYDOWN events, which count as held
+        even when they were released again before the sample.
+        """
+        if pygame.joystick.get_init() and pygame.joystick.get_count() != len(self.gamepads):
+            self._refresh_gamepads()
+        return InputFrame(pygame.key.get_pressed(), [self._gamepad_bits(*pad) for pad in self.gamepads],
+                          frozenset(pressed))
+
+    def _refresh_gamepads(self):
+        """Reopen the gamepads after one is plugged in or removed"""
+        self.gamepads = []
+        for index in range(pygame.joystick.get_count()):
+            joystick = pygame.joystick.Joystick(index)
+            buttons = tuple((button, bit) for button, bit in InputState.GAMEPAD_BUTTONS
+                            if button < joystick.get_numbuttons())
+            self.gamepads.append((joystick, joystick.get_numaxes() >= 2, joystick.get_numhats() > 0, buttons))
+
+    @staticmethod
+    def _gamepad_bits(joystick, axes, hat, buttons):
+        bits = 0
+        if axes:
+            x, y = joystick.get_axis(0), joystick.get_axis(1)
+            deadzone = GameConstants.GAMEPAD_DEADZONE
+            bits |= ((x < -deadzone) * InputState.LEFT | (x > deadzone) * InputState.RIGHT |
+                     (y < -deadzone) * InputState.UP | (y > deadzone) * InputState.DOWN)
+        if hat:
+            x, y = joystick.get_hat(0)  # En la cruceta, y positiva es arriba
+            bits |= ((x < 0) * InputState.LEFT | (x > 0) * InputState.RIGHT |
+                     (y > 0) * InputState.UP | (y < 0) * InputState.DOWN)
+        for button, bit in buttons:
+            if joystick.get_button(button):
+                bits |= bit
+        return bits
+
+class InputFrame:
+    """One frame of keyboard and gamepad state"""
+    __slots__ = ('keys', 'gamepads', 'pressed')
+
+    def __init__(self, keys, gamepads, pressed=frozenset()):
+        self.keys = keys          # pygame.key.get_pressed()
+        self.gamepads = gamepads  # Bits de acción de cada mando
+        self.pressed = pressed    # Teclas con KEYDOWN en este frame
+
+    def actions(self, controls):
+        """Action bits for a player's controls"""
+        keys = self.keys
+        pressed = self.pressed
+        bits = 0
+        for key, bit in controls.key_bits:
+            if keys[key] or (pressed and key in pressed):
+                bits |= bit
+        if controls.gamepad is not None and controls.gamepad < len(self.gamepads):
+            bits |= self.gamepads[controls.gamepad]
+        return bits
+
+class VirtualKeys:
+    """Input driven by code instead of a keyboard: the same action bits for any controls"""
+    def __init__(self, actions=()):
+        self.bits = 0
+        for action in actions:
+            self.bits |= InputState.ACTION_BITS[action]
+
+    def actions(self, controls):
+        return self.bits
+
+# Secuencias que prueba el planificador: se mantiene una acción y luego otra
+BOT_CANDIDATE_ACTIONS = [
+    (),
+    ('left',),
+    ('right',),
+    ('up',),
+    ('left', 'up'),
+    ('right', 'up'),
+    ('down',),
+    ('block', 'left'),
+    ('block', 'right')
+]
+
+def _personaje_from_state(state, controls):
+    """Rebuild a Personaje from a compact snapshot entry"""
+    (player_id, x, y, tamaño, velocidad_x, velocidad_y, health,
+     salto, cavar, estado_gravedad, ensima) = state
+    jugador = Personaje(x, y, tamaño, controls=controls, player_id=player_id, efectos=SIN_EFECTOS)
+    jugador.velocidad_x = velocidad_x
+    jugador.velocidad_y = velocidad_y
+    jugador.health = health
+    jugador.salto = salto
+    jugador.cavar = cavar
+    jugador.ensima_Colision = pygame.Rect(ensima) if ensima else None
+    if jugador.ensima_Colision is None:
+        estado_gravedad = GameConstants.STATE_FALLING
+    jugador.estado_gravedad = estado_gravedad
+    return jugador
+
+def _bot_platform_steps(controlador, players_state, reloj, steps):
+    """Platforms around the simulated players for every frame of a plan, built once per plan
+
+    Entry k is (controller with the fixed platforms plus the moving ones where
+    they are k frames after reloj, {id(rect at k - 1): (rect at k, dx, dy)}).
+    Every candidate sequence replays the same frames, so none of them has to
+    move platforms itself.
+    """
+    left = min(state[1] for state in players_state)
+    top = min(state[2] for state in players_state)
+    right = max(state[1] + state[3] for state in players_state)
+    bottom = max(state[2] + state[3] for state in players_state)
+    margin = max(state[3] for state in players_state) * GameConstants.BOT_SIM_MARGIN
+    area = pygame.Rect(left, top, right - left, bottom - top).inflate(margin * 2, margin * 2)
+    fijas = [plataforma for plataforma in controlador.query(area)
+             if not isinstance(plataforma, PlataformaMovil)]
+    moviles = controlador.moviles_cerca(area)
+    delta_time = 1.0 / GameConstants.FPS
+    pasos = []
+    anteriores = None
+    for step in range(steps + 1):
+        copias = []
+        for plataforma in moviles:
+            tiempo = plataforma.fase + reloj + step * delta_time
+            copia = Plataforma(posicion_X=0, posicion_Y=0, ancho=plataforma.ancho, alto=plataforma.alto,
+                               visible=plataforma.visible_ahora(tiempo))
+            copia.rect.topleft = plataforma.posicion(tiempo)
+            copias.append(copia)
+        paso = controlador_plataformas()
+        paso.cell_size = controlador.cell_size
+        paso.agregar_plataformas(fijas + [copia for copia in copias if copia.visible])
+        siguiente = {}
+        if anteriores:
+            for antes, copia in zip(anteriores, copias):
+                siguiente[id(antes.rect)] = (copia.rect, copia.rect.x - antes.rect.x, copia.rect.y - antes.rect.y)
+        pasos.append((paso, siguiente))
+        anteriores = copias
+    return pasos
+
+def _simulate_bot_plan(player_id, players_state, plan, pantalla, controlador, pasos=None):
+    """Play a candidate action sequence forward with the real physics and score it
+
+    pasos, from _bot_platform_steps, replaces controlador when platforms move.
+    """
+    controls = PlayerControls.get_virtual_controls()
+    jugadores = [_personaje_from_state(state, controls) for state in players_state]
+    bot = next(jugador for jugador in jugadores if jugador.player_id == player_id)
+    if pasos:
+        # Apoyarse en el rect de la plataforma, no en una copia, para que ésta lo lleve
+        inicio = {tuple(plataforma.rect): plataforma.rect for plataforma in pasos[0][0].plataformas}
+        for jugador in jugadores:
+            if jugador.ensima_Colision is not None:
+                jugador.ensima_Colision = inicio.get(tuple(jugador.ensima_Colision), jugador.ensima_Colision)
+    rivales = [jugador for jugador in jugadores if jugador is not bot]
+    start_health = {jugador.player_id: jugador.health for jugador in jugadores}
+    delta_time = 1.0 / GameConstants.FPS
+    idle = VirtualKeys().bits
+
+    def distance_to_target():
+        if not rivales:
+            return 0.0
+        return min(math.hypot(bot.rect.centerx - rival.rect.centerx,
+                              bot.rect.centery - rival.rect.centery) for rival in rivales)
+
+    start_distance = distance_to_target()
+    for step, actions in enumerate(plan):
+        acciones_bot = VirtualKeys(actions).bits
+        if pasos:
+            # Igual que mover_plataformas: primero se mueven y llevan a quien está encima
+            controlador, siguiente = pasos[step + 1]
+            for jugador in jugadores:
+                destino = siguiente.get(id(jugador.ensima_Colision))
+                if destino and jugador.estado_gravedad != GameConstants.STATE_FALLING:
+                    rect, dx, dy = destino
+                    jugador.rect.move_ip(dx, dy)
+                    jugador.actualizar_posicion_rects()
+                    jugador.ensima_Colision = rect
+        for jugador in jugadores:
+            acciones = acciones_bot if jugador is bot else idle
+            jugador.calcular_colision(controlador, acciones)
+            jugador.mover(acciones, delta_time, pantalla)
+        CollisionHandler.check_all_player_collisions(
+            jugadores,
+            damage_threshold=GameConstants.PLAYER_DAMAGE_THRESHOLD,
+            damage_factor=GameConstants.PLAYER_DAMAGE_FACTOR
+        )
+
+    dealt = sum(start_health[rival.player_id] - rival.health for rival in rivales)
+    taken = start_health[bot.player_id] - bot.health
+    end_distance = distance_to_target()
+    return (dealt * GameConstants.BOT_DAMAGE_DEALT_WEIGHT
+            - taken * GameConstants.BOT_DAMAGE_TAKEN_WEIGHT
+            - end_distance / bot.tamaño
+            + (start_distance - end_distance) / bot.tamaño * GameConstants.BOT_CLOSING_WEIGHT)
+
+def plan_bot_actions(player_id, players_state, pantalla, controlador, deadline, reloj=0.0):
+    """Anytime search over candidate sequences; returns the best plan found before the deadline
+
+    reloj is the moving platforms' clock when players_state was taken.
+    """
+    # Sólo el bot y sus rivales más cercanos entran en la simulación
+    me = next(state for state in players_state if state[0] == player_id)
+    rivales = sorted(
+        (state for state in players_state if state[0] != player_id),
+        key=lambda state: (state[1] - me[1]) ** 2 + (state[2] - me[2]) ** 2
+    )[:GameConstants.BOT_SIM_OPPONENTS]
+    players_state = [me] + rivales
+
+    steps = GameConstants.BOT_LOOKAHEAD_STEPS
+    half = steps // 2
+    # Primero las secuencias que mantienen una sola acción, luego las combinadas
+    candidates = [(first, first) for first in BOT_CANDIDATE_ACTIONS]
+    candidates += [(first, second) for first in BOT_CANDIDATE_ACTIONS
+                   for second in BOT_CANDIDATE_ACTIONS if first != second]
+
+    pasos = None
+    if getattr(controlador, 'moviles', None):
+        pasos = _bot_platform_steps(controlador, players_state, reloj, steps)
+
+    best_plan, best_score = [], None
+    for first, second in candidates:
+        if best_plan and time.monotonic() >= deadline:
+            break
+        plan = [first] * half + [second] * (steps - half)
+        score = _simulate_bot_plan(player_id, players_state, plan, pantalla, controlador, pasos)
+        if best_score is None or score > best_score:
+            best_plan, best_score = plan, score
+    return best_plan
+
+def _bot_planner_worker(conn, screen_size, platform_layout, world_screens=(1, 1)):
+    """Worker process loop: receive snapshots, send back plans"""
+    pantalla = PantallaVirtual(*screen_size)
+    pantalla.set_world_size(*world_screens)
+    controlador = BotPlanner.build_controller(platform_layout)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        if message[0] == 'platforms':
+            controlador = BotPlanner.build_controller(message[1])
+            continue
+
+        _, player_id, seq, players_state, reloj, deadline = message
+        if time.monotonic() >= deadline:
+            conn.send((player_id, seq, None))  # Llegó tarde, no vale la pena planear
+            continue
+        search_deadline = deadline - GameConstants.BOT_REPLY_MARGIN_MS / 1000.0
+        plan = plan_bot_actions(player_id, players_state, pantalla, controlador, search_deadline, reloj)
+        conn.send((player_id, seq, plan))
+
+class BotPlanner:
+    """Runs bot lookahead search in worker processes without ever blocking the game thread"""
+    def __init__(self, pantalla, controlador, workers=1):
+        self.screen_size = pantalla.get_screen_data("width", "height")
+        self.world_screens = pantalla.get_screen_data("screens_x", "screens_y")
+        self.layout = BotPlanner.platform_layout(controlador)
+        self.platform_version = controlador.version
+        self._setup_workers(max(1, workers))
+        self.pending = {}     # player_id -> (seq, frame) de la petición en curso
+        self.decisions = {}   # player_id -> (plan, frame del snapshot)
+        self.seq = 0
+        self.plans_received = 0
+        self.late_plans = 0
+
+    def _setup_workers(self, count):
+        """Start worker processes, each with its own pipe"""
+        context = multiprocessing.get_context('spawn')
+        self.workers = []
+        for _ in range(count):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_bot_planner_worker,
+                args=(child_conn, self.screen_size, self.layout, self.world_screens),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append((process, parent_conn))
+
+    @staticmethod
+    def platform_layout(controlador):
+        """(fixed rects, moving platform specs); the workers move the latter themselves"""
+        moviles = getattr(controlador, 'moviles', ())
+        rects_moviles = {id(plataforma.rect) for plataforma in moviles}
+        fijas = [tuple(rect) for rect in controlador.get_rects() if id(rect) not in rects_moviles]
+        return fijas, controlador.movil_specs() if moviles else []
+
+    @staticmethod
+    def build_controller(layout):
+        fijas, moviles = layout
+        controlador = controlador_plataformas()
+        plataformas = [Plataforma(posicion_X=x, posicion_Y=y, ancho=ancho, alto=alto)
+                       for x, y, ancho, alto in fijas]
+        for tipo, ancho, alto, ruta, velocidad, tiempo_visible, tiempo_oculta, fase in moviles:
+            plataformas.append(PlataformaMovil(
+                tipo=tipo, ancho=ancho, alto=alto, posicion_X=ruta[0][0], posicion_Y=ruta[0][1],
+                ruta=ruta, velocidad=velocidad, tiempo_visible=tiempo_visible,
+                tiempo_oculta=tiempo_oculta, fase=fase))
+        controlador.agregar_plataformas(plataformas)
+        controlador.reiniciar_moviles()
+        return controlador
+
+    @staticmethod
+    def make_snapshot(jugadores):
+        """Compact, picklable state of the players"""
+        return tuple(
+            (jugador.player_id, jugador.rect.x, jugador.rect.y, jugador.tamaño,
+             jugador.velocidad_x, jugador.velocidad_y, jugador.health,
+             jugador.salto, jugador.cavar, jugador.estado_gravedad,
+             tuple(jugador.ensima_Colision) if jugador.ensima_Colision else None)
+            for jugador in jugadores
+        )
+
+    def _worker_for(self, player_id):
+        return self.workers[player_id % len(self.workers)][1]
+
+    def sync_platforms(self, controlador):
+        """Send the platform layout again if the list changed (moving platforms move by themselves)"""
+        version = controlador.version
+        if version == self.platform_version:
+            return
+        self.platform_version = version
+        layout = BotPlanner.platform_layout(controlador)
+        if layout != self.layout:
+            self.layout = layout
+            for _, conn in self.workers:
+                conn.send(('platforms', layout))
+
+    def request(self, player_id, snapshot, frame, reloj=0.0):
+        """Queue a planning request unless this player already has one in flight
+
+        reloj is the moving platforms' clock at the snapshot.
+        """
+        if player_id in self.pending:
+            return
+        self.seq += 1
+        deadline = time.monotonic() + GameConstants.BOT_DEADLINE_MS / 1000.0
+        self._worker_for(player_id).send(('plan', player_id, self.seq, snapshot, reloj, deadline))
+        self.pending[player_id] = (self.seq, frame, deadline)
+
+    def poll(self):
+        """Collect every plan that has arrived, without waiting"""
+        now = time.monotonic()
+        for _, conn in self.workers:
+            while conn.poll():
+                player_id, seq, plan = conn.recv()
+                pending = self.pending.get(player_id)
+                if not pending or pending[0] != seq:
+                    continue
+                del self.pending[player_id]
+                if plan is None or now > pending[2]:
+                    self.late_plans += 1
+                    continue
+                self.plans_received += 1
+                self.decisions[player_id] = (plan, pending[1])
+
+    def take_decision(self, player_id):
+        """Newest plan for the player and the frame its snapshot was taken on"""
+        return self.decisions.pop(player_id, None)
+
+    def close(self):
+        """Stop the worker processes"""
+        for process, conn in self.workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn in self.workers:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.workers = []
+
+class BotController:
+    """CPU opponent: presses the same actions as PlayerControls through VirtualKeys"""
+    def __init__(self, jugador, planner):
+        self.jugador = jugador
+        self.planner = planner
+        self.jugador.controls = PlayerControls.get_virtual_controls()
+        self.reset()
+
+    def reset(self):
+        self.plan = []
+        self.frame = 0
+        self.keys = VirtualKeys()
+
+    def update(self, snapshot, controlador):
+        """Advance one frame of the current plan and ask for a new one"""
+        self.frame += 1
+        self.planner.poll()
+        decision = self.planner.take_decision(self.jugador.player_id)
+        if decision:
+            plan, snapshot_frame = decision
+            # Saltar los pasos que ya pasaron mientras el plan se calculaba
+            self.plan = list(plan[self.frame - snapshot_frame:])
+
+        if self.jugador.player_id not in self.planner.pending:
+            self.planner.sync_platforms(controlador)
+            self.planner.request(self.jugador.player_id, snapshot, self.frame,
+                                 getattr(controlador, 'reloj', 0.0))
+
+        actions = self.plan.pop(0) if self.plan else ()
+        self.keys = VirtualKeys(actions)
+
+    def get_keys(self):
+        return self.keys
+
+class CubeBattleEnv:
+    """One headless match driven by code, Gym style: reset() and step(actions) with NumPy arrays
+
+    Every player is an agent. actions holds one InputState action bitmask per
+    player (0 to ACTION_COUNT - 1). Observations are one row of
+    OBSERVATION_FEATURES per player: positions over the world size, velocities
+    over top speed, health over PLAYER_MAX_HEALTH. A player's reward is the
+    health its rivals lost on average minus the health it lost, over
+    PLAYER_MAX_HEALTH. The episode ends when at most one player is left alive,
+    or is truncated after max_steps.
+    """
+    OBSERVATION_FEATURES = ('x', 'y', 'velocity_x', 'velocity_y', 'health', 'can_jump', 'can_dig',
+                            'falling', 'digging', 'blocking', 'alive')
+    ACTION_COUNT = 1 << len(InputState.ACTIONS)
+
+    def __init__(self, num_players=2, width=800, height=600, world=(1, 1),
+                 max_steps=GameConstants.ENV_MAX_STEPS, seed=None):
+        if np is None:
+            raise ImportError("CubeBattleEnv requires NumPy")
+        self.num_players = num_players
+        self.max_steps = max_steps
+        self.rng = random.Random(seed)
+        self.pantalla = PantallaVirtual(width, height, "Entorno")
+        self.pantalla.set_world_size(*world)
+        self.controlador = crear_plataformas(controlador_plataformas(), self.pantalla)
+        self.world_size = self.pantalla.get_screen_data("world_width", "world_height")
+        self.delta_time = 1.0 / GameConstants.FPS
+        self.controls = PlayerControls.get_virtual_controls()
+        # VectorCubeBattleEnv cambia estos arrays por vistas de sus buffers compartidos
+        self.observation = np.zeros((num_players, len(CubeBattleEnv.OBSERVATION_FEATURES)), np.float32)
+        self.rewards = np.zeros(num_players, np.float32)
+        self.jugadores = []
+        self.steps = 0
+
+    def reset(self, seed=None):
+        """Start a new match; returns (observation, info)"""
+        self._reset(seed)
+        return self.observation.copy(), {}
+
+    def step(self, actions):
+        """Advance one frame; returns (observation, rewards, terminated, truncated, info)"""
+        terminated, truncated = self._step(actions)
+        return self.observation.copy(), self.rewards.copy(), terminated, truncated, {'steps': self.steps}
+
+    def _reset(self, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+        tamaño, width, height = self.pantalla.get_screen_data("tile_size", "width", "height")
+        jitter = tamaño * GameConstants.ENV_SPAWN_JITTER
+        spawns = GameConstants.calculate_spawn_positions(width, height, self.num_players)
+        self.jugadores = [
+            Personaje(x + self.rng.uniform(-jitter, jitter), y, tamaño,
+                      controls=self.controls, player_id=player_id, efectos=SIN_EFECTOS)
+            for player_id, (x, y) in sorted(spawns.items())
+        ]
+        self.steps = 0
+        self.rewards[:] = 0.0
+        self._observe()
+
+    def _step(self, actions):
+        """Same order as GameStateManager._update_game_state, without camera, bots or effects"""
+        health = [jugador.health for jugador in self.jugadores]
+        vivos = []
+        for jugador, acciones in zip(self.jugadores, actions):
+            if jugador.health > 0:
+                acciones = int(acciones)
+                jugador.calcular_colision(self.controlador, acciones)
+                jugador.mover(acciones, self.delta_time, self.pantalla)
+                vivos.append(jugador)
+        if len(vivos) > 1:
+            CollisionHandler.check_all_player_collisions(
+                vivos,
+                damage_threshold=GameConstants.PLAYER_DAMAGE_THRESHOLD,
+                damage_factor=GameConstants.PLAYER_DAMAGE_FACTOR
+            )
+
+        lost = [before - jugador.health for before, jugador in zip(health, self.jugadores)]
+        total = sum(lost)
+        rivals = max(1, self.num_players - 1)
+        for index, own in enumerate(lost):
+            self.rewards[index] = ((total - own) / rivals - own) / GameConstants.PLAYER_MAX_HEALTH
+        self.steps += 1
+        self._observe()
+        alive = sum(1 for jugador in self.jugadores if jugador.health > 0)
+        terminated = alive <= (1 if self.num_players > 1 else 0)
+        return terminated, not terminated and self.steps >= self.max_steps
+
+    def _observe(self):
+        width, height = self.world_size
+        for row, jugador in zip(self.observation, self.jugadores):
+            row[:] = (jugador.rect.x / width, jugador.rect.y / height,
+                      jugador.velocidad_x / jugador.velocidad_maxima,
+                      jugador.velocidad_y / jugador.velocidad_maxima,
+                      jugador.health / GameConstants.PLAYER_MAX_HEALTH,
+                      jugador.salto, jugador.cavar,
+                      jugador.estado_gravedad == GameConstants.STATE_FALLING,
+                      jugador.estado_gravedad == GameConstants.STATE_DIGGING,
+                      jugador.bloqueando, jugador.health > 0)
+
+def _vector_env_worker(conn, name, num_envs, num_players, start, count, env_kwargs, seed):
+    """Worker process loop: step a slice of the matches in place in shared memory"""
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = VectorCubeBattleEnv.make_arrays(shm.buf, num_envs, num_players)
+    envs = VectorCubeBattleEnv.make_envs(arrays, start, count, env_kwargs, seed)
+    while True:
+        try:
+            command = conn.recv()
+        except EOFError:
+            break
+        if command == 'step':
+            VectorCubeBattleEnv.step_envs(envs, arrays, start)
+        elif command == 'reset':
+            VectorCubeBattleEnv.reset_envs(envs)
+        else:
+            break
+        conn.send(True)
+    del envs, arrays  # Las vistas de NumPy deben desaparecer antes de cerrar la memoria
+    shm.close()
+
+class VectorCubeBattleEnv:
+    """num_envs independent CubeBattleEnv matches stepped by one call
+
+    Arrays gain a leading env axis: actions (num_envs, num_players),
+    observations (num_envs, num_players, features). Finished matches reset on
+    their own, so their returned observation is already the first of the next
+    episode. With workers > 0 the matches are split across spawned processes
+    that read actions from and write results to one shared-memory block, so
+    nothing is pickled per step.
+    """
+    # Campo del bloque compartido y su dtype; la forma sale de _field_shape
+    FIELDS = (('actions', 'u1'), ('observations', 'f4'), ('rewards', 'f4'),
+              ('terminated', '?'), ('truncated', '?'))
+
+    def __init__(self, num_envs, num_players=2, workers=0, seed=None, **env_kwargs):
+        if np is None:
+            raise ImportError("VectorCubeBattleEnv requires NumPy")
+        self.num_envs = num_envs
+        self.num_players = num_players
+        env_kwargs['num_players'] = num_players
+        size = VectorCubeBattleEnv.buffer_size(num_envs, num_players)
+        self.shm = None
+        self.workers = []
+        self.envs = []
+        if workers:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.arrays = VectorCubeBattleEnv.make_arrays(self.shm.buf, num_envs, num_players)
+            self._setup_workers(min(workers, num_envs), env_kwargs, seed)
+        else:
+            self.arrays = VectorCubeBattleEnv.make_arrays(bytearray(size), num_envs, num_players)
+            self.envs = VectorCubeBattleEnv.make_envs(self.arrays, 0, num_envs, env_kwargs, seed)
+
+    def _setup_workers(self, count, env_kwargs, seed):
+        """Start worker processes, each owning a contiguous slice of the matches"""
+        context = multiprocessing.get_context('spawn')
+        bounds = [self.num_envs * index // count for index in range(count + 1)]
+        for start, end in zip(bounds, bounds[1:]):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_vector_env_worker,
+                args=(child_conn, self.shm.name, self.num_envs, self.num_players, start, end - start,
+                      env_kwargs, seed),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append((process, parent_conn))
+
+    @staticmethod
+    def _field_shape(name, num_envs, num_players):
+        if name == 'observations':
+            return (num_envs, num_players, len(CubeBattleEnv.OBSERVATION_FEATURES))
+        if name in ('actions', 'rewards'):
+            return (num_envs, num_players)
+        return (num_envs,)
+
+    @staticmethod
+    def buffer_size(num_envs, num_players):
+        size = 0
+        for name, dtype in VectorCubeBattleEnv.FIELDS:
+            shape = VectorCubeBattleEnv._field_shape(name, num_envs, num_players)
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 64) * 64
+        return size
+
+    @staticmethod
+    def make_arrays(buffer, num_envs, num_players):
+        """Views of every field inside buffer, each one aligned to 64 bytes"""
+        arrays, offset = {}, 0
+        for name, dtype in VectorCubeBattleEnv.FIELDS:
+            shape = VectorCubeBattleEnv._field_shape(name, num_envs, num_players)
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(buffer, dtype, count, offset).reshape(shape)
+            offset += -(-count * np.dtype(dtype).itemsize // 64) * 64
+        return arrays
+
+    @staticmethod
+    def make_envs(arrays, start, count, env_kwargs, seed):
+        envs = []
+        for index in range(start, start + count):
+            env = CubeBattleEnv(seed=None if seed is None else seed + index, **env_kwargs)
+            env.observation = arrays['observations'][index]
+            env.rewards = arrays['rewards'][index]
+            env._reset()
+            envs.append(env)
+        return envs
+
+    @staticmethod
+    def step_envs(envs, arrays, start):
+        actions, terminated, truncated = arrays['actions'], arrays['terminated'], arrays['truncated']
+        for index, env in enumerate(envs, start):
+            done = env._step(actions[index])
+            terminated[index], truncated[index] = done
+            if done[0] or done[1]:
+                env._reset()
+
+    @staticmethod
+    def reset_envs(envs):
+        for env in envs:
+            env._reset()
+
+    def reset(self):
+        """Restart every match; returns (observations, info)"""
+        if self.workers:
+            self._run('reset')
+        else:
+            VectorCubeBattleEnv.reset_envs(self.envs)
+        return self.arrays['observations'].copy(), {}
+
+    def step(self, actions):
+        """One frame of every match; returns (observations, rewards, terminated, truncated, info)"""
+        self.arrays['actions'][:] = actions
+        if self.workers:
+            self._run('step')
+        else:
+            VectorCubeBattleEnv.step_envs(self.envs, self.arrays, 0)
+        arrays = self.arrays
+        return (arrays['observations'].copy(), arrays['rewards'].copy(),
+                arrays['terminated'].copy(), arrays['truncated'].copy(), {})
+
+    def _run(self, command):
+        """Send command to every worker, then wait for all of them"""
+        for _, conn in self.workers:
+            conn.send(command)
+        for _, conn in self.workers:
+            conn.recv()
+
+    def close(self):
+        for process, conn in self.workers:
+            conn.send(None)
+            process.join()
+            conn.close()
+        self.workers = []
+        self.envs = []
+        self.arrays = None  # Las vistas de NumPy deben desaparecer antes de cerrar la memoria
+        if self.shm:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
 
 class VictoryScreen:
+    """End-of-match overlay; winner is None for a draw"""
     def __init__(self, pantalla, winner):
         self.pantalla = pantalla
         self.winner = winner
@@ -1317,30 +5798,27 @@ class VictoryScreen:
             GameConstants.BUTTON_HEIGHT
         )
         
-        # Setup fonts
-        self.title_font = pygame.font.Font(None, GameConstants.VICTORY_TITLE_SIZE)
-        self.button_font = pygame.font.Font(None, GameConstants.BUTTON_TEXT_SIZE)
+        # Los textos no cambian: se renderizan una vez
+        title_font = pygame.font.Font(None, GameConstants.VICTORY_TITLE_SIZE)
+        button_font = pygame.font.Font(None, GameConstants.BUTTON_TEXT_SIZE)
+        title = f"Player {self.winner.player_id} Wins!" if self.winner else "Draw"
+        self.title_text = title_font.render(title, True, GameConstants.VICTORY_TEXT_COLOR)
+        self.button_text = button_font.render("Restart", True, GameConstants.BUTTON_TEXT_COLOR)
         
-    def draw(self, surface):
-        # Draw background overlay
-        overlay = pygame.Surface(
-            (self.pantalla.get_screen_data("width"), 
-             self.pantalla.get_screen_data("height")), 
-            pygame.SRCALPHA
-        )
-        overlay.fill((0, 0, 0, 180))  # Semi-transparent black
-        surface.blit(overlay, (0, 0))
+    def draw(self, pantalla):
+        """Queue the victory screen over the frame; passed as the frame's hud"""
+        render_queue = pantalla.render_queue
+        mid_x, mid_y = pantalla.get_screen_data("mid_x", "mid_y")
+        pantalla.submit_overlay(GameConstants.VICTORY_OVERLAY_COLOR, GameConstants.VICTORY_OVERLAY_ALPHA,
+                                GameConstants.LAYER_OVERLAY)
         
         # Draw victory text
-        text = self.title_font.render(f"Player {self.winner.player_id} Wins!", True, 
-                                    GameConstants.VICTORY_TEXT_COLOR)
-        text_rect = text.get_rect(centerx=self.pantalla.get_screen_data("mid_x"), 
-                                 y=100)
-        surface.blit(text, text_rect)
+        render_queue.submit(self.title_text, self.title_text.get_rect(centerx=mid_x, y=100),
+                            GameConstants.LAYER_UI)
         
         # Draw winner sprite scaled up
         resource_manager = ResourceManager()
-        winner_sprite = resource_manager.get_scaled_sprite(
+        winner_sprite = self.winner and resource_manager.get_scaled_sprite(
             'player',
             self.winner.tamaño * GameConstants.VICTORY_SPRITE_SCALE,
             self.winner.tamaño * GameConstants.VICTORY_SPRITE_SCALE,
@@ -1348,25 +5826,17 @@ class VictoryScreen:
             self.winner.sprite_config['col']
         )
         if winner_sprite:
-            sprite_rect = winner_sprite.get_rect(
-                center=(self.pantalla.get_screen_data("mid_x"),
-                       self.pantalla.get_screen_data("mid_y"))
-            )
-            surface.blit(winner_sprite, sprite_rect)
+            render_queue.submit(winner_sprite, winner_sprite.get_rect(center=(mid_x, mid_y)),
+                                GameConstants.LAYER_UI)
         
         # Draw restart button
         mouse_pos = pygame.mouse.get_pos()
         button_color = (GameConstants.BUTTON_HOVER_COLOR 
                        if self.button_rect.collidepoint(mouse_pos) 
                        else GameConstants.BUTTON_COLOR)
-        
-        pygame.draw.rect(surface, button_color, self.button_rect)
-        
-        # Draw button text
-        button_text = self.button_font.render("Restart", True, 
-                                            GameConstants.BUTTON_TEXT_COLOR)
-        text_rect = button_text.get_rect(center=self.button_rect.center)
-        surface.blit(button_text, text_rect)
+        render_queue.submit_rect(button_color, self.button_rect, GameConstants.LAYER_UI)
+        render_queue.submit(self.button_text, self.button_text.get_rect(center=self.button_rect.center),
+                            GameConstants.LAYER_UI)
     
     def handle_input(self):
         """Handle input events for the victory screen"""
@@ -1381,49 +5851,1120 @@ class VictoryScreen:
                     return "restart"
         return None
 
+def _time_frames(step, frames):
+    """Run step() for the given number of frames and return the mean cost in ms"""
+    start = time.perf_counter()
+    for frame in range(frames):
+        step(frame)
+    return (time.perf_counter() - start) * 1000.0 / frames
+
+
+def benchmark_player_collisions(player_counts=(2, 8, 16), frames=2000):
+    """Report the per-frame cost of player-vs-player collisions for several player counts"""
+    rng = random.Random(1234)
+    tamaño = 48
+    arena_width, arena_height = 1920, 1080
+
+    print(f"{'players':>8} {'pairs/frame':>12} {'sweep ms':>10} {'all-pairs ms':>13}")
+    for count in player_counts:
+        jugadores = [
+            Personaje(rng.uniform(0, arena_width), rng.uniform(0, arena_height), tamaño, player_id=i + 1)
+            for i in range(count)
+        ]
+        paths = [(rng.uniform(-12, 12), rng.uniform(-12, 12)) for _ in jugadores]
+
+        def move(frame):
+            # Trayectorias deterministas que se cruzan dentro de la arena
+            for jugador, (vx, vy) in zip(jugadores, paths):
+                jugador.velocidad_x, jugador.velocidad_y = vx, vy
+                jugador.rect.x = int(jugador.rect.x + vx) % arena_width
+                jugador.rect.y = int(jugador.rect.y + vy) % arena_height
+                jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+        pairs_tested = []
+
+        def sweep(frame):
+            move(frame)
+            pairs_tested.append(CollisionHandler.check_all_player_collisions(
+                jugadores,
+                damage_threshold=GameConstants.PLAYER_DAMAGE_THRESHOLD,
+                damage_factor=GameConstants.PLAYER_DAMAGE_FACTOR
+            ))
+
+        def all_pairs(frame):
+            move(frame)
+            for i, player1 in enumerate(jugadores):
+                for player2 in jugadores[i + 1:]:
+                    CollisionHandler.check_player_collisions(
+                        player1, player2,
+                        damage_threshold=GameConstants.PLAYER_DAMAGE_THRESHOLD,
+                        damage_factor=GameConstants.PLAYER_DAMAGE_FACTOR
+                    )
+
+        sweep_ms = _time_frames(sweep, frames)
+        all_pairs_ms = _time_frames(all_pairs, frames)
+        print(f"{count:>8} {sum(pairs_tested) / frames:>12.2f} "
+              f"{sweep_ms:>10.4f} {all_pairs_ms:>13.4f}")
+
+
+def _create_benchmark_game(num_players, width=1920, height=1080, world=(1, 1), **kwargs):
+    """Headless match rendered off-screen; a hidden 1x1 window lets images convert"""
+    pygame.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    pantalla = PantallaVirtual(width, height, "Benchmark")
+    pantalla.set_world_size(*world)
+    jugadores = crear_jugadores(pantalla, num_players)
+    game = GameStateManager(pantalla, jugadores, controlador_plataformas(),
+                            HUD(GameConstants), **kwargs)
+    game.current_state = "playing"
+    return game
+
+
+def benchmark_pipeline(num_players=8, frames=600):
+    """Compare frame time with the simulation/render pipeline off and on"""
+    teclas = VirtualKeys()
+    delta_time = 1.0 / GameConstants.FPS
+
+    print(f"{'mode':>10} {'avg ms':>8} {'worst ms':>9}  ({num_players} players, present excluded)")
+    for pipelined in (False, True):
+        game = _create_benchmark_game(num_players, pipelined=pipelined)
+        stats = FrameStats(window=frames)
+        for frame in range(frames):
+            start = time.perf_counter()
+            game._step_frame(teclas, delta_time)
+            stats.record((time.perf_counter() - start) * 1000.0)
+            for jugador in game.jugadores:
+                jugador.health = GameConstants.PLAYER_MAX_HEALTH
+        game.close()
+        mode = "pipelined" if pipelined else "serial"
+        print(f"{mode:>10} {stats.average():>8.3f} {stats.worst():>9.3f}")
+
+
+def benchmark_renderers(num_players=16, frames=300, size=(1280, 720)):
+    """Compare the Surface and SDL2 texture backends on the same scene, presenting included"""
+    pygame.init()
+    print(f"{'backend':>14} {'game ms':>8} {'menu ms':>8} {'draw calls':>11}")
+    backends = [
+        ('surface', lambda: Pantalla(*size, "Benchmark", fullscreen=False)),
+        ('sdl2-software', lambda: PantallaSDL2(*size, "Benchmark", fullscreen=False, software=True))
+    ]
+    for name, create in backends:
+        pantalla = create()
+        resource_manager = ResourceManager()
+        resource_manager.load_resources()
+        jugadores = crear_jugadores(pantalla, num_players)
+        controlador = crear_plataformas(controlador_plataformas(), pantalla)
+        fondo = Fondo()
+        hud = HUD(GameConstants)
+
+        def game_frame(frame):
+            pantalla.actualizar_juego(
+                fondo=fondo,
+                jugadores=jugadores,
+                plataforma=controlador,
+                hud=lambda p: hud.dibujar(p, jugadores)
+            )
+
+        def menu_frame(frame):
+            pantalla.actualizar_menu(jugadores[0])
+
+        game_ms = _time_frames(game_frame, frames)
+        draw_calls = pantalla.get_render_stats()['draw_calls']
+        menu_ms = _time_frames(menu_frame, frames)
+        print(f"{name:>14} {game_ms:>8.3f} {menu_ms:>8.3f} {draw_calls:>11}")
+        pantalla.detener()
+
+
+def benchmark_particles(live_particles=GameConstants.PARTICLE_CAPACITY, frames=300):
+    """Frame cost of updating and drawing a full particle pool"""
+    game = _create_benchmark_game(2, width=1280, height=720)
+    particulas = game.particulas
+    if not particulas.enabled:
+        print("NumPy is not installed, particles are disabled")
+        return
+    delta_time = 1.0 / GameConstants.FPS
+    tamaño = game.pantalla.get_screen_data("tile_size")
+    # Emisiones continuas: el anillo recicla y el pool se mantiene lleno
+    per_frame = live_particles // 30
+
+    def frame(index):
+        particulas.emit(640, 360, per_frame, tamaño * GameConstants.PARTICLE_SPEED_FACTOR,
+                        lifetime=1.0)
+        particulas.update(delta_time)
+        particulas.render_state().dibujar(game.pantalla)
+        game.pantalla._flush_render_queue()
+
+    for warmup in range(60):
+        frame(warmup)
+    frame_ms = _time_frames(frame, frames)
+    print(f"{particulas.live_count()} live particles: {frame_ms:.3f} ms/frame "
+          f"(budget {1000.0 / GameConstants.FPS:.1f} ms)")
+
+
+def benchmark_enemies(counts=(100, 500, 1000), frames=300):
+    """Frame cost of the enemy systems, against the same number of Personaje updates"""
+    if np is None:
+        print("NumPy is not installed, enemies are disabled")
+        return
+    game = _create_benchmark_game(2, width=1280, height=720)
+    delta_time = 1.0 / GameConstants.FPS
+    teclas = VirtualKeys()
+    width = game.pantalla.get_screen_data("width")
+    height = game.pantalla.get_screen_data("height")
+
+    print(f"{'enemies':>8} {'update ms':>10} {'render ms':>10} {'Personaje ms':>13}")
+    for count in counts:
+        enemigos = EnemyWorld(game.pantalla.get_screen_data("tile_size"), capacity=count * 2)
+        enemigos.spawn_random(count, game.controlador, width, height)
+
+        def update(frame):
+            enemigos.update(delta_time, game.jugadores, game.controlador, width, height)
+            # Mantener la población para medir siempre el mismo número
+            missing = count - len(enemigos)
+            if missing > 0:
+                enemigos.spawn_random(missing, game.controlador, width, height)
+            for jugador in game.jugadores:
+                jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+        def render(frame):
+            enemigos.render_state().dibujar(game.pantalla)
+            game.pantalla._flush_render_queue()
+
+        # Referencia: un objeto por entidad, como los jugadores
+        personajes = crear_jugadores(game.pantalla, min(count, GameConstants.MAX_PLAYERS))
+
+        def objects(frame):
+            for index in range(count):
+                personaje = personajes[index % len(personajes)]
+                acciones = teclas.actions(personaje.controls)
+                personaje.calcular_colision(game.controlador, acciones)
+                personaje.mover(acciones, delta_time, game.pantalla)
+
+        update_ms = _time_frames(update, frames)
+        render_ms = _time_frames(render, frames)
+        objects_ms = _time_frames(objects, frames)
+        print(f"{count:>8} {update_ms:>10.3f} {render_ms:>10.3f} {objects_ms:>13.3f}")
+
+
+def benchmark_backgrounds(frames=300):
+    """Frame cost of each background at a few resolutions"""
+    print(f"{'background':>10} {'size':>10} {'ms':>8} {'draw calls':>11}")
+    for size in ((1280, 720), (1920, 1080), (2560, 1440)):
+        game = _create_benchmark_game(2, *size)
+        for name, fondo_class in BACKGROUNDS.items():
+            fondo = fondo_class()
+
+            def frame(index):
+                fondo.dibujar(game.pantalla)
+                game.pantalla._flush_render_queue()
+
+            frame(0)
+            frame_ms = _time_frames(frame, frames)
+            draw_calls = game.pantalla.get_render_stats()['draw_calls']
+            print(f"{name:>10} {size[0]:>5}x{size[1]:<4} {frame_ms:>8.3f} {draw_calls:>11}")
+
+
+def benchmark_camera(worlds=((1, 1), (4, 4), (16, 16)), frames=300):
+    """Simulation and render cost as the world grows around a fixed-size view"""
+    delta_time = 1.0 / GameConstants.FPS
+    teclas = VirtualKeys()
+    enemies_per_screen = 20 if np is not None else 0
+    print(f"{'world':>7} {'platforms':>10} {'enemies':>8} {'update ms':>10} "
+          f"{'render ms':>10} {'commands':>9}")
+    for world in worlds:
+        screens = world[0] * world[1]
+        game = _create_benchmark_game(4, 1280, 720, world=world,
+                                      enemies=min(enemies_per_screen * screens, GameConstants.ENEMY_CAPACITY))
+
+        def update(frame):
+            game._update_game_state(teclas, delta_time)
+            for jugador in game.jugadores:
+                jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+        def render(frame):
+            view = game.camera.view_rect
+            game.pantalla.dibujar_juego(
+                camera=view,
+                fondo=game.fondo,
+                jugadores=game._get_alive_players(),
+                plataforma=game.controlador,
+                enemigos=game.enemigos.render_state(view) if game.enemigos else None,
+                particulas=game.particulas.render_state(view),
+                hud=lambda p: game.hud.dibujar(p, game.jugadores)
+            )
+
+        update_ms = _time_frames(update, frames)
+        render_ms = _time_frames(render, frames)
+        enemies = len(game.enemigos) if game.enemigos else 0
+        print(f"{world[0]:>3}x{world[1]:<3} {len(game.controlador.plataformas):>10} {enemies:>8} "
+              f"{update_ms:>10.3f} {render_ms:>10.3f} {game.pantalla.get_render_stats()['commands']:>9}")
+        game.close()
+
+
+def benchmark_streaming(chunks=(200, 200), frames=4000):
+    """Walk a 10,000+ screen level and watch resident chunks and Python memory stay flat"""
+    game = _create_benchmark_game(2, 1280, 720)
+    pantalla = game.pantalla
+    screen_tiles = pantalla.get_screen_data("tiles_x") * pantalla.get_screen_data("tiles_y")
+    size = GameConstants.LEVEL_CHUNK_TILES
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stress.ucbl")
+        start = time.perf_counter()
+        generar_nivel(path, *chunks)
+        print(f"level: {chunks[0]}x{chunks[1]} chunks, "
+              f"{chunks[0] * chunks[1] * size * size / screen_tiles:.0f} screens, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB, written in {time.perf_counter() - start:.1f} s")
+
+        level = LevelFile(path)
+        pantalla.set_world_tiles(*level.size_tiles)
+        controlador = controlador_plataformas()
+        controlador.cell_size = pantalla.get_screen_data("tile_size") * GameConstants.PLATFORM_GRID_CELL
+        camera = Camera(*pantalla.get_screen_data("width", "height", "world_width", "world_height"))
+        streamer = LevelStreamer(level, controlador, pantalla)
+        streamer.prime(camera.view_rect)
+
+        # Recorrido en serpentina: filas separadas por una pantalla, un cuarto de pantalla por frame
+        step = camera.view_width // 4
+        row_frames = (camera.world_width - camera.view_width) // step + 1
+        stats = FrameStats()
+        tracemalloc.start()
+        print(f"{'frame':>6} {'resident':>9} {'platforms':>10} {'loaded':>7} {'unloaded':>9} "
+              f"{'python MB':>10} {'avg ms':>7} {'worst ms':>9}")
+        for frame in range(frames):
+            row, column = divmod(frame, row_frames)
+            if row % 2:
+                column = row_frames - 1 - column
+            camera.x = column * step
+            camera.y = row * camera.view_height
+            camera._clamp()
+            start = time.perf_counter()
+            streamer.update(camera.view_rect)
+            stats.record((time.perf_counter() - start) * 1000.0)
+            if frame % (frames // 8) == 0 or frame == frames - 1:
+                current, _ = tracemalloc.get_traced_memory()
+                print(f"{frame:>6} {len(streamer.resident):>9} {streamer.resident_platforms():>10} "
+                      f"{streamer.chunks_loaded:>7} {streamer.chunks_unloaded:>9} "
+                      f"{current / 1e6:>10.2f} {stats.average():>7.3f} {stats.worst():>9.3f}")
+            time.sleep(0.001)  # Dar tiempo al hilo de carga, como haría el resto del frame
+        tracemalloc.stop()
+        streamer.close()
+
+
+def benchmark_terrain(carves_per_frame=(1, 10, 50), frames=300, world=(4, 4)):
+    """Cost of carving terrain every frame: collider rebuild of the touched blocks and redraw"""
+    game = _create_benchmark_game(4, 1280, 720, world=world, destructible=True)
+    terreno = game.controlador
+    view = game.camera.view_rect
+    game.pantalla.set_camera(view)
+    rng = random.Random(0)
+    # Se cava dentro de la vista para que los bloques tocados también se redibujen
+    rects = terreno.get_rects_near(view)
+    print(f"{'carves':>7} {'carve ms':>9} {'draw ms':>8}  "
+          f"({world[0]}x{world[1]} screens, mask {terreno.mask.get_size()})")
+    for count in carves_per_frame:
+        carve_stats = FrameStats(window=frames)
+        draw_stats = FrameStats(window=frames)
+        for frame in range(frames):
+            if frame % 10 == 0:
+                terreno.reset()  # Fuera del tiempo: que siempre quede terreno por cavar
+                terreno.dibujar(game.pantalla)
+                game.pantalla.render_queue.clear()
+
+            start = time.perf_counter()
+            for _ in range(count):
+                rect = rects[rng.randrange(len(rects))]
+                terreno.carve((rng.randint(rect.left, rect.right), rng.randint(rect.top, rect.bottom)))
+            terreno._refresh()
+            middle = time.perf_counter()
+            terreno.dibujar(game.pantalla)
+            game.pantalla._flush_render_queue()
+            end = time.perf_counter()
+            carve_stats.record((middle - start) * 1000.0)
+            draw_stats.record((end - middle) * 1000.0)
+        print(f"{count:>7} {carve_stats.average():>9.3f} {draw_stats.average():>8.3f}")
+
+
+def benchmark_platforms(counts=(0, 100, 300, 1000), frames=300, world=(4, 4), num_players=8):
+    """Moving platforms: incremental index updates against rebuilding the index every frame"""
+    teclas = VirtualKeys()
+    delta_time = 1.0 / GameConstants.FPS
+    print(f"{'moving':>7} {'cells/frame':>12} {'move ms':>8} {'rebuild ms':>11} {'frame ms':>9}  "
+          f"({world[0]}x{world[1]} screens, {num_players} players)")
+    for count in counts:
+        game = _create_benchmark_game(num_players, 1280, 720, world=world, moving_platforms=count)
+        controlador = game.controlador
+        vivos = game.jugadores
+        reindexed = []
+
+        def incremental(frame):
+            controlador.mover_plataformas(delta_time, vivos)
+            controlador._get_grid()
+            reindexed.append(controlador.reindexed)
+
+        def rebuild(frame):
+            # Lo que costaría sin el índice incremental: todo el hash de nuevo cada frame
+            controlador.mover_plataformas(delta_time, vivos)
+            controlador.version += 1
+            controlador._get_grid()
+
+        move_ms = _time_frames(incremental, frames)
+        rebuild_ms = _time_frames(rebuild, frames)
+
+        def step(frame):
+            game._step_frame(teclas, delta_time)
+            for jugador in game.jugadores:
+                jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+        frame_ms = _time_frames(step, frames)
+        game.close()
+        print(f"{count:>7} {sum(reindexed) / frames:>12.1f} {move_ms:>8.3f} "
+              f"{rebuild_ms:>11.3f} {frame_ms:>9.3f}")
+
+
+def benchmark_projectiles(counts=(1000, 4000, 10000), frames=300, world=(4, 4), num_players=8):
+    """Cost of keeping counts shots alive: one batch update (platforms and players) and the blit batch"""
+    delta_time = 1.0 / GameConstants.FPS
+    print(f"{'shots':>7} {'retired/frame':>14} {'update ms':>10} {'refill ms':>10} {'render ms':>10}  "
+          f"({world[0]}x{world[1]} screens, {num_players} players)")
+    for count in counts:
+        game = _create_benchmark_game(num_players, 1280, 720, world=world)
+        width, height = game.pantalla.get_screen_data("world_width", "world_height")
+        proyectiles = ProjectileSystem(game.pantalla.get_screen_data("tile_size"), capacity=count)
+        rng = random.Random(0)
+        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        update_stats = FrameStats(window=frames)
+        refill_stats = FrameStats(window=frames)
+        render_stats = FrameStats(window=frames)
+        retired = 0
+        for frame in range(frames):
+            start = time.perf_counter()
+            # Reponer lo que se retiró, desde puntos al azar del mundo
+            missing = count - len(proyectiles)
+            retired += missing
+            for _ in range(missing):
+                proyectiles.fire(0, rng.uniform(0, width), rng.uniform(0, height),
+                                 *rng.choice(directions), rng.random())
+            middle = time.perf_counter()
+            proyectiles.update(delta_time, game.jugadores, game.controlador, width, height)
+            updated = time.perf_counter()
+            proyectiles.render_state(game.camera.view_rect).dibujar(game.pantalla)
+            game.pantalla.render_queue.clear()
+            end = time.perf_counter()
+            refill_stats.record((middle - start) * 1000.0)
+            update_stats.record((updated - middle) * 1000.0)
+            render_stats.record((end - updated) * 1000.0)
+            for jugador in game.jugadores:
+                jugador.health = GameConstants.PLAYER_MAX_HEALTH
+        game.close()
+        hits = (retired - count) / frames
+        print(f"{count:>7} {hits:>14.1f} {update_stats.average():>10.3f} "
+              f"{refill_stats.average():>10.3f} {render_stats.average():>10.3f}")
+
+
+def benchmark_telemetry(events=200000, frames=600, num_players=16):
+    """Game-thread cost of recording events, and a full match frame with telemetry off and on"""
+    telemetry = Telemetry()
+    tamaño = 32
+
+    def record_all(count):
+        start = time.perf_counter()
+        for index in range(count):
+            telemetry.record(Telemetry.DAMAGE, 1, 2, 10.0, index % 1280, tamaño)
+        return (time.perf_counter() - start) * 1e9 / count
+
+    with tempfile.TemporaryDirectory() as directory:
+        off_ns = record_all(events)
+        telemetry.start(directory)
+        on_ns = record_all(events)
+        telemetry.stop()
+        stats = telemetry.get_stats()
+        print(f"record(): {off_ns:.0f} ns disabled, {on_ns:.0f} ns enabled; "
+              f"{stats['written']} written, {stats['dropped']} dropped (queue {telemetry.capacity})")
+        sizes = sum(os.path.getsize(path) for path in telemetry.files)
+        print(f"{len(telemetry.files)} file(s), {sizes / stats['written']:.2f} bytes/event compressed")
+
+        teclas = VirtualKeys()
+        delta_time = 1.0 / GameConstants.FPS
+        for enabled in (False, True):
+            game = _create_benchmark_game(num_players, 1280, 720)
+            if enabled:
+                telemetry.start(directory)
+            before = telemetry.recorded
+
+            def frame(index):
+                game._update_game_state(teclas, delta_time)
+                for jugador in game.jugadores:
+                    jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+            frame_ms = _time_frames(frame, frames)
+            telemetry.stop()
+            print(f"{num_players}-player update, telemetry {'on ' if enabled else 'off'}: "
+                  f"{frame_ms:.3f} ms/frame, {(telemetry.recorded - before) / frames:.1f} events/frame")
+            game.close()
+
+
+def benchmark_hot_reload(repeats=20):
+    """A full resource load against reloading each changed asset alone, and the cost of one poll"""
+    game = _create_benchmark_game(4, 1280, 720, enemies=50 if np is not None else 0)
+    resource_manager = game.resource_manager
+    game.particulas.emit_impact(100, 100, 10, 32)  # Cachés derivadas calientes, como en una partida
+    game._render_game()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        resource_manager.load_resources()
+    full_ms = (time.perf_counter() - start) * 1000.0 / repeats
+    print(f"load_resources(): {full_ms:.2f} ms, {len(resource_manager.asset_index)} assets")
+
+    watcher = AssetWatcher(resource_manager, interval=3600)  # El hilo no interfiere con la medida
+    start = time.perf_counter()
+    for _ in range(repeats):
+        watcher.poll()
+    poll_us = (time.perf_counter() - start) * 1e6 / repeats
+    print(f"poll(): {poll_us:.0f} us on the watcher thread")
+
+    print(f"{'asset':>12} {'kind':>12} {'reload ms':>10} {'next frame ms':>14}")
+    for path, (kind, key) in sorted(resource_manager.asset_index.items(), key=lambda item: item[1]):
+        start = time.perf_counter()
+        resource_manager.reload_asset(path)
+        middle = time.perf_counter()
+        game._render_game()  # Reconstruye solo lo derivado del recurso recargado
+        end = time.perf_counter()
+        print(f"{key:>12} {kind:>12} {(middle - start) * 1000.0:>10.2f} {(end - middle) * 1000.0:>14.2f}")
+    watcher.close()
+    game.close()
+
+
+def benchmark_sound_bank(plays=2000, budgets=(256 * 1024, 1024 * 1024, 4 * 1024 * 1024)):
+    """Decoded PCM and pick cost of the jump variation bank, against decoding every variation up front"""
+    pygame.init()
+    pygame.mixer.init()
+    resource_manager = ResourceManager()
+    resource_manager.load_resources()
+    bank = resource_manager.sound_banks['jump']
+    frequency, sample_format, channels = pygame.mixer.get_init()
+
+    start = time.perf_counter()
+    eager = [pygame.mixer.Sound(path) for path in bank.paths]
+    eager_ms = (time.perf_counter() - start) * 1000.0
+    eager_bytes = sum(int(sound.get_length() * frequency) * channels * (abs(sample_format) // 8)
+                      for sound in eager)
+    print(f"eager: {len(eager)} variations, {eager_bytes / 1024:.0f} KiB decoded in {eager_ms:.1f} ms")
+    del eager
+
+    print(f"{'budget KiB':>10} {'resident KiB':>13} {'hit rate':>9} {'evictions':>10} "
+          f"{'avg us':>8} {'worst ms':>9}")
+    for budget in budgets:
+        resource_manager.audio_config.variation_budget = budget
+        resource_manager.decoded_variations.clear()
+        resource_manager.decoded_bytes = 0
+        resource_manager.variation_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        times = []
+        for _ in range(plays):
+            start = time.perf_counter()
+            resource_manager._pick_variation('jump')
+            times.append(time.perf_counter() - start)
+        stats = resource_manager.get_variation_stats()
+        print(f"{budget // 1024:>10} {stats['decoded_bytes'] / 1024:>13.0f} "
+              f"{stats['hits'] / plays:>9.1%} {stats['evictions']:>10} "
+              f"{sum(times) * 1e6 / plays:>8.1f} {max(times) * 1000.0:>9.2f}")
+    pygame.quit()
+
+
+def benchmark_audio_cache(repeats=5):
+    """Load time of every sound and the music with the PCM cache cold and warm"""
+    pygame.init()
+    pygame.mixer.init()
+    audio_config = AudioConfig()
+    paths = [config['path'] for config in audio_config.sound_configs.values()]
+    paths.append(audio_config.music_config['path'])
+    print(f"mixer format {pygame.mixer.get_init()}")
+    print(f"{'file':>32} {'decode ms':>10} {'cold ms':>8} {'warm ms':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = AudioCache(directory)
+        for path in paths:
+            start = time.perf_counter()
+            pygame.mixer.Sound(path)
+            decode_ms = (time.perf_counter() - start) * 1000.0
+            start = time.perf_counter()
+            cache.load(path)  # Fallo: decodifica y escribe la entrada
+            cold_ms = (time.perf_counter() - start) * 1000.0
+            start = time.perf_counter()
+            for _ in range(repeats):
+                cache.load(path)
+            warm_ms = (time.perf_counter() - start) * 1000.0 / repeats
+            print(f"{os.path.basename(path)[-32:]:>32} {decode_ms:>10.1f} {cold_ms:>8.1f} {warm_ms:>8.1f}")
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"{cache.stats['hits']} hits, {cache.stats['misses']} misses, {size / 2 ** 20:.1f} MiB on disk")
+    pygame.quit()
+
+
+def benchmark_input(frames=20000, num_players=16):
+    """Per-frame cost of reading input and compiling every player's action bits"""
+    pygame.init()
+    input_state = InputState()
+    controls = [PlayerControls.get_default_controls(player) for player in range(1, num_players + 1)]
+    start = time.perf_counter()
+    for _ in range(frames):
+        entrada = input_state.poll()
+    poll_us = (time.perf_counter() - start) * 1e6 / frames
+    start = time.perf_counter()
+    for _ in range(frames):
+        for control in controls:
+            entrada.actions(control)
+    actions_us = (time.perf_counter() - start) * 1e6 / frames
+    print(f"poll(): {poll_us:.2f} us with {len(input_state.gamepads)} gamepad(s); "
+          f"actions() for {num_players} players: {actions_us:.2f} us/frame")
+    pygame.quit()
+
+
+def benchmark_input_latency(seconds=5.0, tap_ms=4, num_players=4):
+    """Press-to-present latency and taps lost, with and without late latching
+
+    A thread taps player 1's jump key the way a fast player would, posting
+    KEYDOWN/KEYUP and flipping the key state get_pressed() reports. 'sample ms'
+    is measured from the tapper's own clock to the poll that first sees the
+    tap, as a check on the game's drain-time stamps.
+    """
+    held = set()
+
+    class Keyboard:
+        def __getitem__(self, key):
+            return key in held
+
+    jump = PlayerControls.get_default_controls(1).get_key('up')
+    get_pressed = pygame.key.get_pressed
+    pygame.key.get_pressed = Keyboard
+    print(f"{'mode':>18} {'taps':>5} {'seen':>5} {'avg ms':>7} {'worst ms':>9} {'sample ms':>10}")
+    try:
+        for pipelined in (False, True):
+            for late_latch in (False, True):
+                game = _create_benchmark_game(num_players, 1280, 720, pipelined=pipelined,
+                                              late_latch=late_latch)
+                controls = game.jugadores[0].controls
+                seen = 0
+                stop = threading.Event()
+                taps = 0
+                tapped = []   # Instante de cada toque, con el reloj del que pulsa
+                sampled = []  # Del toque a la primera muestra que lo ve
+                counted = [0]  # Toques ya contados en sampled
+
+                def tapper():
+                    nonlocal taps
+                    rng = random.Random(1)
+                    while not stop.wait(rng.uniform(0.05, 0.15)):
+                        tapped.append(time.perf_counter())
+                        held.add(jump)
+                        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=jump))
+                        time.sleep(tap_ms / 1000.0)
+                        held.discard(jump)
+                        pygame.event.post(pygame.event.Event(pygame.KEYUP, key=jump))
+                        taps += 1
+
+                poll = game.input_state.poll
+
+                def counting_poll(pressed=()):
+                    nonlocal seen
+                    entrada = poll(pressed)
+                    if entrada.actions(controls) & InputState.UP:
+                        seen += 1
+                        # Cuenta el último toque, una vez; los que se pierden no entran
+                        if tapped and counted[0] < len(tapped):
+                            counted[0] = len(tapped)
+                            sampled.append(time.perf_counter() - tapped[-1])
+                    return entrada
+
+                game.input_state.poll = counting_poll
+                thread = threading.Thread(target=tapper)
+                thread.start()
+                end = time.perf_counter() + seconds
+                while time.perf_counter() < end:
+                    game._handle_current_state()
+                stop.set()
+                thread.join()
+                stats = game.get_input_stats()
+                mode = ('pipelined' if pipelined else 'serial') + (' late-latch' if late_latch else '')
+                sample_ms = 1000.0 * sum(sampled) / max(1, len(sampled))
+                print(f"{mode:>18} {taps:>5} {seen:>5} {stats['average']:>7.1f} {stats['worst']:>9.1f} "
+                      f"{sample_ms:>10.1f}")
+                game.close()
+    finally:
+        pygame.key.get_pressed = get_pressed
+
+
+def benchmark_quality_levels(frames=300, num_players=16):
+    """Frame cost at every QualityGovernor level, on a busy 1080p match"""
+    teclas = VirtualKeys()
+    delta_time = 1.0 / GameConstants.FPS
+    game = _create_benchmark_game(num_players, 1920, 1080, fondo=FondoParallax(),
+                                  enemies=200 if np is not None else 0, adaptive_quality=True)
+    game.governor.set_level(0)
+
+    def frame(index):
+        if index % 10 == 0:
+            for jugador in game.jugadores:
+                game.particulas.emit_impact(jugador.rect.centerx, jugador.rect.centery, 10, jugador.tamaño)
+        game._update_game_state(teclas, delta_time)
+        game._render_game()
+        for jugador in game.jugadores:
+            jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+    print(f"{'level':>12} {'ms':>8} {'pixels':>10}")
+    for level, name in enumerate(QualityGovernor.LEVELS):
+        game.governor.set_level(level)
+        frame_ms = _time_frames(frame, frames)
+        pixels = game.pantalla.get_render_stats()['blitted_pixels']
+        print(f"{name:>12} {frame_ms:>8.3f} {pixels:>10}")
+    game.governor.set_level(0)
+    game.close()
+
+
+def benchmark_profiler(frames=120, num_players=16):
+    """Frame cost before, during and after a capture in each profiler mode"""
+    teclas = VirtualKeys()
+    delta_time = 1.0 / GameConstants.FPS
+    # Sin enemigos: los que van apareciendo encarecen cada frame y falsearían la comparación
+    game = _create_benchmark_game(num_players, 1280, 720)
+
+    def frame(index):
+        # Mismo orden que GameStateManager.run: el perfilador se arma al empezar el frame
+        if game.profiler.pending:
+            game.profiler.tick(game)
+        game._update_game_state(teclas, delta_time)
+        game._render_game()
+        for jugador in game.jugadores:
+            jugador.health = GameConstants.PLAYER_MAX_HEALTH
+
+    _time_frames(frame, frames * 2)  # Los jugadores tardan en caer y juntarse
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'mode':>10} {'off ms':>8} {'capture ms':>11} {'after ms':>9} {'stacks':>7}")
+        for mode in FrameProfiler.MODES:
+            game.profiler = FrameProfiler(mode, directory)
+            off_ms = _time_frames(frame, frames)
+            game.profiler.request(frames)
+            frame(-1)  # Arranca la captura
+            capture_ms = _time_frames(frame, frames - 1)
+            frame(-1)  # La detiene y escribe los archivos
+            after_ms = _time_frames(frame, frames)
+            collapsed = game.profiler.files[-1]
+            with open(collapsed) as archivo:
+                stacks = sum(1 for _ in archivo)
+            stats = pstats.Stats(game.profiler.files[-2])
+            print(f"{mode:>10} {off_ms:>8.3f} {capture_ms:>11.3f} {after_ms:>9.3f} {stacks:>7}")
+            print(f"{'':>10} {os.path.basename(collapsed)}: {stats.total_tt * 1000 / frames:.3f} ms/frame "
+                  f"across {len(stats.stats)} functions")
+    game.close()
+
+
+def _frame_feed_reader(name, stop_event, results):
+    """Spectator process for benchmark_frame_feed: copy every new frame out, count torn reads"""
+    reader = FrameFeedReader(name)
+    buffer = bytearray(reader.pitch * reader.size[1])
+    last, received, torn = 0, 0, 0
+    while not stop_event.is_set():
+        if reader.latest_number() == last:
+            time.sleep(0.0005)
+            continue
+        number = reader.copy_latest(buffer)
+        if number is None:
+            torn += 1
+        elif number != last:
+            last = number
+            received += 1
+    reader.close()
+    results.put((received, torn))
+
+
+def benchmark_frame_feed(frames=300, num_players=8, rates=(0, 30, 60)):
+    """Frame cost with the shared-memory frame feed off and at several export rates, with a live reader"""
+    teclas = VirtualKeys()
+    delta_time = 1.0 / GameConstants.FPS
+    game = _create_benchmark_game(num_players, 1920, 1080)
+    context = multiprocessing.get_context('spawn')
+    name = f"{GameConstants.FRAME_FEED_NAME}-bench-{os.getpid()}"
+
+    def frame(index):
+        game._update_game_state(teclas, delta_time)
+        game._render_game()
+        for jugador in game.jugadores:
+            jugador.health = GameConstants.PLAYER_MAX_HEALTH
+        time.sleep(1.0 / GameConstants.FPS)  # Ritmo de juego real, para que el límite de fps cuente
+
+    sleep_ms = 1000.0 / GameConstants.FPS
+    print(f"{'feed fps':>9} {'frame ms':>9} {'copy ms':>8} {'published':>10} {'read':>6} {'torn':>5}")
+    print(f"{'off':>9} {_time_frames(frame, frames) - sleep_ms:>9.3f}")
+    for fps in rates:
+        feed = FrameFeed(game.pantalla.get_screen_data("display"), name, fps)
+        stop_event, results = context.Event(), context.Queue()
+        reader = context.Process(target=_frame_feed_reader, args=(name, stop_event, results))
+        reader.start()
+        game.pantalla.add_frame_sink(feed)
+        try:
+            frame_ms = _time_frames(frame, frames) - sleep_ms
+        finally:
+            game.pantalla.remove_frame_sink(feed)
+            stop_event.set()
+            received, torn = results.get()
+            reader.join()
+            feed.close()
+        stats = feed.get_stats()
+        print(f"{fps or 'every':>9} {frame_ms:>9.3f} {stats['copy_ms']:>8.3f} "
+              f"{stats['published']:>10} {received:>6} {torn:>5}")
+    game.close()
+
+
+def benchmark_recorder(frames=300, num_players=8, configs=(('png', 30), ('png', 0), ('raw', 0))):
+    """Frame cost and backpressure of match recording, at real-time pace on a 1080p match"""
+    teclas = VirtualKeys()
+    delta_time = 1.0 / GameConstants.FPS
+    game = _create_benchmark_game(num_players, 1920, 1080)
+
+    def frame(index):
+        game._update_game_state(teclas, delta_time)
+        game._render_game()
+        for jugador in game.jugadores:
+            jugador.health = GameConstants.PLAYER_MAX_HEALTH
+        time.sleep(1.0 / GameConstants.FPS)
+
+    sleep_ms = 1000.0 / GameConstants.FPS
+    print(f"{'format':>7} {'fps':>6} {'frame ms':>9} {'captured':>9} {'dropped':>8} "
+          f"{'encode ms':>10} {'encode fps':>11} {'MB':>7}")
+    print(f"{'off':>7} {'':>6} {_time_frames(frame, frames) - sleep_ms:>9.3f}")
+    for file_format, fps in configs:
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = MatchRecorder(directory, file_format, fps)
+            game.pantalla.add_frame_sink(recorder)
+            try:
+                frame_ms = _time_frames(frame, frames) - sleep_ms
+            finally:
+                game.pantalla.remove_frame_sink(recorder)
+                recorder.close()
+            stats = recorder.get_stats()
+            size = sum(entry.stat().st_size for entry in os.scandir(directory)) / 1e6
+        print(f"{file_format:>7} {fps or 'every':>6} {frame_ms:>9.3f} {stats['captured']:>9} "
+              f"{stats['dropped']:>8} {stats['encode_ms']:>10.2f} {stats['encode_fps']:>11.1f} {size:>7.1f}")
+    game.close()
+
+
+def benchmark_env(steps=20000, num_envs=64, num_players=2):
+    """Environment steps per second: one match, a vector in-process and a vector across workers"""
+    if np is None:
+        print("The environment needs NumPy")
+        return
+    rng = np.random.default_rng(1234)
+    env = CubeBattleEnv(num_players, seed=0)
+    env.reset()
+    actions = rng.integers(0, CubeBattleEnv.ACTION_COUNT, (steps, num_players))
+    start = time.perf_counter()
+    episodes = 0
+    for index in range(steps):
+        _, _, terminated, truncated, _ = env.step(actions[index])
+        if terminated or truncated:
+            episodes += 1
+            env.reset()
+    elapsed = time.perf_counter() - start
+    print(f"{'single':>22} {steps / elapsed:>10.0f} steps/s ({episodes} episodes)")
+
+    batches = max(1, steps // num_envs)
+    actions = rng.integers(0, CubeBattleEnv.ACTION_COUNT, (batches, num_envs, num_players))
+    for workers in (0, os.cpu_count() or 1):
+        vector = VectorCubeBattleEnv(num_envs, num_players, workers=workers, seed=0)
+        vector.reset()
+        start = time.perf_counter()
+        for index in range(batches):
+            vector.step(actions[index])
+        elapsed = time.perf_counter() - start
+        vector.close()
+        label = f"{num_envs} envs, " + (f"{workers} processes" if workers else "in-process")
+        print(f"{label:>22} {batches * num_envs / elapsed:>10.0f} steps/s")
+
+
+BENCHMARKS = {
+    'players': benchmark_player_collisions,
+    'pipeline': benchmark_pipeline,
+    'renderer': benchmark_renderers,
+    'particles': benchmark_particles,
+    'enemies': benchmark_enemies,
+    'background': benchmark_backgrounds,
+    'camera': benchmark_camera,
+    'streaming': benchmark_streaming,
+    'terrain': benchmark_terrain,
+    'telemetry': benchmark_telemetry,
+    'hotreload': benchmark_hot_reload,
+    'sfx': benchmark_sound_bank,
+    'audiocache': benchmark_audio_cache,
+    'input': benchmark_input,
+    'latency': benchmark_input_latency,
+    'quality': benchmark_quality_levels,
+    'profiler': benchmark_profiler,
+    'framefeed': benchmark_frame_feed,
+    'recorder': benchmark_recorder,
+    'env': benchmark_env,
+    'platforms': benchmark_platforms,
+    'projectiles': benchmark_projectiles
+}
+
+BACKGROUNDS = {
+    'checker': Fondo,
+    'stars': FondoParallax
+}
+
+RENDERERS = {
+    'surface': Pantalla,
+    'sdl2': PantallaSDL2,
+    'sdl2-software': lambda width, height, title: PantallaSDL2(width, height, title, software=True)
+}
+
+
+def _grid_size(maximum):
+    """argparse type for 'WxH' sizes with 1-maximum cells per axis"""
+    def parse(text):
+        try:
+            size = tuple(int(value) for value in text.lower().split('x'))
+        except ValueError:
+            size = ()
+        if len(size) != 2 or not all(1 <= value <= maximum for value in size):
+            raise argparse.ArgumentTypeError(f"expected WxH with 1-{maximum} per axis, got {text!r}")
+        return size
+    return parse
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Ultimate Cube Battle")
+    parser.add_argument(
+        '--players', type=int, default=GameConstants.MIN_PLAYERS,
+        help=f"number of players ({GameConstants.MIN_PLAYERS}-{GameConstants.MAX_PLAYERS})"
+    )
+    parser.add_argument(
+        '--bots', type=int, default=0,
+        help="number of CPU players, taking the highest player numbers"
+    )
+    parser.add_argument(
+        '--bot-workers', type=int, default=1,
+        help="worker processes shared by the bots"
+    )
+    parser.add_argument(
+        '--renderer', choices=sorted(RENDERERS), default='surface',
+        help="drawing backend: software Surface blits or SDL2 textures"
+    )
+    parser.add_argument(
+        '--background', choices=sorted(BACKGROUNDS), default='checker',
+        help="checkerboard or parallax starfield background"
+    )
+    parser.add_argument(
+        '--world', type=_grid_size(GameConstants.MAX_WORLD_SCREENS), default=(1, 1), metavar='WxH',
+        help="world size in screens, e.g. 4x2; the camera follows the players"
+    )
+    parser.add_argument(
+        '--level', metavar='PATH',
+        help="play a chunked level file, streamed around the camera"
+    )
+    parser.add_argument(
+        '--make-level', type=_grid_size(GameConstants.MAX_LEVEL_CHUNKS), metavar='WxH',
+        help="generate a W by H chunk level into --level first"
+    )
+    parser.add_argument(
+        '--destructible', action='store_true',
+        help="turn the platforms into terrain that digging carves away"
+    )
+    parser.add_argument(
+        '--moving-platforms', type=int, default=0, metavar='N',
+        help="add N platforms that move along looping paths, some appearing and disappearing"
+    )
+    parser.add_argument(
+        '--telemetry', metavar='DIR',
+        help="record match events into compressed files in DIR"
+    )
+    parser.add_argument(
+        '--telemetry-format', choices=sorted(Telemetry.FORMATS), default='binary',
+        help="fixed-size binary records or JSON lines (both gzip-compressed)"
+    )
+    parser.add_argument(
+        '--dev', action='store_true',
+        help="reload images and sounds as soon as their files change on disk"
+    )
+    parser.add_argument(
+        '--profile', type=int, default=0, metavar='N',
+        help=f"profile the first N frames (F9 profiles the next {GameConstants.PROFILE_FRAMES})"
+    )
+    parser.add_argument(
+        '--profile-mode', choices=FrameProfiler.MODES, default='cprofile',
+        help="trace every call with cProfile or sample all threads' stacks"
+    )
+    parser.add_argument(
+        '--profile-dir', default=GameConstants.PROFILE_DIR, metavar='DIR',
+        help="where the .pstats and .collapsed files of each capture go"
+    )
+    parser.add_argument(
+        '--frame-feed', nargs='?', const=GameConstants.FRAME_FEED_NAME, metavar='NAME',
+        help=f"export presented frames to shared memory NAME (default {GameConstants.FRAME_FEED_NAME})"
+    )
+    parser.add_argument(
+        '--frame-feed-fps', type=float, default=GameConstants.FRAME_FEED_FPS, metavar='FPS',
+        help="most frames per second copied to the frame feed (0: every frame)"
+    )
+    parser.add_argument(
+        '--record', metavar='DIR',
+        help="record presented frames into DIR, encoded off the game thread"
+    )
+    parser.add_argument(
+        '--record-format', choices=MatchRecorder.FORMATS, default='png',
+        help="numbered PNG images or one raw video stream"
+    )
+    parser.add_argument(
+        '--record-fps', type=float, default=GameConstants.RECORD_FPS, metavar='FPS',
+        help="most frames per second recorded (0: every frame)"
+    )
+    parser.add_argument(
+        '--record-encoder', metavar='CMD',
+        help="pipe raw frames to CMD, formatted with {width} {height} {fps} {pix_fmt}"
+    )
+    parser.add_argument(
+        '--pipelined', action='store_true',
+        help="simulate the next frame on a worker thread while rendering the current one"
+    )
+    parser.add_argument(
+        '--adaptive-quality', action='store_true',
+        help="trade hitboxes, background detail, particles, overlays and resolution for frame rate"
+    )
+    parser.add_argument(
+        '--late-latch', action='store_true',
+        help="sample input right before simulating and keep presses released within the frame"
+    )
+    parser.add_argument(
+        '--enemies', type=int, default=0,
+        help="number of enemies roaming the level (requires NumPy)"
+    )
+    parser.add_argument(
+        '--bench', choices=sorted(BENCHMARKS),
+        help="run a benchmark instead of the game"
+    )
+    args = parser.parse_args(argv)
+    if not GameConstants.MIN_PLAYERS <= args.players <= GameConstants.MAX_PLAYERS:
+        parser.error(f"--players must be between {GameConstants.MIN_PLAYERS} "
+                     f"and {GameConstants.MAX_PLAYERS}")
+    if not 0 <= args.bots <= args.players:
+        parser.error("--bots must be between 0 and --players")
+    if args.enemies < 0 or args.enemies > GameConstants.ENEMY_CAPACITY:
+        parser.error(f"--enemies must be between 0 and {GameConstants.ENEMY_CAPACITY}")
+    if args.enemies and np is None:
+        parser.error("--enemies requires NumPy")
+    if args.frame_feed and args.renderer != 'surface':
+        parser.error("--frame-feed reads the display surface, which only the surface renderer presents")
+    if (args.record or args.record_encoder) and args.renderer != 'surface':
+        parser.error("--record reads the display surface, which only the surface renderer presents")
+    if args.record_encoder and not args.record:
+        parser.error("--record-encoder needs --record for the encoder's working directory")
+    if args.record_encoder and args.record_format != 'raw':
+        parser.error("--record-encoder takes raw frames (--record-format raw)")
+    if args.record_fps < 0:
+        parser.error("--record-fps must not be negative")
+    if args.frame_feed_fps < 0:
+        parser.error("--frame-feed-fps must not be negative")
+    if args.profile < 0:
+        parser.error("--profile must not be negative")
+    if args.make_level and not args.level:
+        parser.error("--make-level needs --level to know where to write")
+    if args.destructible and args.level:
+        parser.error("--destructible does not work with streamed levels yet")
+    if args.moving_platforms < 0:
+        parser.error("--moving-platforms must not be negative")
+    if args.moving_platforms and (args.level or args.destructible):
+        parser.error("--moving-platforms only works with the built-in platforms")
+    if args.level and not args.make_level and not os.path.isfile(args.level):
+        parser.error(f"level file {args.level} does not exist (create it with --make-level)")
+    return args
+
 # Modificar la función main para usar GameStateManager
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    if args.bench:
+        BENCHMARKS[args.bench]()
+        return
+
     pygame.init()
     pygame.mixer.init()  # Inicializar el sistema de sonido
     
-    pantalla_principal = Pantalla(800, 600, "Ultimate Cube Battle")
-    tamaño_baldosa = pantalla_principal.get_screen_data("tile_size")
+    pantalla_principal = RENDERERS[args.renderer](800, 600, "Ultimate Cube Battle")
+    pantalla_principal.set_world_size(*args.world)
+    if args.make_level:
+        generar_nivel(args.level, *args.make_level)
+    level = LevelFile(args.level) if args.level else None
     controlador = controlador_plataformas()
     
-    # Calculate spawn positions
-    screen_width = pantalla_principal.get_screen_data("width")
-    screen_height = pantalla_principal.get_screen_data("height")
-    spawn_positions = GameConstants.calculate_spawn_positions(screen_width, screen_height)
-    
     # Create players with calculated spawn positions
-    jugadores = [
-        Personaje(
-            spawn_positions[1][0],
-            spawn_positions[1][1],
-            tamaño_baldosa,
-            player_id=1
-        ),
-        Personaje(
-            spawn_positions[2][0],
-            spawn_positions[2][1],
-            tamaño_baldosa,
-            player_id=2
-        )
-    ]
+    jugadores = crear_jugadores(pantalla_principal, args.players)
     
     hud = HUD(GameConstants)
+    planner = None
+    game_manager = None
+    frame_feed = None
+    if args.frame_feed:
+        try:
+            frame_feed = FrameFeed(pantalla_principal.get_screen_data("display"),
+                                   args.frame_feed, args.frame_feed_fps)
+            pantalla_principal.add_frame_sink(frame_feed)
+        except FileExistsError:
+            print(f"Warning: shared memory {args.frame_feed} already exists; frames will not be exported")
+    recorder = None
+    if args.record:
+        recorder = MatchRecorder(args.record, args.record_format, args.record_fps, args.record_encoder)
+        pantalla_principal.add_frame_sink(recorder)
+    if args.telemetry:
+        Telemetry().start(args.telemetry, args.telemetry_format)
+    profiler = FrameProfiler(args.profile_mode, args.profile_dir)
+    if args.profile:
+        profiler.request(args.profile)
 
     try:
         game_manager = GameStateManager(
             pantalla_principal,
             jugadores,
             controlador,
-            hud
+            hud,
+            pipelined=args.pipelined,
+            late_latch=args.late_latch,
+            adaptive_quality=args.adaptive_quality,
+            enemies=args.enemies,
+            fondo=BACKGROUNDS[args.background](),
+            level=level,
+            destructible=args.destructible,
+            moving_platforms=args.moving_platforms,
+            dev=args.dev,
+            profiler=profiler
         )
+        if args.bots:
+            # Los bots ocupan los últimos jugadores
+            planner = BotPlanner(pantalla_principal, game_manager.controlador, args.bot_workers)
+            game_manager.bots = {
+                jugador.player_id: BotController(jugador, planner)
+                for jugador in jugadores[-args.bots:]
+            }
+        game_manager.resource_manager.play_music()
         game_manager.run()
     except KeyboardInterrupt:
         print("Interrupción del teclado detectada. Saliendo del juego...")
     finally:
+        if game_manager:
+            stats = game_manager.get_input_stats()
+            if stats['presses']:
+                print(f"Input latency (last {min(stats['presses'], GameConstants.FRAME_STATS_WINDOW)} "
+                      f"presses): {stats['average']:.1f} ms average, {stats['worst']:.1f} ms worst")
+            game_manager.close()
+        if planner:
+            planner.close()
+        if frame_feed:
+            pantalla_principal.remove_frame_sink(frame_feed)
+            frame_feed.close()
+        if recorder:
+            pantalla_principal.remove_frame_sink(recorder)
+            recorder.close()
+            stats = recorder.get_stats()
+            print(f"Recorded {stats['encoded']} frames, {stats['dropped']} dropped, "
+                  f"{stats['encode_ms']:.1f} ms per frame ({stats['encode_fps']:.0f} fps sustainable)")
+        Telemetry().stop()
         pantalla_principal.detener()
         pygame.quit()
 
@@ -0,0 +1,28 @@
+import os
+import sys
+
+# Sin ventana ni audio: las pruebas corren sin pantalla
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+import pytest
+
+import Main
+
+
+@pytest.fixture
+def make_game():
+    """Headless GameStateManager factory; every game made is closed afterwards"""
+    games = []
+
+    def make(num_players=2, width=320, height=240, **kwargs):
+        game = Main._create_benchmark_game(num_players, width, height, **kwargs)
+        games.append(game)
+        return game
+
+    yield make
+    for game in games:
+        game.close()
+    pygame.quit()
@@ -0,0 +1,34 @@
+import random
+from types import SimpleNamespace
+
+import pygame
+import pytest
+
+import Main
+
+
+def _brute_force_pairs(players):
+    return [(players[i], players[j])
+            for i in range(len(players)) for j in range(i + 1, len(players))
+            if players[i].rect.colliderect(players[j].rect)]
+
+
+def _pair_ids(pairs):
+    return sorted((id(a), id(b)) for a, b in pairs)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_find_player_pairs_matches_all_pairs(seed):
+    rng = random.Random(seed)
+    players = [SimpleNamespace(rect=pygame.Rect(rng.randrange(0, 200), rng.randrange(0, 200),
+                                                rng.randrange(1, 40), rng.randrange(1, 40)))
+               for _ in range(40)]
+    # Bordes que sólo se tocan y bordes izquierdos repetidos
+    players += [SimpleNamespace(rect=pygame.Rect(300, 0, 10, 10)),
+                SimpleNamespace(rect=pygame.Rect(310, 0, 10, 10)),
+                SimpleNamespace(rect=pygame.Rect(300, 5, 10, 10))]
+    pairs = Main.CollisionHandler.find_player_pairs(players)
+    assert _pair_ids(pairs) == _pair_ids(_brute_force_pairs(players))
+    # Cada pareja sale en el orden de la lista
+    index = {id(player): i for i, player in enumerate(players)}
+    assert all(index[id(a)] < index[id(b)] for a, b in pairs)
@@ -0,0 +1,57 @@
+import Main
+
+
+HOOKS = ('_platform_collision', '_player_collisions')
+
+
+def test_debug_draw_install_and_remove_pair(make_game):
+    game, other = make_game(), make_game()
+    debug = game.debug_draw
+    handler = dict(vars(Main.CollisionHandler))
+
+    debug.toggle()
+    assert debug.installed and '_draw_all_objects' in vars(game.pantalla)
+    assert debug.contacts == [] and debug.pairs == []
+    assert all(hook in vars(game) for hook in HOOKS)
+    assert '_draw_all_objects' not in vars(other.pantalla)
+    assert not any(hook in vars(other) for hook in HOOKS)
+
+    # El governor lo suprime y lo devuelve sin que se pierda el F3
+    debug.set_suppressed(True)
+    assert not debug.installed and '_draw_all_objects' not in vars(game.pantalla)
+    assert debug.contacts is None and debug.pairs is None
+    debug.set_suppressed(False)
+    assert debug.installed and '_draw_all_objects' in vars(game.pantalla)
+
+    teclas = Main.VirtualKeys()
+    for _ in range(5):
+        game._step_frame(teclas, 1.0 / Main.GameConstants.FPS)
+    assert debug.shown[0]  # Los contactos del último frame llegan al dibujo
+
+    debug.toggle()
+    assert not debug.installed and '_draw_all_objects' not in vars(game.pantalla)
+    assert debug.contacts is None and debug.pairs is None
+    # Apagado, el juego vuelve a llamar directamente a las funciones de colisión
+    assert not any(hook in vars(game) for hook in HOOKS)
+    assert game._platform_collision is Main.Personaje.calcular_colision
+    debug.toggle()
+    debug.close()
+    assert not debug.installed and '_draw_all_objects' not in vars(game.pantalla)
+    assert dict(vars(Main.CollisionHandler)) == handler
+
+
+def test_debug_draw_goes_through_the_render_queue(make_game):
+    game = make_game(world=(2, 1))
+    teclas = Main.VirtualKeys()
+    for _ in range(5):
+        game._step_frame(teclas, 1.0 / Main.GameConstants.FPS)
+    commands = game.pantalla.get_render_stats()['commands']
+
+    game.debug_draw.toggle()
+    queued = []
+    submit_rect = game.pantalla.render_queue.submit_rect
+    game.pantalla.render_queue.submit_rect = lambda color, rect, layer, width=0: (
+        queued.append(layer), submit_rect(color, rect, layer, width))
+    game._step_frame(teclas, 1.0 / Main.GameConstants.FPS)
+    assert Main.GameConstants.LAYER_DEBUG in queued
+    assert game.pantalla.get_render_stats()['commands'] > commands
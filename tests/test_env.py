@@ -0,0 +1,61 @@
+import pygame
+import pytest
+
+import Main
+
+
+@pytest.fixture
+def env():
+    pytest.importorskip("numpy")
+    pygame.init()
+    environment = Main.CubeBattleEnv(num_players=2, seed=0)
+    yield environment
+    pygame.quit()
+
+
+def test_env_reset_and_step_shapes(env):
+    import numpy as np
+    features = len(Main.CubeBattleEnv.OBSERVATION_FEATURES)
+    observation, info = env.reset(seed=1)
+    assert observation.shape == (2, features)
+    assert observation.dtype == np.float32
+
+    observation, rewards, terminated, truncated, info = env.step(np.zeros(2, np.uint8))
+    assert observation.shape == (2, features)
+    assert rewards.shape == (2,)
+    assert not terminated and not truncated
+    assert info['steps'] == 1
+    assert (rewards == 0).all()  # Nadie se ha tocado
+
+
+def test_env_rewards_favour_the_attacker(env):
+    import numpy as np
+    env.reset(seed=1)
+    victim, attacker = env.jugadores
+    # El segundo jugador cae rápido encima del primero
+    attacker.rect.topleft = (victim.rect.x, victim.rect.y - victim.rect.height // 2)
+    attacker.velocidad_y = 20
+    health = victim.health
+
+    _, rewards, _, _, _ = env.step(np.zeros(2, np.uint8))
+    assert victim.health < health
+    assert rewards[0] < 0 < rewards[1]
+    assert rewards[1] == pytest.approx(-rewards[0])
+
+
+def test_env_hits_leave_the_game_effects_alone(env, tmp_path):
+    import numpy as np
+    telemetry = Main.Telemetry()
+    telemetry.start(str(tmp_path))
+    try:
+        env.reset(seed=1)
+        victim, attacker = env.jugadores
+        attacker.rect.topleft = (victim.rect.x, victim.rect.y - victim.rect.height // 2)
+        attacker.velocidad_y = 20
+        before = telemetry.recorded
+        env.step(np.zeros(2, np.uint8))
+        assert victim.health < Main.GameConstants.PLAYER_MAX_HEALTH
+        assert telemetry.recorded == before  # Ni HIT ni DAMAGE en la sesión del juego
+    finally:
+        telemetry.stop()
+    assert all(jugador.efectos is Main.SIN_EFECTOS for jugador in env.jugadores)
@@ -0,0 +1,20 @@
+from collections import defaultdict
+
+import pygame
+
+import Main
+
+
+def test_input_frame_counts_released_key_presses():
+    controls_1 = Main.PlayerControls.get_default_controls(1)
+    controls_2 = Main.PlayerControls.get_default_controls(2)
+    released = defaultdict(bool)  # Ninguna tecla sigue pulsada al muestrear
+
+    frame = Main.InputFrame(released, [], frozenset({pygame.K_UP, pygame.K_RCTRL}))
+    assert frame.actions(controls_1) == Main.InputState.UP | Main.InputState.BLOCK
+    assert frame.actions(controls_2) == 0
+
+    held = defaultdict(bool, {pygame.K_a: True})
+    frame = Main.InputFrame(held, [], frozenset({pygame.K_w}))
+    assert frame.actions(controls_2) == Main.InputState.UP | Main.InputState.LEFT
+    assert Main.InputFrame(released, []).actions(controls_2) == 0
@@ -0,0 +1,49 @@
+import Main
+
+
+def test_level_file_round_trip(tmp_path):
+    platforms = {
+        (0, 0): [(1, 2, 3, 1, 'suelo'), (4, 5.5, 2, 0.5, 'voladora')],
+        (1, 0): [],
+        (0, 1): [(0, 0, 16, 1, 'prueba1')],
+        (1, 1): [(7, 8, 1, 1, 'prueba2')],
+    }
+    path = tmp_path / "nivel.ucbl"
+    Main.LevelFile.write(str(path), 2, 2, lambda x, y: platforms[(x, y)], chunk_size=16)
+    level = Main.LevelFile(str(path))
+    try:
+        assert level.chunks == (2, 2)
+        assert level.size_tiles == (32, 32)
+        for (chunk_x, chunk_y), expected in platforms.items():
+            assert level.read_chunk(chunk_x, chunk_y) == [
+                (chunk_x * 16 + x, chunk_y * 16 + y, width, height, tipo)
+                for x, y, width, height, tipo in expected]
+        assert level.read_chunk(2, 0) == []
+    finally:
+        level.close()
+
+
+def test_generar_nivel_round_trip(tmp_path):
+    first, second, other = (str(tmp_path / name) for name in ("a.ucbl", "b.ucbl", "c.ucbl"))
+    Main.generar_nivel(first, 3, 2, seed=7)
+    Main.generar_nivel(second, 3, 2, seed=7)
+    Main.generar_nivel(other, 3, 2, seed=8)
+    with open(first, 'rb') as a, open(second, 'rb') as b, open(other, 'rb') as c:
+        data = a.read()
+        assert data == b.read()
+        assert data != c.read()
+
+    size = Main.GameConstants.LEVEL_CHUNK_TILES
+    level = Main.LevelFile(first)
+    try:
+        assert level.chunks == (3, 2)
+        for chunk_y in range(2):
+            for chunk_x in range(3):
+                chunk = level.read_chunk(chunk_x, chunk_y)
+                suelos = [entry for entry in chunk if entry[4] == 'suelo']
+                assert len(suelos) == 1
+                assert suelos[0][1] == chunk_y * size + size * 3 / 4
+                for x, y, width, height, tipo in chunk:
+                    assert chunk_x * size <= x and x + width <= (chunk_x + 1) * size
+    finally:
+        level.close()
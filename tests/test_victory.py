@@ -0,0 +1,27 @@
+import Main
+
+
+def test_simultaneous_knockout_is_a_draw(make_game, monkeypatch):
+    game = make_game(3)
+    recorded = []
+    monkeypatch.setattr(Main.Telemetry(), "record", lambda event, *args, **kwargs: recorded.append(event))
+    for jugador in game.jugadores:
+        jugador.health = 0
+
+    assert game._check_victory() == []
+    assert game.current_state == "playing"  # _check_victory no cambia de estado
+
+    game._step_frame(Main.VirtualKeys(), 1.0 / Main.GameConstants.FPS)
+    assert game.current_state == "victory"
+    assert game.victory_screen.winner is None
+    assert Main.Telemetry.VICTORY not in recorded
+    game._render_victory()
+
+
+def test_last_player_standing_wins(make_game):
+    game = make_game(3)
+    for jugador in game.jugadores[1:]:
+        jugador.health = 0
+    game._step_frame(Main.VirtualKeys(), 1.0 / Main.GameConstants.FPS)
+    assert game.current_state == "victory"
+    assert game.victory_screen.winner is game.jugadores[0]